@@ -1,32 +1,117 @@
 import logging
 
-from rich.logging import RichHandler
+from api import logs
 
-FORMAT = "%(message)s"
-logging.basicConfig(
-    level="NOTSET", format=FORMAT, datefmt="[%X]", handlers=[RichHandler()]
-)
+# configured before importing the rest of the API, which logs as it loads
+logs.configure()
 
 logger = logging.getLogger(__name__)
 
+import asyncio
 from contextlib import asynccontextmanager
 
+import anyio.to_thread
 from fastapi import FastAPI
+from sqlalchemy import exc
 
+from api import auth, db, passwords, warmup
+from api.conditional import ConditionalGetMiddleware
 from api.config import CONFIG
+from api.metrics import MetricsMiddleware
+from api.responses import FastJSONResponse
 from api.routes import ROUTERS
+from api.timing import ServerTimingMiddleware
+
+
+async def _validate_schema():
+    """Checks the cached schema snapshot against the database.
+
+    An unreachable database only logs a warning so the API can still start while
+    it comes up, but a mismatched schema prevents startup.
+    """
+    try:
+        async with db.get_async_connection() as conn:
+            problems = await conn.run_sync(db.tb.validate)
+    except (OSError, exc.SQLAlchemyError) as e:
+        logger.warning("Could not validate the database schema: %s", e)
+        return
+
+    if problems:
+        for problem in problems:
+            logger.error(problem)
+        raise RuntimeError(
+            "Database schema does not match the snapshot; "
+            "run `python -m api.db schema validate` for details."
+        )
+
+
+async def _warm_up(app: FastAPI):
+    """Warms up the database connections, only logging a warning on failure."""
+    connections = CONFIG.db_warmup_connections
+    if connections is None:
+        connections = CONFIG.db_pool_size
+    if connections <= 0:
+        return
+
+    try:
+        await warmup.warm_up(app, min(connections, CONFIG.db_pool_size))
+    except (OSError, exc.SQLAlchemyError) as e:
+        logger.warning("Could not warm up the database connections: %s", e)
+
+
+async def _refresh_revocations(interval: float):
+    """Periodically pulls signed token revocations made by other workers."""
+    while True:
+        try:
+            await db.load_revocations()
+        except (OSError, exc.SQLAlchemyError) as e:
+            logger.warning("Could not refresh token revocations: %s", e)
+
+        await asyncio.sleep(interval)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # startup
+    anyio.to_thread.current_default_thread_limiter().total_tokens = (
+        CONFIG.server_threadpool_size or CONFIG.db_pool_size + CONFIG.db_max_overflow
+    )
+
+    if CONFIG.db_validate_schema:
+        await _validate_schema()
+
+    await _warm_up(app)
+
+    background_tasks = [
+        asyncio.create_task(auth.sweep_sessions(CONFIG.auth_sweep_interval))
+    ]
+
+    if CONFIG.auth_token_mode == "signed":
+        background_tasks.append(
+            asyncio.create_task(
+                _refresh_revocations(CONFIG.auth_revocation_refresh_interval)
+            )
+        )
 
     yield
 
     # shutdown
+    for task in background_tasks:
+        task.cancel()
+
+    # let cancelled tasks return their connections before the pools are closed
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await db.dispose_engines()
+    passwords.shutdown()
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+app.add_middleware(ConditionalGetMiddleware)
+if CONFIG.server_timing:
+    app.add_middleware(ServerTimingMiddleware)
+if CONFIG.metrics_enabled:
+    # added last so that it wraps (and times) the other middleware
+    app.add_middleware(MetricsMiddleware)
 
 for router in ROUTERS:
     app.include_router(router)
@@ -35,4 +120,24 @@ for router in ROUTERS:
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="127.0.0.1", port=CONFIG.port)
+    if CONFIG.server_workers > 1 and CONFIG.auth_token_mode == "session":
+        logger.warning(
+            "Session tokens only work in the worker that issued them; "
+            "set AUTH_TOKEN_MODE=signed when running %d workers.",
+            CONFIG.server_workers,
+        )
+
+    uvicorn.run(
+        # workers import the app themselves, and so create their own pools and caches
+        "api.__main__:app" if CONFIG.server_workers > 1 else app,
+        host=CONFIG.host,
+        port=CONFIG.port,
+        workers=CONFIG.server_workers,
+        loop=CONFIG.server_loop,
+        http=CONFIG.server_http,
+        backlog=CONFIG.server_backlog,
+        timeout_keep_alive=CONFIG.server_keep_alive,
+        timeout_graceful_shutdown=CONFIG.server_shutdown_timeout,
+        # without a `log_config`, uvicorn's loggers propagate to the root logger
+        log_config=None,
+    )
@@ -1,11 +1,24 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import hashlib
+import heapq
+import hmac
+import json
+import logging
+import secrets
+import threading
 import time
+import uuid
 from typing import Any
 
 from fastapi import HTTPException, status
 
-from api import utils
+from api import timing, utils
+from api.config import CONFIG
+
+logger = logging.getLogger(__name__)
 
 DEFAULT_AUTH_LIFETIME = 7201
 
@@ -68,14 +81,175 @@ EXPIRED = _AuthResult(
 )
 
 
-class Auth:
+class _SessionStore:
+    """Bounded, thread-safe store of registered `Auth` objects keyed by token.
+
+    Sessions are indexed by a min-heap of expiry times so that expired sessions
+    can be swept without scanning every session, and so that the session closest
+    to expiring can be evicted when the store is full. Heap entries for sessions
+    that were removed early (e.g., on logout) are skipped lazily.
+    """
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._sessions: dict[str, Auth] = {}
+        self._expiries: list[tuple[int, str]] = []
+
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, token: str) -> Auth | None:
+        return self._sessions.get(token)
+
+    def add(self, auth: Auth):
+        with self._lock:
+            self._sweep(time.time())
+
+            while len(self._sessions) >= self._max_size and self._expiries:
+                expires, token = heapq.heappop(self._expiries)
+                if self._is_current(expires, token):
+                    del self._sessions[token]
+                    self.evicted += 1
+
+            self._sessions[auth.token] = auth
+            heapq.heappush(self._expiries, (auth._expires, auth.token))
+
+    def remove(self, token: str, expired: bool = False):
+        with self._lock:
+            if self._sessions.pop(token, None) is not None and expired:
+                self.expired += 1
+
+            # drop stale heap entries once they dominate the heap
+            if len(self._expiries) > 2 * len(self._sessions) + 64:
+                self._expiries = [
+                    entry for entry in self._expiries if self._is_current(*entry)
+                ]
+                heapq.heapify(self._expiries)
+
+    def sweep(self) -> int:
+        """Removes every expired session.
+
+        Returns:
+            int: The number of sessions removed.
+        """
+        with self._lock:
+            return self._sweep(time.time())
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "live": len(self._sessions),
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "max_size": self._max_size,
+        }
+
+    def _is_current(self, expires: int, token: str) -> bool:
+        auth = self._sessions.get(token)
+        return auth is not None and auth._expires == expires
+
+    def _sweep(self, now: float) -> int:
+        removed = 0
+        while self._expiries and self._expiries[0][0] <= now:
+            expires, token = heapq.heappop(self._expiries)
+            if self._is_current(expires, token):
+                del self._sessions[token]
+                removed += 1
+
+        self.expired += removed
+        return removed
+
+
+_SESSIONS = _SessionStore(CONFIG.auth_max_sessions)
+
+
+class _RevocationList:
+    """Revoked signed tokens, by token ID and by user.
+
+    Token IDs are only kept until the token would have expired anyway, and each
+    user has at most one cutoff (revoking every token issued before it), which
+    keeps the list small enough to hold in every worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens: dict[str, int] = {}
+        self._users: dict[str, int] = {}
+
+    def revoke_token(self, token_id: str, expires: int):
+        with self._lock:
+            self._tokens[token_id] = expires
+
+    def revoke_user(self, email: str, issued_before: int):
+        with self._lock:
+            self._users[email] = max(issued_before, self._users.get(email, 0))
+
+    def merge(self, tokens: dict[str, int], users: dict[str, int]):
+        """Adds revocations loaded from the database and prunes expired ones."""
+        now = time.time()
+        with self._lock:
+            self._tokens.update(tokens)
+            self._tokens = {t: exp for t, exp in self._tokens.items() if exp > now}
+
+            for email, issued_before in users.items():
+                self._users[email] = max(issued_before, self._users.get(email, 0))
+
+    def is_revoked(self, token_id: str, email: str, issued: int) -> bool:
+        return token_id in self._tokens or issued < self._users.get(email, 0)
+
+    def stats(self) -> dict[str, int]:
+        return {"revoked_tokens": len(self._tokens), "revoked_users": len(self._users)}
+
+
+_REVOCATIONS = _RevocationList()
+
+if CONFIG.auth_secret is None and CONFIG.auth_token_mode == "signed":
+    logger.warning(
+        "AUTH_SECRET is not set; signed tokens will only be valid in this process."
+    )
+
+_SECRET = (CONFIG.auth_secret or secrets.token_hex(32)).encode()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _signature(payload: str) -> str:
+    return _b64encode(hmac.new(_SECRET, payload.encode(), hashlib.sha256).digest())
 
-    _auths: dict[str, Auth] = {}
+
+def _sign(claims: dict[str, Any]) -> str:
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_signature(payload)}"
+
+
+def _verify(token: str) -> dict[str, Any] | None:
+    """Returns the claims of a signed token, or `None` if the signature is invalid."""
+    payload, _, signature = token.partition(".")
+
+    if not hmac.compare_digest(signature.encode(), _signature(payload).encode()):
+        return None
+
+    try:
+        return json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+
+
+class Auth:
 
     @classmethod
     def get_auth(cls, token: str) -> Auth:
         """Fetches a registered `Auth` object by token.
 
+        Signed tokens (see `AUTH_TOKEN_MODE`) are verified directly rather than
+        looked up, so they are valid in every worker sharing `AUTH_SECRET`.
+
         Args:
             token (str): The token to fetch by.
 
@@ -83,7 +257,69 @@ class Auth:
             Auth: The `Auth` object, or the `NoAuth()` sentinel if `token`
                 doesn't correspond with anything.
         """
-        return cls._auths.get(token, NoAuth())
+        with timing.timed("auth"):
+            if token is None:
+                return NoAuth()
+
+            if "." in token:
+                return cls._from_signed(token) or NoAuth()
+
+            return _SESSIONS.get(token) or NoAuth()
+
+    @classmethod
+    def issue(
+        cls,
+        email: str,
+        global_admin: bool = False,
+        chapter: int | None = None,
+        chapter_admin: bool = False,
+        expires_in: int = DEFAULT_AUTH_LIFETIME,
+    ) -> Auth:
+        """Creates a new `Auth` with a fresh token for a user that just logged in.
+
+        With `AUTH_TOKEN_MODE=session` the token is a random ID registered with this
+        process; with `AUTH_TOKEN_MODE=signed` it is an HMAC-signed set of claims.
+        """
+        if CONFIG.auth_token_mode != "signed":
+            auth = cls(
+                str(uuid.uuid4()),
+                email,
+                global_admin,
+                chapter,
+                chapter_admin,
+                expires_in,
+            )
+            auth.register_self()
+            return auth
+
+        token_id = secrets.token_urlsafe(12)
+        claims = {
+            "jti": token_id,
+            "sub": email,
+            "adm": global_admin,
+            "chp": chapter,
+            "cad": chapter_admin,
+            "iat": time.time_ns() // 1_000_000,
+            "exp": int(time.time()) + expires_in,
+        }
+        auth = cls(_sign(claims), email, global_admin, chapter, chapter_admin)
+        auth._expires = claims["exp"]
+        auth._token_id = token_id
+        return auth
+
+    @classmethod
+    def _from_signed(cls, token: str) -> Auth | None:
+        claims = _verify(token)
+
+        if claims is None or _REVOCATIONS.is_revoked(
+            claims["jti"], claims["sub"], claims["iat"]
+        ):
+            return None
+
+        auth = cls(token, claims["sub"], claims["adm"], claims["chp"], claims["cad"])
+        auth._expires = claims["exp"]
+        auth._token_id = claims["jti"]
+        return auth
 
     def __init__(
         self,
@@ -101,6 +337,7 @@ class Auth:
         self._global_admin = global_admin
         self._chapter_admin = chapter_admin
         self._expires = int(time.time()) + expires_in
+        self._token_id: str | None = None
 
     @property
     def expired(self) -> bool:
@@ -126,11 +363,25 @@ class Auth:
     def chapter_admin(self) -> bool:
         return self._chapter_admin
 
+    @property
+    def token_id(self) -> str | None:
+        """The ID of a signed token, used to revoke it; `None` for session tokens."""
+        return self._token_id
+
+    @property
+    def expires(self) -> int:
+        return self._expires
+
     def register_self(self):
-        self._auths[self._token] = self
+        _SESSIONS.add(self)
 
     def unregister_self(self):
-        del self._auths[self._token]
+        if self._token_id is not None:
+            # expired signed tokens are already rejected; no need to track them
+            if not self.expired:
+                _REVOCATIONS.revoke_token(self._token_id, self._expires)
+        else:
+            _SESSIONS.remove(self._token, expired=self.expired)
 
     def logged_in(self) -> _AuthResult:
         """Returns whether this auth certifies that a user is logged in.
@@ -219,4 +470,48 @@ class NoAuth(Auth):
 get = Auth.get_auth
 utils.export(get)
 
+
+@utils.export
+def get_session_stats() -> dict[str, int]:
+    """Returns counters for live, expired, and evicted sessions, along with the
+    size of the signed token revocation list.
+    """
+    return _SESSIONS.stats() | _REVOCATIONS.stats()
+
+
+@utils.export
+def revoke_user(email: str, issued_before: int):
+    """Revokes every signed token issued to `email` before `issued_before`.
+
+    Args:
+        email (str): The email of the user whose tokens to revoke.
+        issued_before (int): A UNIX timestamp in milliseconds.
+    """
+    _REVOCATIONS.revoke_user(email, issued_before)
+
+
+@utils.export
+def merge_revocations(tokens: dict[str, int], users: dict[str, int]):
+    """Adds revocations recorded by other workers.
+
+    Args:
+        tokens (dict[str, int]): Revoked token IDs mapped to their expiry times.
+        users (dict[str, int]): Emails mapped to the time (in milliseconds) before
+            which all of their tokens are revoked.
+    """
+    _REVOCATIONS.merge(tokens, users)
+
+
+@utils.export
+async def sweep_sessions(interval: float):
+    """Periodically removes expired sessions until cancelled.
+
+    Args:
+        interval (float): The number of seconds between sweeps.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        _SESSIONS.sweep()
+
+
 BYPASS = Auth("bypass", "", True, None, True).register_self()
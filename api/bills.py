@@ -0,0 +1,149 @@
+import datetime
+import enum
+from typing import Annotated, Any, Mapping
+
+from fastapi import Depends, Query
+from sqlalchemy import ColumnElement, Select, and_, select
+
+from api import db, models
+
+
+class BillStatus(str, enum.Enum):
+    unpaid = "unpaid"
+    partially_paid = "partially_paid"
+    outstanding = "outstanding"
+    paid = "paid"
+
+
+class BillType(str, enum.Enum):
+    internal = "internal"
+    external = "external"
+
+
+class BillFilter:
+    """FastAPI dependency for the query parameters that filter bill listings.
+
+    Every parameter is optional and they are combined with AND. Pass the dependency to
+    `bill_query` to apply the filters.
+    """
+
+    def __init__(
+        self,
+        status: Annotated[
+            BillStatus | None,
+            Query(
+                description="'unpaid' bills have no payments, 'partially_paid' bills "
+                "have some, 'outstanding' is either of these, and 'paid' bills are "
+                "paid in full."
+            ),
+        ] = None,
+        overdue_as_of: Annotated[
+            datetime.datetime | None,
+            Query(description="Only bills due before this time that are not paid."),
+        ] = None,
+        due_after: Annotated[
+            datetime.datetime | None, Query(description="Inclusive.")
+        ] = None,
+        due_before: Annotated[
+            datetime.datetime | None, Query(description="Exclusive.")
+        ] = None,
+        issued_after: Annotated[
+            datetime.date | None, Query(description="Inclusive.")
+        ] = None,
+        issued_before: Annotated[
+            datetime.date | None, Query(description="Exclusive.")
+        ] = None,
+        min_amount: Annotated[float | None, Query(description="Inclusive.")] = None,
+        max_amount: Annotated[float | None, Query(description="Inclusive.")] = None,
+        type: BillType | None = None,
+    ):
+        self.status = status
+        self.overdue_as_of = overdue_as_of
+        self.due_after = due_after
+        self.due_before = due_before
+        self.issued_after = issued_after
+        self.issued_before = issued_before
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+        self.type = type
+
+    def conditions(self) -> list[ColumnElement[bool]]:
+        """Returns the `WHERE` conditions on `bill` for the requested filters."""
+        bill = db.tb.bill.c
+        conditions = []
+
+        if self.status == BillStatus.unpaid:
+            conditions.append(bill.amount_paid <= 0)
+        elif self.status == BillStatus.partially_paid:
+            conditions.append(
+                and_(bill.amount_paid > 0, bill.amount_paid < bill.amount)
+            )
+        elif self.status == BillStatus.outstanding:
+            conditions.append(bill.amount_paid < bill.amount)
+        elif self.status == BillStatus.paid:
+            conditions.append(bill.amount_paid >= bill.amount)
+
+        if self.overdue_as_of is not None:
+            conditions.append(bill.due_date < self.overdue_as_of)
+            conditions.append(bill.amount_paid < bill.amount)
+
+        if self.due_after is not None:
+            conditions.append(bill.due_date >= self.due_after)
+        if self.due_before is not None:
+            conditions.append(bill.due_date < self.due_before)
+        if self.issued_after is not None:
+            conditions.append(bill.issue_date >= self.issued_after)
+        if self.issued_before is not None:
+            conditions.append(bill.issue_date < self.issued_before)
+        if self.min_amount is not None:
+            conditions.append(bill.amount >= self.min_amount)
+        if self.max_amount is not None:
+            conditions.append(bill.amount <= self.max_amount)
+
+        if self.type is not None:
+            conditions.append(bill.is_external == (self.type == BillType.external))
+
+        return conditions
+
+
+BillFilters = Annotated[BillFilter, Depends()]
+
+
+def bill_query(
+    *where: ColumnElement[bool], filters: BillFilter | None = None
+) -> Select:
+    """Builds a single query for internal and external bills.
+
+    Each row has the columns of `bill`, `member_email` (`None` for external bills),
+    and the columns of `external_bill` except its `bill_id` (`None` for internal
+    bills).
+
+    Args:
+        *where (ColumnElement[bool]): Conditions restricting the bills, such as
+            `db.tb.bill.c.chapter_id == chapter_id`.
+        filters (BillFilter | None, optional): The filters requested by the client.
+            Defaults to no filters.
+    """
+    bill = db.tb.bill
+
+    query = (
+        select(
+            *bill.c,
+            db.tb.internal_bill.c.member_email,
+            *[c for c in db.tb.external_bill.c if c.name != "bill_id"],
+        )
+        .select_from(bill)
+        .outerjoin(db.tb.internal_bill)
+        .outerjoin(db.tb.external_bill)
+        .where(*where)
+    )
+
+    if filters is not None:
+        query = query.where(*filters.conditions())
+
+    return query
+
+
+def bill_model(row: Mapping[str, Any]) -> type[models.Bill]:
+    """Returns the model of a `bill_query` row; see `api.responses.rows_response`."""
+    return models.ExternalBill if row["is_external"] else models.InternalBill
@@ -0,0 +1,198 @@
+"""In-process cache of serialized responses for rarely changing data.
+
+Entries expire after a TTL and the least recently used entries are evicted once the
+cache is full. Concurrent misses for the same key share a single load (so an expiry
+does not send a stampede of identical queries to the database), and loads that
+race with an invalidation are not cached.
+
+Note: invalidation only reaches the process it is called in; other workers keep
+serving their entries until the TTL runs out.
+"""
+
+import asyncio
+import collections
+import dataclasses
+import os
+import time
+from typing import Any, Awaitable, Callable, Final, Hashable
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from api.conditional import compute_etag
+from api.config import CONFIG
+
+# response headers set by handlers (e.g., by pagination) that are kept with an entry
+_CACHED_HEADERS: Final[tuple[str, ...]] = ("x-next-cursor", "link")
+
+
+@dataclasses.dataclass(frozen=True)
+class _Entry:
+    body: bytes
+    headers: dict[str, str]
+    expires: float
+
+
+class ResponseCache:
+    """A read-through cache of JSON response bodies.
+
+    Usage:
+
+        return await CATALOG.respond(request, response, load, list[models.School])
+
+    where `load` is an `async` function returning the uncached result.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        """
+        Args:
+            ttl (float): The number of seconds an entry is served for.
+            max_entries (int): The maximum number of entries; the least recently used
+                entry is evicted to make room for a new one.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._entries: collections.OrderedDict[Hashable, _Entry] = (
+            collections.OrderedDict()
+        )
+        self._loads: dict[Hashable, asyncio.Future[_Entry]] = {}
+        self._generation = 0
+        self._adapters: dict[Any, TypeAdapter] = {}
+
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def _adapter(self, model: Any) -> TypeAdapter:
+        if model not in self._adapters:
+            self._adapters[model] = TypeAdapter(model)
+        return self._adapters[model]
+
+    async def _load(
+        self,
+        key: Hashable,
+        response: Response,
+        load: Callable[[], Awaitable[Any]],
+        model: Any,
+    ) -> _Entry:
+        generation = self._generation
+
+        adapter = self._adapter(model)
+        result = adapter.validate_python(await load(), from_attributes=True)
+        body = adapter.dump_json(result)
+        headers = {
+            name: response.headers[name]
+            for name in _CACHED_HEADERS
+            if name in response.headers
+        }
+        # computed once here rather than by `ConditionalGetMiddleware` on every hit
+        headers["etag"] = compute_etag(body)
+
+        entry = _Entry(body, headers, expires=time.monotonic() + self.ttl)
+
+        # an invalidation during the load may mean `result` is already stale
+        if generation == self._generation:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+        return entry
+
+    def _forget_load(self, key: Hashable, future: asyncio.Future[_Entry]):
+        # after an invalidation, a newer load may have replaced this one
+        if self._loads.get(key) is future:
+            del self._loads[key]
+
+    async def respond(
+        self,
+        request: Request,
+        response: Response,
+        load: Callable[[], Awaitable[Any]],
+        model: Any,
+        cache_control: str | None = None,
+    ) -> Response:
+        """Returns the cached response for `request`, loading it if needed.
+
+        The response carries an `ETag`, so `api.conditional.ConditionalGetMiddleware`
+        can answer a matching `If-None-Match` without hashing the body.
+
+        Args:
+            request (Request): The request; its path and query are the cache key.
+            response (Response): The handler's response, from which headers set by
+                `load` (such as pagination headers) are cached.
+            load (Callable[[], Awaitable[Any]]): Loads the uncached result. Exceptions
+                it raises (e.g., 404s) are propagated and not cached.
+            model (Any): The type to serialize the result as.
+            cache_control (str | None, optional): The `Cache-Control` header to send.
+                Defaults to the middleware's default.
+
+        Returns:
+            Response: The JSON response.
+        """
+        key = (request.url.path, request.url.query)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires > time.monotonic():
+            self._entries.move_to_end(key)
+            self._hits += 1
+        elif key in self._loads:
+            self._coalesced += 1
+            entry = await asyncio.shield(self._loads[key])
+        else:
+            self._misses += 1
+            self._entries.pop(key, None)
+
+            future = asyncio.ensure_future(self._load(key, response, load, model))
+            self._loads[key] = future
+            future.add_done_callback(lambda _: self._forget_load(key, future))
+            entry = await asyncio.shield(future)
+
+        headers = entry.headers
+        if cache_control is not None:
+            headers = headers | {"cache-control": cache_control}
+
+        return Response(entry.body, media_type="application/json", headers=headers)
+
+    def prime(self, model: Any):
+        """Builds the serializer for `model` ahead of its first response.
+
+        Args:
+            model (Any): A type that may be passed to `respond`.
+        """
+        self._adapter(model)
+
+    def invalidate(self):
+        """Drops every entry, including any being loaded."""
+        self._generation += 1
+        self._entries.clear()
+        self._loads.clear()
+        self._invalidations += 1
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self._hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+            "evictions": self._evictions,
+            "invalidations": self._invalidations,
+        }
+
+
+# the `Cache-Control` for catalog responses that do not require authentication
+PUBLIC_CACHE_CONTROL: Final[str] = f"public, max-age={CONFIG.catalog_max_age}"
+
+# organizations, schools, and chapters; invalidated by any change to them
+CATALOG: Final[ResponseCache] = ResponseCache(
+    CONFIG.catalog_cache_ttl, CONFIG.catalog_cache_max_entries
+)
+
+# a worker forked from a process that already served requests starts empty, as its
+# pending loads belong to the parent's event loop
+os.register_at_fork(after_in_child=CATALOG.invalidate)
@@ -0,0 +1,110 @@
+"""Conditional `GET` support: strong `ETag`s and `304 Not Modified` responses.
+
+`ConditionalGetMiddleware` tags every successful `GET` response with an `ETag`
+hashed from its body, unless the handler already set one, and answers requests
+whose `If-None-Match` matches it with an empty `304`. Clients still make the
+request, but unchanged data is not sent again.
+
+Streamed responses (e.g., exports) are passed through untouched since their body is
+not known up front.
+"""
+
+import hashlib
+from typing import Final
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# the default for `GET` responses which do not set `Cache-Control`; clients may store
+# them but must revalidate them (with `If-None-Match`) before each use
+DEFAULT_CACHE_CONTROL: Final[str] = "private, no-cache"
+
+# headers describing the body, which are dropped from a `304`
+_BODY_HEADERS: Final[frozenset[bytes]] = frozenset(
+    (b"content-length", b"content-type", b"content-encoding")
+)
+
+
+def compute_etag(body: bytes) -> str:
+    """Returns a strong `ETag` for a response body."""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    """Whether `If-None-Match` matches `etag`, using the weak comparison required
+    for `If-None-Match` (RFC 9110, Section 13.1.2).
+    """
+    if if_none_match.strip() == "*":
+        return True
+
+    etag = etag.removeprefix("W/")
+    return any(
+        tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(",")
+    )
+
+
+class ConditionalGetMiddleware:
+    """ASGI middleware adding `ETag`s and `304` responses to `GET` requests."""
+
+    def __init__(self, app: ASGIApp, cache_control: str = DEFAULT_CACHE_CONTROL):
+        """
+        Args:
+            app (ASGIApp): The application to wrap.
+            cache_control (str, optional): The `Cache-Control` for successful `GET`
+                responses which do not set one. Defaults to `DEFAULT_CACHE_CONTROL`.
+        """
+        self.app = app
+        self.cache_control = cache_control
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start: Message | None = None
+
+        async def send_with_etag(message: Message):
+            nonlocal start
+
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+
+            initial, start = start, None
+
+            # only a complete, successful body can be tagged
+            if initial["status"] != 200 or message.get("more_body", False):
+                await send(initial)
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=initial["headers"])
+            etag = headers.get("etag")
+            if etag is None:
+                etag = headers["etag"] = compute_etag(message.get("body", b""))
+            if "cache-control" not in headers:
+                headers["cache-control"] = self.cache_control
+
+            if if_none_match is not None and _matches(if_none_match, etag):
+                await send(
+                    {
+                        "type": "http.response.start",
+                        "status": 304,
+                        "headers": [
+                            (name, value)
+                            for name, value in initial["headers"]
+                            if name not in _BODY_HEADERS
+                        ],
+                    }
+                )
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+            await send(initial)
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
@@ -1,5 +1,6 @@
 from .engine import *
 from .queries import *
 from .tables import tables
+from .unit_of_work import *
 
 tb = tables
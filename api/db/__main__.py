@@ -0,0 +1,60 @@
+import argparse
+import sys
+
+from . import engine, migrate, schema
+from .tables import tables
+
+
+def _schema(args: argparse.Namespace) -> int:
+    if args.action == "refresh":
+        snapshot = schema.reflect(engine.get_engine())
+        schema.write_snapshot(snapshot)
+        print(f"Wrote {len(snapshot)} tables to {schema.SNAPSHOT_PATH}")
+        return 0
+
+    problems = tables.validate()
+    for problem in problems:
+        print(problem)
+
+    if problems:
+        print("Run `python -m api.db schema refresh` if the database is correct.")
+        return 1
+
+    print("Schema snapshot matches the database.")
+    return 0
+
+
+def _migrate(args: argparse.Namespace) -> int:
+    for path in migrate.migration_files():
+        print(f"Applying {path.name}")
+        migrate.apply(engine.get_engine(), path)
+
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m api.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    schema_parser = commands.add_parser(
+        "schema", help="manage the cached schema snapshot"
+    )
+    schema_parser.add_argument(
+        "action",
+        choices=("refresh", "validate"),
+        help="'refresh' re-reflects the database into the snapshot; "
+        "'validate' compares the snapshot to the database",
+    )
+    schema_parser.set_defaults(func=_schema)
+
+    migrate_parser = commands.add_parser(
+        "migrate", help="apply the scripts in api/db/migrations in order"
+    )
+    migrate_parser.set_defaults(func=_migrate)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,155 @@
-from typing import Final
+import os
+import threading
+from typing import Any, AsyncContextManager, ContextManager, Final
 
-from sqlalchemy import Engine, create_engine
+from sqlalchemy import Connection, Engine, QueuePool, create_engine, make_url
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
+from api import metrics, timing
 from api.config import CONFIG
 from api.utils import export
 
-_ENGINE: Final[Engine] = create_engine(CONFIG.database_url)
+from .pool import PoolStats, describe_pool, instrumented_pool_class, track_churn
+
+_POOL_OPTIONS: Final[dict[str, Any]] = dict(
+    pool_size=CONFIG.db_pool_size,
+    max_overflow=CONFIG.db_max_overflow,
+    pool_timeout=CONFIG.db_pool_timeout,
+    pool_recycle=CONFIG.db_pool_recycle,
+    pool_pre_ping=CONFIG.db_pool_pre_ping,
+)
+
+_STATS: Final[PoolStats] = PoolStats()
+_ASYNC_STATS: Final[PoolStats] = PoolStats()
+
+# also attribute pool wait times to the current request, for `/metrics` and
+# `Server-Timing` headers
+_WAIT_HOOKS: Final = [
+    hook
+    for enabled, hook in (
+        (CONFIG.metrics_enabled, metrics.record_pool_wait),
+        (CONFIG.server_timing, timing.record_pool_wait),
+    )
+    if enabled
+]
+
+
+def _on_wait(seconds: float):
+    for hook in _WAIT_HOOKS:
+        hook(seconds)
+
+
+_ON_WAIT: Final = _on_wait if _WAIT_HOOKS else None
+
+_ENGINE: Engine | None = None
+_ASYNC_ENGINE: AsyncEngine | None = None
+_ENGINE_LOCK: Final = threading.Lock()
+
+
+def _create_engines():
+    global _ENGINE, _ASYNC_ENGINE
+
+    engine = create_engine(
+        CONFIG.database_url,
+        poolclass=instrumented_pool_class(QueuePool, _STATS, _ON_WAIT),
+        **_POOL_OPTIONS,
+    )
+
+    # the async engine talks to the same database through asyncpg so that route
+    # handlers can await queries instead of blocking the event loop
+    async_engine = create_async_engine(
+        make_url(CONFIG.database_url).set(drivername="postgresql+asyncpg"),
+        poolclass=instrumented_pool_class(
+            AsyncAdaptedQueuePool, _ASYNC_STATS, _ON_WAIT
+        ),
+        **_POOL_OPTIONS,
+    )
+
+    for sync_engine, stats in (
+        (engine, _STATS),
+        (async_engine.sync_engine, _ASYNC_STATS),
+    ):
+        track_churn(sync_engine, stats)
+        if CONFIG.metrics_enabled:
+            metrics.instrument_engine(sync_engine)
+        if CONFIG.server_timing:
+            timing.instrument_engine(sync_engine)
+
+    _ENGINE, _ASYNC_ENGINE = engine, async_engine
+
+
+def _ensure_engines():
+    # engines are created on first use rather than on import so that each worker
+    # process gets its own pools, even if it was forked from an importing parent
+    if _ENGINE is None:
+        with _ENGINE_LOCK:
+            if _ENGINE is None:
+                _create_engines()
+
+
+def _after_fork():
+    # connections inherited from the parent must not be used (or closed) here;
+    # see "Using Connection Pools with Multiprocessing or os.fork()" in SQLAlchemy's
+    # documentation
+    if _ENGINE is not None:
+        _ENGINE.dispose(close=False)
+        _ASYNC_ENGINE.sync_engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_after_fork)
 
 __all__ = []
 
 
 @export
 def get_engine() -> Engine:
+    _ensure_engines()
     return _ENGINE
 
 
-get_connection = _ENGINE.connect
+@export
+def get_async_engine() -> AsyncEngine:
+    _ensure_engines()
+    return _ASYNC_ENGINE
+
+
+@export
+async def dispose_engines():
+    """Closes the pooled connections of both engines, if they were created."""
+    if _ASYNC_ENGINE is not None:
+        await _ASYNC_ENGINE.dispose()
+        _ENGINE.dispose()
+
+
+@export
+def get_pool_stats() -> dict[str, dict[str, Any]]:
+    """Returns the current state and usage statistics of both connection pools.
 
-begin = _ENGINE.begin
+    Returns:
+        dict[str, dict[str, Any]]: Pool info keyed by `"sync"` and `"async"`.
+    """
+    return {
+        "sync": describe_pool(get_engine().pool, _STATS),
+        "async": describe_pool(get_async_engine().pool, _ASYNC_STATS),
+    }
 
-__all__.extend(["get_connection", "begin"])
+
+@export
+def get_connection() -> Connection:
+    return get_engine().connect()
+
+
+@export
+def begin() -> ContextManager[Connection]:
+    return get_engine().begin()
+
+
+@export
+def get_async_connection() -> AsyncConnection:
+    return get_async_engine().connect()
+
+
+@export
+def begin_async() -> AsyncContextManager[AsyncConnection]:
+    return get_async_engine().begin()
@@ -0,0 +1,63 @@
+import re
+from pathlib import Path
+from typing import Final
+
+from sqlalchemy import Engine
+
+MIGRATIONS_PATH: Final[Path] = Path(__file__).parent / "migrations"
+
+
+def migration_files() -> list[Path]:
+    """Returns every migration script, in the order they should be applied."""
+    return sorted(MIGRATIONS_PATH.glob("*.sql"))
+
+
+# a dollar-quote delimiter (e.g., `$$` around a function body) or a statement end
+_DELIMITER: Final[re.Pattern[str]] = re.compile(r"(\$\w*\$)|;")
+
+
+def statements(path: Path) -> list[str]:
+    """Splits a migration script into its individual statements.
+
+    Note: this splits on `;` outside of dollar-quoted strings (such as function
+    bodies) with `--` comments removed, so migration scripts must not contain
+    semicolons or `--` inside other string literals.
+
+    Args:
+        path (Path): The migration script.
+    """
+    sql = re.sub(r"--.*$", "", path.read_text(), flags=re.M)
+
+    parts = []
+    start = 0
+    quote = None
+    for match in _DELIMITER.finditer(sql):
+        tag = match.group(1)
+        if quote is not None:
+            if tag == quote:
+                quote = None
+        elif tag is not None:
+            quote = tag
+        else:
+            parts.append(sql[start : match.start()])
+            start = match.end()
+    parts.append(sql[start:])
+
+    return [stmt.strip() for stmt in parts if stmt.strip()]
+
+
+def apply(engine: Engine, path: Path):
+    """Applies a migration script, running each statement in autocommit mode.
+
+    Autocommit is required for statements such as `CREATE INDEX CONCURRENTLY`,
+    which cannot run inside a transaction block; migrations should therefore be
+    written to be safely re-runnable (e.g., using `IF NOT EXISTS`), or group their
+    statements between explicit `BEGIN` and `COMMIT` statements.
+
+    Args:
+        engine (Engine): The engine to apply the migration with.
+        path (Path): The migration script.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for stmt in statements(path):
+            conn.exec_driver_sql(stmt)
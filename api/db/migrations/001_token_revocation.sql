@@ -0,0 +1,16 @@
+-- Tables used to revoke signed auth tokens (see api/auth.py).
+-- Fresh databases get the same tables from create_tables.sql.
+
+CREATE TABLE IF NOT EXISTS Revoked_Token (
+    Token_ID        text,
+    Expires         bigint      NOT NULL, -- UNIX time; row can be dropped after
+
+    PRIMARY KEY (Token_ID)
+);
+
+CREATE TABLE IF NOT EXISTS Token_Cutoff (
+    Email           text,
+    Issued_Before   bigint      NOT NULL, -- UNIX time in milliseconds
+
+    PRIMARY KEY (Email)
+);
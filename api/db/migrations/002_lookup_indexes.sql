@@ -0,0 +1,22 @@
+-- Indexes on the foreign-key and filter columns used by the API's lookups.
+-- Built concurrently so that existing databases stay writable while they build;
+-- apply with `python -m api.db migrate` (each statement runs outside a transaction).
+-- Fresh databases get the same indexes from create_tables.sql.
+-- Bill (Chapter_ID) and Internal_Bill (Member_Email) are covered by the composite
+-- indexes of 003_bill_filter_indexes.sql.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS member_chapter_id_idx ON Member (Chapter_ID);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS chapter_org_name_idx ON Chapter (Org_Name);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS chapter_school_name_idx ON Chapter (School_Name);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS internal_bill_bill_id_idx ON Internal_Bill (Bill_ID);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS external_bill_bill_id_idx ON External_Bill (Bill_ID);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS payment_info_member_email_idx ON Payment_Info (Member_Email);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS bank_account_payment_id_idx ON Bank_Account (Payment_ID);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS card_payment_id_idx ON Card (Payment_ID);
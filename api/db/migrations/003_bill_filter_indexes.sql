@@ -0,0 +1,17 @@
+-- Composite indexes for the filtered bill listings (see api/bills.py).
+-- Paginated chapter listings walk (Chapter_ID, Bill_ID) in order, due-date and
+-- overdue filters scan a range of (Chapter_ID, Due_Date), and member listings find
+-- their bill IDs in (Member_Email, Bill_ID). They make the single-column Chapter_ID
+-- and Member_Email indexes redundant; databases migrated before they were removed
+-- from 002_lookup_indexes.sql drop them here.
+-- Apply with `python -m api.db migrate`.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS bill_chapter_id_bill_id_idx ON Bill (Chapter_ID, Bill_ID);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS bill_chapter_id_due_date_idx ON Bill (Chapter_ID, Due_Date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS internal_bill_member_email_bill_id_idx ON Internal_Bill (Member_Email, Bill_ID);
+
+DROP INDEX CONCURRENTLY IF EXISTS bill_chapter_id_idx;
+
+DROP INDEX CONCURRENTLY IF EXISTS internal_bill_member_email_idx;
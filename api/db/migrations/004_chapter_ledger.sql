@@ -0,0 +1,99 @@
+-- Adds Chapter_Ledger, the per-chapter bill totals kept up to date by triggers on
+-- Bill, and fills it from the existing bills. Apply with `python -m api.db migrate`.
+-- Runs as one transaction that blocks writes to Bill, so that no bill is counted
+-- twice or missed; re-running it rebuilds the ledger from scratch.
+
+BEGIN;
+
+LOCK TABLE Bill IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE TABLE IF NOT EXISTS Chapter_Ledger (
+    Chapter_ID          bigint,
+    Due_Date            date,
+    Bill_Count          bigint      NOT NULL,
+    Outstanding_Count   bigint      NOT NULL,
+    Total_Billed        numeric     NOT NULL,
+    Total_Paid          numeric     NOT NULL,
+    Outstanding_Amount  numeric     NOT NULL,
+
+    PRIMARY KEY (Chapter_ID, Due_Date)
+);
+
+-- Adds (direction = 1) or removes (direction = -1) a bill's share of Chapter_Ledger
+CREATE OR REPLACE FUNCTION chapter_ledger_apply(changed Bill, direction int) RETURNS void AS $$
+BEGIN
+    INSERT INTO Chapter_Ledger AS ledger
+    VALUES (
+        changed.Chapter_ID,
+        changed.Due_Date::date,
+        direction,
+        direction * (changed.Amount_Paid < changed.Amount)::int,
+        direction * changed.Amount::numeric,
+        direction * changed.Amount_Paid::numeric,
+        direction * greatest(changed.Amount - changed.Amount_Paid, 0)::numeric
+    )
+    ON CONFLICT (Chapter_ID, Due_Date) DO UPDATE SET
+        Bill_Count = ledger.Bill_Count + excluded.Bill_Count,
+        Outstanding_Count = ledger.Outstanding_Count + excluded.Outstanding_Count,
+        Total_Billed = ledger.Total_Billed + excluded.Total_Billed,
+        Total_Paid = ledger.Total_Paid + excluded.Total_Paid,
+        Outstanding_Amount = ledger.Outstanding_Amount + excluded.Outstanding_Amount;
+
+    IF direction < 0 THEN
+        DELETE FROM Chapter_Ledger
+        WHERE Chapter_ID = changed.Chapter_ID
+            AND Due_Date = changed.Due_Date::date
+            AND Bill_Count = 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION chapter_ledger_trigger() RETURNS trigger AS $$
+BEGIN
+    -- most updates are payments, which stay in the same row of the ledger
+    IF TG_OP = 'UPDATE'
+        AND OLD.Chapter_ID = NEW.Chapter_ID
+        AND OLD.Due_Date::date = NEW.Due_Date::date
+    THEN
+        UPDATE Chapter_Ledger SET
+            Outstanding_Count = Outstanding_Count
+                + (NEW.Amount_Paid < NEW.Amount)::int
+                - (OLD.Amount_Paid < OLD.Amount)::int,
+            Total_Billed = Total_Billed + NEW.Amount::numeric - OLD.Amount::numeric,
+            Total_Paid = Total_Paid + NEW.Amount_Paid::numeric - OLD.Amount_Paid::numeric,
+            Outstanding_Amount = Outstanding_Amount
+                + greatest(NEW.Amount - NEW.Amount_Paid, 0)::numeric
+                - greatest(OLD.Amount - OLD.Amount_Paid, 0)::numeric
+        WHERE Chapter_ID = NEW.Chapter_ID AND Due_Date = NEW.Due_Date::date;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM chapter_ledger_apply(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM chapter_ledger_apply(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER chapter_ledger_update
+    AFTER INSERT OR DELETE OR UPDATE OF Chapter_ID, Amount, Amount_Paid, Due_Date ON Bill
+    FOR EACH ROW EXECUTE FUNCTION chapter_ledger_trigger();
+
+DELETE FROM Chapter_Ledger;
+
+INSERT INTO Chapter_Ledger
+SELECT
+    Chapter_ID,
+    Due_Date::date,
+    count(*),
+    count(*) FILTER (WHERE Amount_Paid < Amount),
+    sum(Amount::numeric),
+    sum(Amount_Paid::numeric),
+    sum(greatest(Amount - Amount_Paid, 0)::numeric)
+FROM Bill
+GROUP BY Chapter_ID, Due_Date::date;
+
+COMMIT;
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from typing import Any, Callable
+
+from sqlalchemy import Engine, event, exc
+from sqlalchemy.pool import Pool
+
+# upper bounds (in seconds) of the connection wait-time histogram buckets
+WAIT_BUCKETS: tuple[float, ...] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class PoolStats:
+    """Counters describing how a connection pool is being used.
+
+    All mutations are guarded by a lock since the sync engine may be used from
+    the threadpool while the async engine is used from the event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.max_waiting = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+        self.wait_time_total = 0.0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+
+    def wait_started(self):
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+    def wait_finished(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.waiting -= 1
+            self.wait_time_total += seconds
+            self.wait_buckets[bisect.bisect_left(WAIT_BUCKETS, seconds)] += 1
+
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+
+    def count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            buckets = {
+                str(bound): n for bound, n in zip(WAIT_BUCKETS, self.wait_buckets)
+            }
+            buckets["+Inf"] = self.wait_buckets[-1]
+
+            return {
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "closes": self.closes,
+                "invalidations": self.invalidations,
+                "wait_time_total": self.wait_time_total,
+                "wait_time_buckets": buckets,
+            }
+
+
+def instrumented_pool_class(
+    pool_cls: type[Pool],
+    stats: PoolStats,
+    on_wait: Callable[[float], None] | None = None,
+) -> type[Pool]:
+    """Creates a subclass of `pool_cls` that records checkout wait times in `stats`.
+
+    The subclass is used instead of an attribute on the pool instance so that
+    pools recreated by `Engine.dispose()` keep reporting to the same `stats`.
+
+    Args:
+        pool_cls (type[Pool]): The pool implementation to instrument.
+        stats (PoolStats): The statistics object to record into.
+        on_wait (Callable[[float], None] | None, optional): Also called with each
+            checkout's wait time (in seconds). Defaults to None.
+    """
+
+    def finish(seconds: float, timed_out: bool = False):
+        stats.wait_finished(seconds, timed_out)
+        if on_wait is not None:
+            on_wait(seconds)
+
+    def connect(self):
+        stats.wait_started()
+        start = time.perf_counter()
+        try:
+            conn = pool_cls.connect(self)
+        except exc.TimeoutError:
+            finish(time.perf_counter() - start, timed_out=True)
+            raise
+        except BaseException:
+            finish(time.perf_counter() - start)
+            raise
+
+        finish(time.perf_counter() - start)
+        return conn
+
+    return type(f"Instrumented{pool_cls.__name__}", (pool_cls,), {"connect": connect})
+
+
+def track_churn(engine: Engine, stats: PoolStats):
+    """Counts physical connections opened, closed, and invalidated by `engine`'s pool.
+
+    Args:
+        engine (Engine): The (sync) engine whose pool events to listen to.
+        stats (PoolStats): The statistics object to record into.
+    """
+    event.listen(engine, "connect", lambda *_: stats.count("connects"))
+    event.listen(engine, "close", lambda *_: stats.count("closes"))
+    event.listen(engine, "close_detached", lambda *_: stats.count("closes"))
+    event.listen(engine, "invalidate", lambda *_: stats.count("invalidations"))
+
+
+def describe_pool(pool: Pool, stats: PoolStats) -> dict[str, Any]:
+    """Combines the live pool state with the recorded `stats`.
+
+    Args:
+        pool (Pool): The pool to describe.
+        stats (PoolStats): The statistics recorded for the pool.
+    """
+    info = {"status": pool.status()}
+
+    # only queue-based pools track sizes
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            info[name] = getattr(pool, name)()
+
+    info.update(stats.snapshot())
+    return info
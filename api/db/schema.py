@@ -0,0 +1,196 @@
+"""Serialized snapshot of the database schema.
+
+Reflecting the live database on every import costs a full `information_schema`
+round trip and fails outright if the database is unreachable, so the table
+definitions are instead loaded from a JSON snapshot taken once by reflection.
+
+Use `python -m api.db schema refresh` to regenerate the snapshot after changing
+the database and `python -m api.db schema validate` to check it is up to date.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Final
+
+from sqlalchemy import (
+    Column,
+    Connection,
+    Engine,
+    ForeignKeyConstraint,
+    Index,
+    MetaData,
+    Table,
+    UniqueConstraint,
+    text,
+)
+from sqlalchemy.dialects import postgresql
+
+SNAPSHOT_PATH: Final[Path] = Path(__file__).parent / "schema.json"
+
+# type arguments that are kept in the snapshot when set
+_TYPE_ARGS: Final[tuple[str, ...]] = ("length", "precision", "scale", "timezone")
+
+
+def _dump_column(column: Column) -> dict[str, Any]:
+    type_args = {
+        arg: getattr(column.type, arg)
+        for arg in _TYPE_ARGS
+        if getattr(column.type, arg, None)
+    }
+
+    return {
+        "name": column.name,
+        "type": type(column.type).__name__,
+        "type_args": type_args,
+        "nullable": column.nullable,
+        "primary_key": column.primary_key,
+        "autoincrement": column.autoincrement,
+        "server_default": (
+            None if column.server_default is None else column.server_default.arg.text
+        ),
+    }
+
+
+def _dump_table(table: Table) -> dict[str, Any]:
+    foreign_keys = [
+        {
+            "name": fk.name,
+            "columns": [c.name for c in fk.columns],
+            "references": [el.target_fullname for el in fk.elements],
+            "ondelete": fk.ondelete,
+            "onupdate": fk.onupdate,
+        }
+        for fk in table.foreign_key_constraints
+    ]
+    unique = [
+        {"name": c.name, "columns": [col.name for col in c.columns]}
+        for c in table.constraints
+        if isinstance(c, UniqueConstraint)
+    ]
+    indexes = [
+        {
+            "name": idx.name,
+            "columns": [c.name for c in idx.columns],
+            "unique": idx.unique,
+        }
+        for idx in table.indexes
+    ]
+
+    return {
+        "columns": [_dump_column(c) for c in table.columns],
+        "foreign_keys": sorted(foreign_keys, key=lambda fk: fk["name"] or ""),
+        "unique": sorted(unique, key=lambda u: u["name"] or ""),
+        "indexes": sorted(indexes, key=lambda i: i["name"] or ""),
+    }
+
+
+def dump_metadata(meta: MetaData) -> dict[str, Any]:
+    """Converts `meta` into a JSON-serializable dictionary.
+
+    Args:
+        meta (MetaData): The metadata to serialize, usually from reflection.
+    """
+    return {name: _dump_table(table) for name, table in sorted(meta.tables.items())}
+
+
+def _load_column(spec: dict[str, Any]) -> Column:
+    type_ = getattr(postgresql, spec["type"])(**spec["type_args"])
+    default = spec["server_default"]
+
+    return Column(
+        spec["name"],
+        type_,
+        nullable=spec["nullable"],
+        primary_key=spec["primary_key"],
+        autoincrement=spec["autoincrement"],
+        server_default=None if default is None else text(default),
+    )
+
+
+def load_metadata(snapshot: dict[str, Any], meta: MetaData | None = None) -> MetaData:
+    """Builds `Table` objects from a snapshot produced by `dump_metadata`.
+
+    Args:
+        snapshot (dict[str, Any]): The serialized schema.
+        meta (MetaData | None, optional): The metadata to add the tables to.
+            Defaults to a new `MetaData`.
+    """
+    meta = MetaData() if meta is None else meta
+
+    for name, spec in snapshot.items():
+        table = Table(name, meta, *(_load_column(c) for c in spec["columns"]))
+
+        for fk in spec["foreign_keys"]:
+            table.append_constraint(
+                ForeignKeyConstraint(
+                    fk["columns"],
+                    fk["references"],
+                    name=fk["name"],
+                    ondelete=fk["ondelete"],
+                    onupdate=fk["onupdate"],
+                )
+            )
+
+        for unique in spec["unique"]:
+            table.append_constraint(
+                UniqueConstraint(*unique["columns"], name=unique["name"])
+            )
+
+        for idx in spec["indexes"]:
+            Index(
+                idx["name"], *(table.c[c] for c in idx["columns"]), unique=idx["unique"]
+            )
+
+    return meta
+
+
+def reflect(bind: Engine | Connection) -> dict[str, Any]:
+    """Reflects the live database and returns its serialized schema.
+
+    Args:
+        bind (Engine | Connection): The engine or connection to reflect with.
+    """
+    meta = MetaData()
+    meta.reflect(bind=bind)
+    return dump_metadata(meta)
+
+
+def read_snapshot(path: Path = SNAPSHOT_PATH) -> dict[str, Any] | None:
+    """Reads the schema snapshot, returning `None` if it does not exist."""
+    if not path.is_file():
+        return None
+
+    return json.loads(path.read_text())
+
+
+def write_snapshot(snapshot: dict[str, Any], path: Path = SNAPSHOT_PATH):
+    """Writes `snapshot` to `path` in a stable, diff-friendly format."""
+    path.write_text(json.dumps(snapshot, indent=2) + "\n")
+
+
+def diff(expected: dict[str, Any], actual: dict[str, Any]) -> list[str]:
+    """Lists the differences between two serialized schemas.
+
+    Args:
+        expected (dict[str, Any]): The snapshot schema.
+        actual (dict[str, Any]): The schema reflected from the database.
+
+    Returns:
+        list[str]: Human-readable descriptions of each difference; empty if the
+            schemas match.
+    """
+    problems = []
+
+    for name in sorted(expected.keys() - actual.keys()):
+        problems.append(f"table '{name}' is missing from the database")
+    for name in sorted(actual.keys() - expected.keys()):
+        problems.append(f"table '{name}' is missing from the snapshot")
+
+    for name in sorted(expected.keys() & actual.keys()):
+        for key in ("columns", "foreign_keys", "unique", "indexes"):
+            if expected[name][key] != actual[name][key]:
+                problems.append(f"table '{name}' has different {key}")
+
+    return problems
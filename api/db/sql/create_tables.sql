@@ -126,6 +126,119 @@ CREATE TABLE Card (
     PRIMARY KEY (Card_Num)
 );
 
+-- Create Revoked_Token table
+-- Signed auth tokens (see api/auth.py) revoked before they expire
+CREATE TABLE Revoked_Token (
+    Token_ID        text,
+    Expires         bigint      NOT NULL, -- UNIX time; row can be dropped after
+
+    PRIMARY KEY (Token_ID)
+);
+
+-- Create Token_Cutoff table
+-- Signed auth tokens issued to a user before Issued_Before are revoked
+-- (no foreign key: deleted users' tokens must stay revoked)
+CREATE TABLE Token_Cutoff (
+    Email           text,
+    Issued_Before   bigint      NOT NULL, -- UNIX time in milliseconds
+
+    PRIMARY KEY (Email)
+);
+
+-- Create Chapter_Ledger table
+-- Bill totals per chapter and due date, kept up to date by the chapter_ledger_update
+-- trigger below so that a chapter's ledger is summarized without reading its bills
+-- (no foreign key: rows are removed once all of their bills have been deleted)
+CREATE TABLE Chapter_Ledger (
+    Chapter_ID          bigint,
+    Due_Date            date,
+    Bill_Count          bigint      NOT NULL,
+    Outstanding_Count   bigint      NOT NULL,
+    Total_Billed        numeric     NOT NULL,
+    Total_Paid          numeric     NOT NULL,
+    Outstanding_Amount  numeric     NOT NULL,
+
+    PRIMARY KEY (Chapter_ID, Due_Date)
+);
+
+-- Adds (direction = 1) or removes (direction = -1) a bill's share of Chapter_Ledger
+CREATE FUNCTION chapter_ledger_apply(changed Bill, direction int) RETURNS void AS $$
+BEGIN
+    INSERT INTO Chapter_Ledger AS ledger
+    VALUES (
+        changed.Chapter_ID,
+        changed.Due_Date::date,
+        direction,
+        direction * (changed.Amount_Paid < changed.Amount)::int,
+        direction * changed.Amount::numeric,
+        direction * changed.Amount_Paid::numeric,
+        direction * greatest(changed.Amount - changed.Amount_Paid, 0)::numeric
+    )
+    ON CONFLICT (Chapter_ID, Due_Date) DO UPDATE SET
+        Bill_Count = ledger.Bill_Count + excluded.Bill_Count,
+        Outstanding_Count = ledger.Outstanding_Count + excluded.Outstanding_Count,
+        Total_Billed = ledger.Total_Billed + excluded.Total_Billed,
+        Total_Paid = ledger.Total_Paid + excluded.Total_Paid,
+        Outstanding_Amount = ledger.Outstanding_Amount + excluded.Outstanding_Amount;
+
+    IF direction < 0 THEN
+        DELETE FROM Chapter_Ledger
+        WHERE Chapter_ID = changed.Chapter_ID
+            AND Due_Date = changed.Due_Date::date
+            AND Bill_Count = 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION chapter_ledger_trigger() RETURNS trigger AS $$
+BEGIN
+    -- most updates are payments, which stay in the same row of the ledger
+    IF TG_OP = 'UPDATE'
+        AND OLD.Chapter_ID = NEW.Chapter_ID
+        AND OLD.Due_Date::date = NEW.Due_Date::date
+    THEN
+        UPDATE Chapter_Ledger SET
+            Outstanding_Count = Outstanding_Count
+                + (NEW.Amount_Paid < NEW.Amount)::int
+                - (OLD.Amount_Paid < OLD.Amount)::int,
+            Total_Billed = Total_Billed + NEW.Amount::numeric - OLD.Amount::numeric,
+            Total_Paid = Total_Paid + NEW.Amount_Paid::numeric - OLD.Amount_Paid::numeric,
+            Outstanding_Amount = Outstanding_Amount
+                + greatest(NEW.Amount - NEW.Amount_Paid, 0)::numeric
+                - greatest(OLD.Amount - OLD.Amount_Paid, 0)::numeric
+        WHERE Chapter_ID = NEW.Chapter_ID AND Due_Date = NEW.Due_Date::date;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM chapter_ledger_apply(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM chapter_ledger_apply(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER chapter_ledger_update
+    AFTER INSERT OR DELETE OR UPDATE OF Chapter_ID, Amount, Amount_Paid, Due_Date ON Bill
+    FOR EACH ROW EXECUTE FUNCTION chapter_ledger_trigger();
+
+-- Indexes on foreign-key and filter columns used by the API
+-- (existing databases: see api/db/migrations/002_lookup_indexes.sql and
+-- 003_bill_filter_indexes.sql)
+CREATE INDEX member_chapter_id_idx ON Member (Chapter_ID);
+CREATE INDEX chapter_org_name_idx ON Chapter (Org_Name);
+CREATE INDEX chapter_school_name_idx ON Chapter (School_Name);
+CREATE INDEX bill_chapter_id_bill_id_idx ON Bill (Chapter_ID, Bill_ID);
+CREATE INDEX bill_chapter_id_due_date_idx ON Bill (Chapter_ID, Due_Date);
+CREATE INDEX internal_bill_bill_id_idx ON Internal_Bill (Bill_ID);
+CREATE INDEX internal_bill_member_email_bill_id_idx ON Internal_Bill (Member_Email, Bill_ID);
+CREATE INDEX external_bill_bill_id_idx ON External_Bill (Bill_ID);
+CREATE INDEX payment_info_member_email_idx ON Payment_Info (Member_Email);
+CREATE INDEX bank_account_payment_id_idx ON Bank_Account (Payment_ID);
+CREATE INDEX card_payment_id_idx ON Card (Payment_ID);
+
 
 INSERT INTO Organization (Name, Greek_Letters, Type)
     VALUES ('Lambda Chi Alpha', 'LCA', 'Social'),
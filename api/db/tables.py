@@ -1,12 +1,11 @@
+import logging
 from typing import Any, Final
 
-from sqlalchemy import MetaData, Table, text
+from sqlalchemy import Connection, Engine, MetaData, Table
 
-from . import engine
+from . import engine, schema
 
-_META = MetaData()
-
-_TABLES_QUERY = "SELECT table_name FROM information_schema.tables WHERE table_schema='public' AND table_type='BASE TABLE'"
+logger = logging.getLogger(__name__)
 
 
 class _TableManager:
@@ -16,7 +15,33 @@ class _TableManager:
         self.load_tables()
 
     def load_tables(self):
-        self.meta.reflect(bind=engine.get_engine())
+        """Loads table definitions from the schema snapshot, reflecting the live
+        database only if no snapshot exists.
+        """
+        snapshot = schema.read_snapshot()
+
+        if snapshot is None:
+            logger.warning(
+                "No schema snapshot found; reflecting the database instead. "
+                "Run `python -m api.db schema refresh` to create one."
+            )
+            self.meta.reflect(bind=engine.get_engine())
+        else:
+            schema.load_metadata(snapshot, self.meta)
+
+    def validate(self, bind: Engine | Connection | None = None) -> list[str]:
+        """Compares the loaded tables against the live database.
+
+        Args:
+            bind (Engine | Connection | None, optional): What to reflect the database
+                with. Defaults to the sync engine.
+
+        Returns:
+            list[str]: Descriptions of each difference; empty if the schemas match.
+        """
+        return schema.diff(
+            schema.dump_metadata(self.meta), schema.reflect(bind or engine.get_engine())
+        )
 
     def __getattr__(self, name) -> Table | Any:
         if name in self.meta.tables:
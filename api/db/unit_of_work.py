@@ -0,0 +1,112 @@
+"""A connection and transaction shared by everything a request does.
+
+Route handlers declare a `Transaction` parameter and call `connection()` wherever
+they need the database:
+
+    @router.delete("/{bill_id}")
+    async def delete_bill(bill_id: uuid.UUID, tx: db.Transaction, ...):
+        conn = await tx.connection()
+        ...
+        tx.after_commit(lambda: ownership.BILL_CHAPTERS.discard(str(bill_id)))
+
+The connection is checked out of the pool on the first call (so requests rejected
+before touching the database never take one) and every later call returns it, so
+authorization checks and writes see the same snapshot and are committed together.
+Once the handler returns, the transaction is committed; if it raises (including
+`HTTPException`s), it is rolled back. Either way, the connection is returned to the
+pool before the response is sent.
+
+Handlers must not commit or roll back the connection themselves. Work that should
+only happen once the changes are visible to other requests (such as invalidating
+caches) is registered with `after_commit`.
+
+Note: the connection cannot outlive the request, so streamed responses and loads
+shared through `api.cache` use their own connections.
+"""
+
+from typing import Annotated, AsyncIterator, Callable
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from api.utils import export
+
+from .engine import get_async_engine
+
+__all__ = ["Transaction"]
+
+
+@export
+class UnitOfWork:
+    """A lazily opened connection and transaction, committed as a whole."""
+
+    __slots__ = ("_conn", "_after_commit")
+
+    def __init__(self):
+        self._conn: AsyncConnection | None = None
+        self._after_commit: list[Callable[[], object]] = []
+
+    @property
+    def checked_out(self) -> bool:
+        """Whether a connection was checked out (and a transaction begun)."""
+        return self._conn is not None
+
+    async def connection(self) -> AsyncConnection:
+        """Returns the request's connection, checking it out and beginning a
+        transaction on the first call.
+        """
+        if self._conn is None:
+            conn = await get_async_engine().connect()
+            try:
+                await conn.begin()
+            except BaseException:
+                await conn.close()
+                raise
+            self._conn = conn
+
+        return self._conn
+
+    def after_commit(self, callback: Callable[[], object]):
+        """Calls `callback` once the transaction is committed, in registration
+        order. It is not called if the transaction is rolled back.
+
+        Args:
+            callback (Callable[[], object]): The function to call.
+        """
+        self._after_commit.append(callback)
+
+    async def commit(self):
+        """Commits the transaction, if any, and runs the `after_commit` callbacks."""
+        if self._conn is not None:
+            await self._conn.commit()
+
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    async def close(self):
+        """Returns the connection to the pool, rolling back anything uncommitted."""
+        self._after_commit.clear()
+
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await conn.close()
+
+
+@export
+async def unit_of_work() -> AsyncIterator[UnitOfWork]:
+    """A FastAPI dependency providing the request's `UnitOfWork`; see `Transaction`.
+
+    Yields:
+        UnitOfWork: The unit of work, committed if the handler returns normally.
+    """
+    work = UnitOfWork()
+    try:
+        yield work
+        await work.commit()
+    finally:
+        await work.close()
+
+
+# the request's `UnitOfWork`; dependencies requesting it share the same one
+Transaction = Annotated[UnitOfWork, Depends(unit_of_work)]
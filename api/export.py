@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import csv
+import enum
+import io
+from typing import Any, AsyncIterator, Callable, Final
+
+import orjson
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+
+from api import db
+from api.responses import ORJSON_OPTIONS, orjson_default
+
+# the number of rows fetched from the server-side cursor (and written) at a time
+EXPORT_BATCH_SIZE: Final[int] = 1000
+
+
+class ExportFormat(str, enum.Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+_MEDIA_TYPES: Final[dict[ExportFormat, str]] = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
+
+async def _stream_rows(query: Select) -> AsyncIterator[list[dict[str, Any]]]:
+    """Yields the results of `query` in batches using a server-side cursor, so only
+    one batch is held in memory at a time.
+    """
+    async with db.get_async_connection() as conn:
+        result = await conn.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+
+        async for rows in result.mappings().partitions():
+            yield [dict(row) for row in rows]
+
+
+async def _ndjson(
+    query: Select, transform: Callable[[dict[str, Any]], dict[str, Any]]
+) -> AsyncIterator[bytes]:
+    async for rows in _stream_rows(query):
+        yield b"".join(
+            orjson.dumps(
+                transform(row),
+                orjson_default,
+                ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE,
+            )
+            for row in rows
+        )
+
+
+async def _csv(query: Select) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow([column.name for column in query.selected_columns])
+    yield buffer.getvalue()
+
+    async for rows in _stream_rows(query):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(row.values() for row in rows)
+        yield buffer.getvalue()
+
+
+def export(
+    query: Select,
+    format: ExportFormat,
+    filename: str,
+    transform: Callable[[dict[str, Any]], dict[str, Any]] = lambda row: row,
+) -> StreamingResponse:
+    """Creates a response that streams the results of `query` as NDJSON or CSV.
+
+    Note: authorization must be checked before calling this; the query runs after
+    the route returns, while the response is being sent.
+
+    Args:
+        query (Select): The query to export.
+        format (ExportFormat): The format of the exported rows.
+        filename (str): The suggested file name, without an extension.
+        transform (Callable[[dict[str, Any]], dict[str, Any]], optional): Applied to
+            each row before it is written as NDJSON. Defaults to no changes.
+    """
+    body = _ndjson(query, transform) if format == ExportFormat.ndjson else _csv(query)
+
+    return StreamingResponse(
+        body,
+        media_type=_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{format.value}"'
+        },
+    )
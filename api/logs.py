@@ -0,0 +1,163 @@
+"""Logging configuration for the API.
+
+Handlers do not run on the thread that logs: records are put on a queue by a
+`QueueHandler` and rendered and written by a `QueueListener` thread, so neither
+Rich's rendering nor a slow terminal or log collector delays requests.
+
+Two formats are available (`LOG_FORMAT`):
+
+- `rich`: colored, human-readable output for development;
+- `json`: one JSON object per line, for log collectors.
+
+`LOG_LEVEL` sets the root level and `LOG_LEVELS` overrides it per logger (e.g.,
+`LOG_LEVELS='{"api.routes": "DEBUG", "uvicorn.access": "WARNING"}'`). Records below
+a logger's level are discarded before their message is formatted, so log calls
+should pass their arguments separately (`logger.info("user %s", email)`) rather
+than as f-strings.
+"""
+
+import atexit
+import copy
+import datetime
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Final, Literal, TextIO
+
+import orjson
+
+from api.config import CONFIG
+
+LogFormat = Literal["rich", "json"]
+
+# the attributes of every `LogRecord`, any others having been passed with `extra=`,
+# and uvicorn's `color_message`, a colored copy of the message
+_RECORD_ATTRIBUTES: Final[frozenset[str]] = frozenset(
+    logging.makeLogRecord({}).__dict__
+) | {"message", "asctime", "taskName", "color_message"}
+
+_LISTENER: QueueListener | None = None
+_HANDLER: QueueHandler | None = None
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects.
+
+    Each object has the keys `time` (ISO 8601, UTC), `level`, `logger`, and
+    `message`, along with `exception` if one was logged and any `extra=` fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "time": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+
+        for name, value in record.__dict__.items():
+            if name not in _RECORD_ATTRIBUTES:
+                entry[name] = value
+
+        return orjson.dumps(entry, default=str).decode()
+
+
+class _QueueHandler(QueueHandler):
+    """A `QueueHandler` that leaves formatting to the listener's handler.
+
+    The standard handler formats each record before queueing it, which would run the
+    listener's work (and discard structured exceptions) on the logging thread. Only
+    the message is resolved here, so that the arguments cannot change before the
+    record is written.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # other handlers of the same record still see the original
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _handler(log_format: LogFormat, stream: TextIO) -> logging.Handler:
+    if log_format == "json":
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(JSONFormatter())
+        return handler
+
+    # imported here since Rich is slow to import and only used in development
+    from rich.console import Console
+    from rich.logging import RichHandler
+
+    handler = RichHandler(console=Console(file=stream))
+    handler.setFormatter(logging.Formatter("%(message)s", datefmt="[%X]"))
+    return handler
+
+
+def configure(
+    log_format: LogFormat = CONFIG.log_format,
+    level: str = CONFIG.log_level,
+    levels: dict[str, str] = CONFIG.log_levels,
+    stream: TextIO | None = None,
+):
+    """Configures the root logger to write through a background thread.
+
+    Calling it again replaces the previous configuration, after flushing it.
+
+    Args:
+        log_format (LogFormat, optional): The output format. Defaults to
+            `LOG_FORMAT`.
+        level (str, optional): The level of the root logger. Defaults to `LOG_LEVEL`.
+        levels (dict[str, str], optional): The levels of specific loggers. Defaults
+            to `LOG_LEVELS`.
+        stream (TextIO | None, optional): Where to write logs. Defaults to stderr.
+    """
+    global _LISTENER, _HANDLER
+
+    shutdown()
+
+    records: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    _LISTENER = QueueListener(
+        records, _handler(log_format, stream or sys.stderr), respect_handler_level=True
+    )
+    _LISTENER.start()
+    _HANDLER = _QueueHandler(records)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_HANDLER)
+    root.setLevel(level.upper())
+
+    for name, logger_level in levels.items():
+        logging.getLogger(name).setLevel(logger_level.upper())
+
+
+def shutdown():
+    """Writes the queued records and stops the background thread, if running.
+
+    Records logged afterwards go to Python's fallback handler (warnings and errors
+    to stderr) until `configure` is called again.
+    """
+    global _LISTENER, _HANDLER
+
+    if _HANDLER is not None:
+        logging.getLogger().removeHandler(_HANDLER)
+        _HANDLER = None
+
+    if _LISTENER is not None:
+        _LISTENER.stop()
+        _LISTENER = None
+
+
+atexit.register(shutdown)
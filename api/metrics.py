@@ -0,0 +1,316 @@
+"""Per-route request and database metrics in the Prometheus text format.
+
+`MetricsMiddleware` times each request and, through SQLAlchemy events installed by
+`instrument_engine` and the pool hook `record_pool_wait`, counts the queries it
+makes, the time spent executing them, the pooled connections it checks out, and the
+time spent waiting for them. The totals are kept per route template (e.g.,
+`/chapter/{chapter_id}`) so the number of series stays bounded.
+
+Recording is cheap enough to stay on in production: a request costs a context
+variable, a few `perf_counter` calls, and a dictionary lookup, and a query two
+event callbacks. Everything is updated from the event loop (or, for the sync
+engine, from the request's own worker thread), so no locks are taken.
+
+Note: each worker process keeps its own metrics.
+"""
+
+import bisect
+import contextvars
+import time
+from typing import Any, Final, Iterable
+
+from sqlalchemy import Engine, event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# upper bounds (in seconds) of the request latency histogram buckets
+LATENCY_BUCKETS: Final[tuple[float, ...]] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# upper bounds of the per-request connection checkout histogram buckets
+CHECKOUT_BUCKETS: Final[tuple[int, ...]] = (0, 1, 2, 3, 5, 10)
+
+# the route label of requests that did not match a route
+UNMATCHED_ROUTE: Final[str] = "unmatched"
+
+# the media type of the text format (Starlette adds the charset)
+CONTENT_TYPE: Final[str] = "text/plain; version=0.0.4"
+
+
+class _Request:
+    """The database usage of the current request."""
+
+    __slots__ = ("queries", "query_time", "checkouts", "pool_wait")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.checkouts = 0
+        self.pool_wait = 0.0
+
+
+class _Route:
+    """The totals of every request to a route."""
+
+    __slots__ = (
+        "buckets",
+        "latency_sum",
+        "queries",
+        "query_time",
+        "checkout_buckets",
+        "checkouts",
+        "pool_wait",
+    )
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.queries = 0
+        self.query_time = 0.0
+        self.checkout_buckets = [0] * (len(CHECKOUT_BUCKETS) + 1)
+        self.checkouts = 0
+        self.pool_wait = 0.0
+
+
+_CURRENT: contextvars.ContextVar[_Request | None] = contextvars.ContextVar(
+    "metrics_request", default=None
+)
+
+# keyed by (method, route)
+_ROUTES: dict[tuple[str, str], _Route] = {}
+# keyed by (method, route, status)
+_RESPONSES: dict[tuple[str, str, int], int] = {}
+
+# database usage outside of requests (e.g., by background tasks)
+_BACKGROUND = _Request()
+
+
+def _current() -> _Request:
+    return _CURRENT.get() or _BACKGROUND
+
+
+def record_pool_wait(seconds: float):
+    """Adds a connection checkout, and the time spent waiting for it, to the current
+    request.
+    """
+    request = _current()
+    request.checkouts += 1
+    request.pool_wait += seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    request = _current()
+    request.queries += 1
+    request.query_time += time.perf_counter() - context._metrics_start
+
+
+def _handle_error(exception_context):
+    context = exception_context.execution_context
+    if context is not None and hasattr(context, "_metrics_start"):
+        _after_cursor_execute(None, None, None, None, context, None)
+
+
+def instrument_engine(engine: Engine):
+    """Counts and times the queries executed by `engine`.
+
+    Args:
+        engine (Engine): The engine to instrument; use `AsyncEngine.sync_engine` for
+            async engines.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the latency and database usage of each request."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = _Request()
+        token = _CURRENT.set(request)
+        status = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            latency = time.perf_counter() - start
+            _CURRENT.reset(token)
+
+            # set by FastAPI once the request is routed
+            route = scope.get("route")
+            key = (scope["method"], UNMATCHED_ROUTE if route is None else route.path)
+
+            totals = _ROUTES.get(key)
+            if totals is None:
+                totals = _ROUTES[key] = _Route()
+
+            totals.buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+            totals.latency_sum += latency
+            totals.queries += request.queries
+            totals.query_time += request.query_time
+            totals.checkout_buckets[
+                bisect.bisect_left(CHECKOUT_BUCKETS, request.checkouts)
+            ] += 1
+            totals.checkouts += request.checkouts
+            totals.pool_wait += request.pool_wait
+
+            response_key = (*key, status)
+            _RESPONSES[response_key] = _RESPONSES.get(response_key, 0) + 1
+
+
+def format_labels(**labels: Any) -> str:
+    """Formats Prometheus labels (without the braces)."""
+
+    def escape(value: Any) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return ",".join(f'{name}="{escape(value)}"' for name, value in labels.items())
+
+
+def format_family(
+    name: str, kind: str, help: str, samples: Iterable[tuple[str, str, float]]
+) -> list[str]:
+    """Formats a metric family as Prometheus text lines.
+
+    Args:
+        name (str): The name of the metric.
+        kind (str): The metric type (e.g., `"counter"` or `"histogram"`).
+        help (str): The description of the metric.
+        samples (Iterable[tuple[str, str, float]]): `(suffix, labels, value)` for
+            each sample, where `labels` is formatted by `format_labels`.
+    """
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for suffix, labels, value in samples:
+        labels = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}{suffix}{labels} {value}")
+    return lines
+
+
+def format_histogram(
+    labels: str, bounds: Iterable[float], counts: Iterable[int], total: float
+) -> list[tuple[str, str, float]]:
+    """Returns the samples of a histogram for `format_family`.
+
+    Args:
+        labels (str): The labels of the histogram, formatted by `format_labels`.
+        bounds (Iterable[float]): The upper bounds of the finite buckets.
+        counts (Iterable[int]): The number of observations in each bucket (not
+            cumulative), the last of which is the `+Inf` bucket.
+        total (float): The sum of the observations.
+    """
+    prefix = f"{labels}," if labels else ""
+    samples = []
+    cumulative = 0
+
+    for bound, count in zip([*bounds, "+Inf"], counts):
+        cumulative += count
+        samples.append(("_bucket", f'{prefix}le="{bound}"', cumulative))
+
+    samples.append(("_sum", labels, total))
+    samples.append(("_count", labels, cumulative))
+    return samples
+
+
+def render_requests() -> list[str]:
+    """Returns the request and per-route database metrics as Prometheus text lines."""
+    routes = [
+        (format_labels(method=method, route=route), totals)
+        for (method, route), totals in _ROUTES.items()
+    ]
+    background = format_labels(method="", route="background")
+
+    def per_route(attribute: str) -> list[tuple[str, str, float]]:
+        return [
+            *(("", labels, getattr(totals, attribute)) for labels, totals in routes),
+            ("", background, getattr(_BACKGROUND, attribute)),
+        ]
+
+    return [
+        *format_family(
+            "http_requests_total",
+            "counter",
+            "Requests by route and response status.",
+            (
+                ("", format_labels(method=method, route=route, status=status), n)
+                for (method, route, status), n in _RESPONSES.items()
+            ),
+        ),
+        *format_family(
+            "http_request_duration_seconds",
+            "histogram",
+            "Request latency by route.",
+            (
+                sample
+                for labels, totals in routes
+                for sample in format_histogram(
+                    labels, LATENCY_BUCKETS, totals.buckets, totals.latency_sum
+                )
+            ),
+        ),
+        *format_family(
+            "db_queries_total", "counter", "Queries by route.", per_route("queries")
+        ),
+        *format_family(
+            "db_query_duration_seconds_total",
+            "counter",
+            "Time spent executing queries by route.",
+            per_route("query_time"),
+        ),
+        *format_family(
+            "db_pool_checkouts_per_request",
+            "histogram",
+            "Pooled connections checked out per request by route.",
+            (
+                sample
+                for labels, totals in routes
+                for sample in format_histogram(
+                    labels,
+                    CHECKOUT_BUCKETS,
+                    totals.checkout_buckets,
+                    totals.checkouts,
+                )
+            ),
+        ),
+        *format_family(
+            "db_pool_wait_seconds_total",
+            "counter",
+            "Time spent waiting for a pooled connection by route.",
+            per_route("pool_wait"),
+        ),
+        # not `db_pool_checkouts_total`, which `/metrics` already uses for the
+        # per-pool counter
+        *format_family(
+            "db_request_pool_checkouts_total",
+            "counter",
+            "Pooled connections checked out by route.",
+            per_route("checkouts"),
+        ),
+    ]
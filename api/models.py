@@ -118,3 +118,22 @@ class ExternalBill(Bill):
 
 class InternalBill(Bill):
     member_email: str
+
+
+class LedgerAgingBucket(BaseModel):
+    min_days_overdue: int
+    max_days_overdue: int | None
+    count: int
+    amount: float
+
+
+class ChapterLedger(BaseModel):
+    chapter_id: int
+    bill_count: int
+    total_billed: float
+    total_paid: float
+    outstanding_count: int
+    outstanding_amount: float
+    overdue_count: int
+    overdue_amount: float
+    aging: list[LedgerAgingBucket]
@@ -0,0 +1,169 @@
+"""Caches of who owns a resource, for authorization checks.
+
+Many routes look up which chapter a bill or member belongs to (or which member a
+payment option belongs to) only to authorize the request. Ownership rarely changes,
+so the answers are kept in bounded LRU caches:
+
+- `BILL_CHAPTERS`: bill ID (as a string) -> chapter ID;
+- `MEMBER_CHAPTERS`: member email -> chapter ID;
+- `PAYMENT_MEMBERS`: payment ID -> member email.
+
+Only existing resources are cached. Routes that delete resources or change their
+owner invalidate the affected entries (including those removed by cascading deletes)
+once their transaction commits. Lookups pass the cache's `generation` from before
+their query to `set`, so that an owner read before an invalidation is not cached.
+Each worker process has its own caches, so changes made through another worker are
+only seen once the entries expire (after `OWNERSHIP_CACHE_TTL` seconds).
+"""
+
+import collections
+import os
+import time
+from typing import Any, Final, Generic, Hashable, TypeVar
+
+from api.config import CONFIG
+
+_K = TypeVar("_K", bound=Hashable)
+_V = TypeVar("_V")
+
+
+class OwnershipCache(Generic[_K, _V]):
+    """A bounded LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        """
+        Args:
+            ttl (float): The number of seconds an entry is used for.
+            max_entries (int): The maximum number of entries; the least recently used
+                entry is evicted to make room for a new one.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        # values are `(owner, expires)`
+        self._entries: collections.OrderedDict[_K, tuple[_V, float]] = (
+            collections.OrderedDict()
+        )
+        self._generation = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        """Incremented by every invalidation."""
+        return self._generation
+
+    def get(self, key: _K) -> _V | None:
+        """Returns the cached owner of `key`, or `None` if it is not cached."""
+        entry = self._entries.get(key)
+
+        if entry is None or entry[1] <= time.monotonic():
+            self._misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return entry[0]
+
+    def set(self, key: _K, owner: _V, generation: int):
+        """Caches `owner` as the owner of `key`.
+
+        Args:
+            key (_K): The resource.
+            owner (_V): Its owner.
+            generation (int): The cache's `generation` from before `owner` was read;
+                if an invalidation happened since, `owner` may be stale and is not
+                cached.
+        """
+        if generation != self._generation:
+            return
+
+        self._entries[key] = (owner, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def discard(self, *keys: _K):
+        """Drops the entries of `keys`, if cached."""
+        self._generation += 1
+        for key in keys:
+            if self._entries.pop(key, None) is not None:
+                self._invalidations += 1
+
+    def discard_owner(self, owner: _V):
+        """Drops every entry owned by `owner`."""
+        self.discard(
+            *[key for key, entry in self._entries.items() if entry[0] == owner]
+        )
+
+    def clear(self):
+        """Drops every entry."""
+        self._generation += 1
+        self._invalidations += len(self._entries)
+        self._entries.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "invalidations": self._invalidations,
+        }
+
+
+BILL_CHAPTERS: Final[OwnershipCache[str, int]] = OwnershipCache(
+    CONFIG.ownership_cache_ttl, CONFIG.ownership_cache_max_entries
+)
+MEMBER_CHAPTERS: Final[OwnershipCache[str, int]] = OwnershipCache(
+    CONFIG.ownership_cache_ttl, CONFIG.ownership_cache_max_entries
+)
+PAYMENT_MEMBERS: Final[OwnershipCache[int, str]] = OwnershipCache(
+    CONFIG.ownership_cache_ttl, CONFIG.ownership_cache_max_entries
+)
+
+
+def forget_member(email: str):
+    """Invalidates a deleted member (or one whose chapter or email changed), along
+    with their payment options.
+    """
+    MEMBER_CHAPTERS.discard(email)
+    PAYMENT_MEMBERS.discard_owner(email)
+
+
+def forget_chapter(chapter_id: int):
+    """Invalidates the bills and members of a deleted chapter, along with the
+    members' payment options.
+    """
+    BILL_CHAPTERS.discard_owner(chapter_id)
+    MEMBER_CHAPTERS.discard_owner(chapter_id)
+    # the members' emails are no longer known
+    PAYMENT_MEMBERS.clear()
+
+
+def clear():
+    """Invalidates every entry, e.g. after deleting organizations or schools, which
+    deletes their chapters.
+    """
+    for cache in (BILL_CHAPTERS, MEMBER_CHAPTERS, PAYMENT_MEMBERS):
+        cache.clear()
+
+
+def stats() -> dict[str, dict[str, Any]]:
+    """Returns the statistics of each ownership cache."""
+    return {
+        "bill_chapters": BILL_CHAPTERS.stats(),
+        "member_chapters": MEMBER_CHAPTERS.stats(),
+        "payment_members": PAYMENT_MEMBERS.stats(),
+    }
+
+
+# a worker forked from a process that already served requests starts empty
+os.register_at_fork(after_in_child=clear)
@@ -0,0 +1,112 @@
+import base64
+import json
+from typing import Annotated, Any, Final, Sequence
+
+from fastapi import Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import Column, Row, Select, tuple_
+
+MAX_PAGE_SIZE: Final[int] = 1000
+
+
+def _encode_cursor(values: tuple[Any, ...]) -> str:
+    data = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _decode_cursor(cursor: str) -> list[Any]:
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(data)
+    except ValueError:
+        values = None
+
+    if not isinstance(values, list):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid pagination cursor.")
+
+    return values
+
+
+class Pagination:
+    """FastAPI dependency implementing keyset (cursor-based) pagination.
+
+    Pagination is opt-in so that existing clients keep receiving full lists: when
+    `limit` is provided, at most `limit` rows are returned and, if more remain, an
+    opaque cursor for the next page is sent in the `X-Next-Cursor` header (along
+    with a `Link: <...>; rel="next"` header). Pages are selected with
+    `WHERE key > cursor` on a unique sort key, so every page costs the same.
+
+    Usage:
+
+        query = page.apply(query, table.c.id)
+        rows = page.paginate((await conn.execute(query)).all())
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        response: Response,
+        limit: Annotated[
+            int | None,
+            Query(ge=1, le=MAX_PAGE_SIZE, description="The maximum rows to return."),
+        ] = None,
+        cursor: Annotated[
+            str | None,
+            Query(description="The `X-Next-Cursor` of the previous page."),
+        ] = None,
+    ):
+        self._request = request
+        self._response = response
+        self.limit = limit
+        self.after = None if cursor is None else _decode_cursor(cursor)
+        self._keys: list[str] = []
+
+    def apply(self, query: Select, *keys: Column) -> Select:
+        """Restricts `query` to the requested page.
+
+        Args:
+            query (Select): The query to paginate.
+            *keys (Column): The columns to sort by; together, they must be unique.
+
+        Raises:
+            HTTPException: 400; if the cursor does not match the sort keys.
+        """
+        self._keys = [key.name for key in keys]
+
+        if self.after is not None:
+            if len(self.after) != len(keys):
+                raise HTTPException(
+                    status.HTTP_400_BAD_REQUEST, "Invalid pagination cursor."
+                )
+            if len(keys) == 1:
+                query = query.where(keys[0] > self.after[0])
+            else:
+                query = query.where(tuple_(*keys) > tuple_(*self.after))
+
+        if self.limit is not None:
+            query = query.order_by(*keys).limit(self.limit + 1)
+
+        return query
+
+    def paginate(self, rows: Sequence[Row[Any]]) -> Sequence[Row[Any]]:
+        """Trims the rows fetched with `apply` to the page size, setting the next
+        page's cursor in the response headers if there are more rows.
+
+        Args:
+            rows (Sequence[Row[Any]]): The rows fetched with the paginated query,
+                in sort key order.
+        """
+        if self.limit is None or len(rows) <= self.limit:
+            return rows
+
+        rows = rows[: self.limit]
+        last = rows[-1]._mapping
+        cursor = _encode_cursor(tuple(last[key] for key in self._keys))
+
+        next_url = self._request.url.include_query_params(cursor=cursor)
+        self._response.headers["X-Next-Cursor"] = cursor
+        self._response.headers["Link"] = f'<{next_url}>; rel="next"'
+
+        return rows
+
+
+Page = Annotated[Pagination, Depends()]
@@ -0,0 +1,305 @@
+"""Password hashing with scrypt, run in a pool of worker processes.
+
+A hash takes tens of milliseconds of CPU (by design, to slow down guessing), which
+would stall the event loop (or, in threads, compete with it for the GIL) during a
+burst of logins. Hashes are instead computed by a `ProcessPoolExecutor` with
+`PASSWORD_HASH_PROCESSES` processes, with at most `PASSWORD_HASH_CONCURRENCY` of them
+submitted at once; further logins wait their turn without holding a database
+connection. The processes are spawned rather than forked, so scripts serving the app
+(e.g., with a `TestClient`) must do so under `if __name__ == "__main__":`.
+
+Hashes are stored as `$scrypt$ln=<log2(n)>,r=<r>,p=<p>$<salt>$<hash>` (base64,
+unpadded), so that changing the cost parameters only affects new hashes; `needs_rehash`
+tells whether a stored password should be rehashed with the current ones. Anything else
+stored in `"user".password` is treated as a plaintext password from before hashing,
+which is replaced by a hash on the user's next login.
+
+`FAILED_LOGINS` remembers failed `(email, password)` attempts for
+`LOGIN_FAILURE_CACHE_TTL` seconds, so that retrying the same wrong password is rejected
+without hashing it again. Its keys hold a keyed digest of the password, never the
+password itself.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import multiprocessing
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Final, Sequence, TypeVar
+
+from api.config import CONFIG
+from api.ownership import OwnershipCache
+
+_T = TypeVar("_T")
+
+logger = logging.getLogger(__name__)
+
+PREFIX: Final[str] = "$scrypt$"
+
+# the length (in bytes) of generated salts and hashes
+_SALT_LENGTH: Final[int] = 16
+_HASH_LENGTH: Final[int] = 32
+
+PROCESSES: Final[int] = CONFIG.password_hash_processes or max(
+    (os.cpu_count() or 1) // CONFIG.server_workers, 1
+)
+CONCURRENCY: Final[int] = CONFIG.password_hash_concurrency or 2 * PROCESSES
+
+# keys are `(email, failure_digest(password))` and values the email, so that
+# `discard_owner(email)` forgets every failure of a user
+FAILED_LOGINS: Final[OwnershipCache[tuple[str, bytes], str]] = OwnershipCache(
+    CONFIG.login_failure_cache_ttl, CONFIG.login_failure_cache_max_entries
+)
+_FAILURE_KEY: Final[bytes] = secrets.token_bytes(32)
+
+_POOL: ProcessPoolExecutor | None = None
+_LIMIT: asyncio.Semaphore | None = None
+# a hash of a random password, verified against for unknown users so that they take
+# as long to reject as wrong passwords
+_DUMMY_HASH: str | None = None
+
+_hashes = 0
+_verifications = 0
+_plaintext_verifications = 0
+_in_flight = 0
+_waiting = 0
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(),
+        salt=salt,
+        n=n,
+        r=r,
+        p=p,
+        # the memory scrypt needs, plus some slack; OpenSSL's default limit is 32 MiB
+        maxmem=128 * r * (n + p + 2) + (1 << 20),
+        dklen=_HASH_LENGTH,
+    )
+
+
+def _hash(password: str, n: int, r: int, p: int) -> str:
+    # runs in the worker processes
+    salt = os.urandom(_SALT_LENGTH)
+    digest = _scrypt(password, salt, n, r, p)
+    return (
+        f"{PREFIX}ln={n.bit_length() - 1},r={r},p={p}"
+        f"${_b64encode(salt)}${_b64encode(digest)}"
+    )
+
+
+def _parse(hashed: str) -> tuple[int, int, int, bytes, bytes]:
+    params, salt, digest = hashed[len(PREFIX) :].split("$")
+    values = dict(param.split("=") for param in params.split(","))
+    return (
+        1 << int(values["ln"]),
+        int(values["r"]),
+        int(values["p"]),
+        _b64decode(salt),
+        _b64decode(digest),
+    )
+
+
+def _verify(password: str, hashed: str) -> bool:
+    # runs in the worker processes
+    n, r, p, salt, digest = _parse(hashed)
+    return hmac.compare_digest(_scrypt(password, salt, n, r, p), digest)
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _POOL, _LIMIT
+
+    if _POOL is None:
+        # "spawn" rather than forking the server, whose threads and connections the
+        # workers do not need
+        _POOL = ProcessPoolExecutor(
+            PROCESSES, mp_context=multiprocessing.get_context("spawn")
+        )
+    if _LIMIT is None:
+        _LIMIT = asyncio.Semaphore(CONCURRENCY)
+
+    return _POOL
+
+
+async def _run(func: Callable[..., _T], *args: Any) -> _T:
+    global _POOL, _in_flight, _waiting
+
+    pool, limit = _pool(), _LIMIT
+
+    _waiting += 1
+    try:
+        await limit.acquire()
+    finally:
+        _waiting -= 1
+
+    _in_flight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        # a worker died (e.g., killed for using too much memory); later calls start
+        # a new pool
+        logger.error("A password hashing process died; restarting the pool")
+        if _POOL is pool:
+            _POOL = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        _in_flight -= 1
+        limit.release()
+
+
+async def hash_password(password: str) -> str:
+    """Hashes `password` with the current cost parameters.
+
+    Args:
+        password (str): The password to hash.
+
+    Returns:
+        str: The hash, to be stored in `"user".password`.
+    """
+    global _hashes
+
+    _hashes += 1
+    return await _run(
+        _hash,
+        password,
+        CONFIG.password_scrypt_n,
+        CONFIG.password_scrypt_r,
+        CONFIG.password_scrypt_p,
+    )
+
+
+async def hash_passwords(passwords: Sequence[str]) -> list[str]:
+    """Hashes many passwords (e.g., of an imported roster), `PROCESSES` at a time.
+
+    Submitting them in batches leaves room under `CONCURRENCY` for logins, which then
+    wait for at most one hash per process rather than for every password.
+
+    Args:
+        passwords (Sequence[str]): The passwords to hash.
+
+    Returns:
+        list[str]: The hashes, in the same order.
+    """
+    hashes = []
+    for start in range(0, len(passwords), PROCESSES):
+        batch = passwords[start : start + PROCESSES]
+        hashes += await asyncio.gather(*(hash_password(p) for p in batch))
+
+    return hashes
+
+
+async def verify_password(password: str, hashed: str | None) -> bool:
+    """Checks `password` against a stored password.
+
+    Args:
+        password (str): The password to check.
+        hashed (str | None): The stored password; a hash, a plaintext password from
+            before hashing, or `None` if the user does not exist, in which case a dummy
+            hash is checked so that the result takes as long.
+
+    Returns:
+        bool: Whether `password` matches.
+    """
+    global _DUMMY_HASH, _verifications, _plaintext_verifications
+
+    if hashed is None:
+        if _DUMMY_HASH is None:
+            _DUMMY_HASH = await hash_password(secrets.token_urlsafe())
+        await _run(_verify, password, _DUMMY_HASH)
+        return False
+
+    if not hashed.startswith(PREFIX):
+        _plaintext_verifications += 1
+        return hmac.compare_digest(password.encode(), hashed.encode())
+
+    _verifications += 1
+    return await _run(_verify, password, hashed)
+
+
+def needs_rehash(hashed: str) -> bool:
+    """Whether a stored password is in plaintext or hashed with other parameters
+    than the current ones.
+    """
+    if not hashed.startswith(PREFIX):
+        return True
+
+    n, r, p, _, _ = _parse(hashed)
+    return (n, r, p) != (
+        CONFIG.password_scrypt_n,
+        CONFIG.password_scrypt_r,
+        CONFIG.password_scrypt_p,
+    )
+
+
+def failure_digest(password: str) -> bytes:
+    """Returns the digest identifying `password` in the keys of `FAILED_LOGINS`.
+
+    It is keyed with a random per-process key, so it cannot be used to guess the
+    password offline.
+    """
+    return hmac.digest(_FAILURE_KEY, password.encode(), "sha256")
+
+
+def forget_failures(email: str):
+    """Forgets the failed logins of `email`, e.g. once their password changes."""
+    FAILED_LOGINS.discard_owner(email)
+
+
+async def warm_up():
+    """Starts every worker process and computes the dummy hash ahead of the first
+    login.
+    """
+    await verify_password("", None)
+    await asyncio.gather(*(_run(time.sleep, 0.05) for _ in range(PROCESSES)))
+
+
+def shutdown():
+    """Stops the worker processes, if started; they are restarted on next use."""
+    global _POOL, _LIMIT
+
+    if _POOL is not None:
+        _POOL.shutdown(cancel_futures=True)
+        _POOL = None
+    _LIMIT = None
+
+
+def stats() -> dict[str, Any]:
+    """Returns the hashing pool's state and counters, and the statistics of
+    `FAILED_LOGINS`.
+    """
+    return {
+        "processes": PROCESSES,
+        "concurrency": CONCURRENCY,
+        "in_flight": _in_flight,
+        "waiting": _waiting,
+        "hashes": _hashes,
+        "verifications": _verifications,
+        "plaintext_verifications": _plaintext_verifications,
+        "failed_logins": FAILED_LOGINS.stats(),
+    }
+
+
+def _after_fork():
+    global _POOL, _LIMIT
+
+    # the parent's pool must not be used (or shut down) here
+    _POOL = None
+    _LIMIT = None
+
+
+os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,93 @@
+"""Fast JSON responses built directly from query results.
+
+FastAPI validates whatever a route returns against its `response_model` before
+serializing it. For rows just read from the database, whose column types already
+match the model, that validation is redundant, and for unions such as
+`InternalBill | ExternalBill` it is costly since each row is tried against every
+member of the union.
+
+`rows_response` skips it: it picks each model's fields out of the row mappings, in
+the model's field order so the JSON is the same, and encodes them with orjson.
+Routes using it should still pass `response_model` to their decorator so that the
+OpenAPI schema is unchanged.
+
+`FastJSONResponse` is also the application's default response class.
+"""
+
+import functools
+import uuid
+from typing import Any, Callable, Final, Iterable, Mapping
+
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import Row
+
+from api import timing
+
+ModelChooser = Callable[[Mapping[str, Any]], type[BaseModel]]
+
+# column names are `quoted_name`s, a subclass of `str` which orjson only accepts as a
+# key with `OPT_NON_STR_KEYS`
+ORJSON_OPTIONS: Final[int] = orjson.OPT_NON_STR_KEYS
+
+
+def orjson_default(value: Any) -> Any:
+    """Serializes the values orjson does not support natively, for `orjson.dumps`."""
+    # asyncpg returns its own subclass of `uuid.UUID`, which orjson does not accept
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    """A JSON response encoded with orjson."""
+
+    def render(self, content: Any) -> bytes:
+        with timing.timed("encode"):
+            return orjson.dumps(content, orjson_default, ORJSON_OPTIONS)
+
+
+@functools.cache
+def _fields(model: type[BaseModel]) -> tuple[str, ...]:
+    return tuple(model.model_fields)
+
+
+def project(row: Mapping[str, Any], model: type[BaseModel]) -> dict[str, Any]:
+    """Returns the fields of `model` from `row`, as validating and dumping `row` as
+    `model` would, but without validation.
+
+    Args:
+        row (Mapping[str, Any]): A row mapping with a column for every field.
+        model (type[BaseModel]): The model whose fields to keep.
+    """
+    return {name: row[name] for name in _fields(model)}
+
+
+def rows_response(
+    rows: Iterable[Row[Any]],
+    model: type[BaseModel] | ModelChooser,
+    response: Response | None = None,
+) -> FastJSONResponse:
+    """Serializes `rows` as a JSON list of `model` without validating them.
+
+    Note: only use this for rows whose columns already have the types of the
+    model's fields (e.g., rows selected from the table the model describes).
+
+    Args:
+        rows (Iterable[Row[Any]]): The rows to serialize.
+        model (type[BaseModel] | ModelChooser): The model of every row, or a function
+            returning the model of a given row mapping (for union response models).
+        response (Response | None, optional): The route's response, whose headers
+            (e.g., pagination headers) are copied. Defaults to no headers.
+    """
+    with timing.timed("project"):
+        if isinstance(model, type):
+            content = [project(row._mapping, model) for row in rows]
+        else:
+            content = [project(row._mapping, model(row._mapping)) for row in rows]
+
+    return FastJSONResponse(
+        content, headers=None if response is None else dict(response.headers)
+    )
@@ -19,10 +19,10 @@ for path in Path(__file__).parent.iterdir():
     ):
         continue
 
-    logger.debug(f"Loading module api.routes.{path.stem}")
+    logger.debug("Loading module api.routes.%s", path.stem)
     mod = importlib.import_module(f".{path.stem}", package="api.routes")
 
     if "router" in dir(mod):
         ROUTERS.append(mod.router)
     else:
-        logger.warning(f"Failed to load module api.routes.{path.stem}")
+        logger.warning("Failed to load module api.routes.%s", path.stem)
@@ -7,22 +7,33 @@ from typing import Annotated
 
 from fastapi import APIRouter, Header, HTTPException, status
 from pydantic import BaseModel, field_validator
-from sqlalchemy import Connection, case, select
+from sqlalchemy import func, literal, select
+from sqlalchemy.ext.asyncio import AsyncConnection
 
-from api import auth, db, models
+from api import auth, db, models, ownership
+from api.timing import TimedRoute
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/bill", tags=["bill"])
+router = APIRouter(prefix="/bill", tags=["bill"], route_class=TimedRoute)
 
 
-def _get_chapter_id_from_bill_id(conn: Connection, bill_id: str | uuid.UUID) -> int:
-    query = select(db.tb.bill.c.chapter_id).where(db.tb.bill.c.bill_id == str(bill_id))
-    result = conn.execute(query).one_or_none()
+async def _get_chapter_id_from_bill_id(
+    conn: AsyncConnection, bill_id: str | uuid.UUID
+) -> int:
+    bill_id = str(bill_id)
+    chapter_id = ownership.BILL_CHAPTERS.get(bill_id)
+    if chapter_id is not None:
+        return chapter_id
+
+    generation = ownership.BILL_CHAPTERS.generation
+    query = select(db.tb.bill.c.chapter_id).where(db.tb.bill.c.bill_id == bill_id)
+    result = (await conn.execute(query)).one_or_none()
 
     if result is None:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Specified bill does not exist.")
 
+    ownership.BILL_CHAPTERS.set(bill_id, result[0], generation)
     return result[0]
 
 
@@ -46,46 +57,50 @@ class UpdateBillRequest(BaseModel):
 
 
 @router.patch("/id/{bill_id}")
-def update_bill(
+async def update_bill(
     bill_id: uuid.UUID,
     updates: UpdateBillRequest,
+    tx: db.Transaction,
     authorization: Annotated[str | None, Header()] = None,
 ) -> models.Bill:
     auth_checker = auth.get(authorization)
     auth_checker.logged_in().raise_for_http()
 
-    with db.begin() as conn:
-        chapter_id = _get_chapter_id_from_bill_id(conn, bill_id)
-        auth_checker.is_chapter_admin(chapter_id).raise_for_http()
+    conn = await tx.connection()
+    chapter_id = await _get_chapter_id_from_bill_id(conn, bill_id)
+    auth_checker.is_chapter_admin(chapter_id).raise_for_http()
 
-        query = (
-            db.tb.bill.update()
-            .returning(*db.tb.bill.c)
-            .values(**updates.model_dump(exclude_unset=True))
-            .where(db.tb.bill.c.bill_id == str(bill_id))
-        )
-        result = conn.execute(query).one_or_none()
+    query = (
+        db.tb.bill.update()
+        .returning(*db.tb.bill.c)
+        .values(**updates.model_dump(exclude_unset=True))
+        .where(db.tb.bill.c.bill_id == str(bill_id))
+    )
+    result = (await conn.execute(query)).one_or_none()
 
-        if result is None:
-            raise HTTPException(status.HTTP_304_NOT_MODIFIED)
+    if result is None:
+        raise HTTPException(status.HTTP_304_NOT_MODIFIED)
 
     return result
 
 
 @router.delete("/id/{bill_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_bill(
+async def delete_bill(
     bill_id: uuid.UUID,
+    tx: db.Transaction,
     authorization: Annotated[str | None, Header()] = None,
 ):
     auth_checker = auth.get(authorization)
     auth_checker.logged_in().raise_for_http()
 
-    with db.begin() as conn:
-        chapter_id = _get_chapter_id_from_bill_id(conn, bill_id)
-        auth_checker.is_chapter_admin(chapter_id).raise_for_http()
+    conn = await tx.connection()
+    chapter_id = await _get_chapter_id_from_bill_id(conn, bill_id)
+    auth_checker.is_chapter_admin(chapter_id).raise_for_http()
+
+    query = db.tb.bill.delete().where(db.tb.bill.c.bill_id == str(bill_id))
+    await conn.execute(query)
 
-        query = db.tb.bill.delete().where(db.tb.bill.c.bill_id == str(bill_id))
-        conn.execute(query)
+    tx.after_commit(lambda: ownership.BILL_CHAPTERS.discard(str(bill_id)))
 
 
 class PaymentRequest(BaseModel):
@@ -100,60 +115,101 @@ class PaymentRequest(BaseModel):
 
 
 @router.post("/pay/{bill_id}")
-def pay_bill(
+async def pay_bill(
     bill_id: uuid.UUID,
     payment: PaymentRequest,
+    tx: db.Transaction,
     authorization: Annotated[str | None, Header()] = None,
 ) -> models.InternalBill:
     auth_checker = auth.get(authorization)
     auth_checker.logged_in().raise_for_http()
+    # the payer's email is read directly below, so expiry must be checked here
+    if auth_checker.expired:
+        auth_checker.unregister_self()
+        auth.EXPIRED.raise_for_http()
 
-    with db.begin() as conn:
-        email_query = select(db.tb.internal_bill.c.member_email).where(
-            db.tb.internal_bill.c.bill_id == str(bill_id)
-        )
-        email_result = conn.execute(email_query).one_or_none()
-
-        if email_result is None:
-            raise HTTPException(
-                status.HTTP_404_NOT_FOUND,
-                "Specified bill does not exist or is not an internal bill.",
-            )
-
-        auth_checker.is_user(email_result[0]).raise_for_http()
-
-        update_query = (
-            db.tb.bill.update()
-            .returning(*db.tb.bill.c)
-            .values(
-                amount_paid=case(
-                    (
-                        (db.tb.bill.c.amount_paid + payment.payment_amount)
-                        > db.tb.bill.c.amount,
-                        db.tb.bill.c.amount,
-                    ),
-                    else_=db.tb.bill.c.amount_paid + payment.payment_amount,
-                )
-            )
-            .where(db.tb.bill.c.bill_id == str(bill_id))
+    payer_email = None if auth_checker.global_admin else auth_checker.email
+
+    result = await db.pay_bill(
+        await tx.connection(), bill_id, payment.payment_amount, payer_email
+    )
+
+    if result is None:
+        raise HTTPException(
+            status.HTTP_404_NOT_FOUND,
+            "Specified bill does not exist or is not an internal bill.",
         )
-        result = conn.execute(update_query).one_or_none()
 
-        if result is None:
-            raise HTTPException(status.HTTP_304_NOT_MODIFIED)
+    if result.bill_id is None:
+        auth_checker.is_user(result.member_email).raise_for_http()
+        raise HTTPException(status.HTTP_304_NOT_MODIFIED)
+
+    return result._mapping
+
+
+class BatchPaymentRequest(PaymentRequest):
+    member_email: str
+    bill_ids: list[uuid.UUID] | None = None
+
+
+class BatchPaymentResult(BaseModel):
+    bills: list[models.InternalBill]
+    amount_applied: float
+    amount_unapplied: float
+
+
+@router.post("/pay")
+async def pay_bills(
+    payment: BatchPaymentRequest,
+    tx: db.Transaction,
+    authorization: Annotated[str | None, Header()] = None,
+) -> BatchPaymentResult:
+    """Applies a payment across a member's outstanding internal bills, paying off the
+    bills due first before moving on to the next ones.
+
+    Args:
+        payment (BatchPaymentRequest): The member, the total amount paid, and
+            optionally which of the member's bills to pay (defaults to all of them).
+        tx (db.Transaction): The request's database transaction.
+        authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
+            Defaults to None.
+
+    Raises:
+        HTTPException: 401, 403; if the user does not have permission to perform this action.
 
-    return dict(**result._mapping, member_email=email_result[0])
+    Returns:
+        BatchPaymentResult: The bills that were paid towards, along with how much of
+            the payment was applied and how much was left over.
+    """
+    auth_checker = auth.get(authorization)
+    auth_checker.is_user(payment.member_email).raise_for_http()
+
+    bills = await db.pay_bills(
+        await tx.connection(),
+        payment.member_email,
+        payment.payment_amount,
+        payment.bill_ids,
+    )
+
+    applied = sum(row.amount_applied for row in bills)
+    return BatchPaymentResult(
+        bills=[row._mapping for row in bills],
+        amount_applied=applied,
+        amount_unapplied=payment.payment_amount - applied,
+    )
 
 
 @router.post("/internal", status_code=status.HTTP_201_CREATED)
 async def make_internal_bill(
     specification: CreateInternalBillRequest,
+    tx: db.Transaction,
     authorization: Annotated[str | None, Header()] = None,
 ) -> models.InternalBill:
     """Creates an internal bill.
 
     Args:
         specification (CreateInternalBillRequest): The fields of the new bill.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -165,34 +221,145 @@ async def make_internal_bill(
     """
     auth.get(authorization).is_chapter_admin(specification.chapter_id).raise_for_http()
 
-    with db.get_connection() as conn:
-
-        bill_UUID = uuid.uuid4()
-
-        query = (
-            db.tb.bill.insert()
-            .returning(*db.tb.bill.c)
-            .values(
-                chapter_id=specification.chapter_id,
-                bill_id=bill_UUID,
-                amount=specification.amount,
-                desc=specification.desc,
-                due_date=specification.due_date,
-                is_external=False,
-            )
-        )
-        result = conn.execute(query).one()
+    conn = await tx.connection()
 
-        query = db.tb.internal_bill.insert().values(
-            bill_id=bill_UUID, member_email=specification.member_email
+    bill_UUID = uuid.uuid4()
+
+    query = (
+        db.tb.bill.insert()
+        .returning(*db.tb.bill.c)
+        .values(
+            chapter_id=specification.chapter_id,
+            bill_id=bill_UUID,
+            amount=specification.amount,
+            desc=specification.desc,
+            due_date=specification.due_date,
+            is_external=False,
         )
-        conn.execute(query)
+    )
+    result = (await conn.execute(query)).one()
 
-        conn.commit()
+    query = db.tb.internal_bill.insert().values(
+        bill_id=bill_UUID, member_email=specification.member_email
+    )
+    await conn.execute(query)
 
     return dict(**result._mapping, member_email=specification.member_email)
 
 
+class CreateBulkInternalBillRequest(CreateBillRequest):
+    member_emails: list[str] | None = None
+    member_status: str | None = None
+
+
+class SkippedMember(BaseModel):
+    member_email: str
+    reason: str
+
+
+class BulkInternalBillResult(BaseModel):
+    created: list[models.InternalBill]
+    skipped: list[SkippedMember]
+
+
+@router.post("/internal/bulk", status_code=status.HTTP_201_CREATED)
+async def make_internal_bills(
+    specification: CreateBulkInternalBillRequest,
+    tx: db.Transaction,
+    authorization: Annotated[str | None, Header()] = None,
+) -> BulkInternalBillResult:
+    """Creates the same internal bill for many members of a chapter at once.
+
+    The bills are issued to every member of the chapter in `member_emails` (or every
+    member of the chapter, if it is not given) whose status is `member_status` (if
+    given). All of the bills are created by a single statement in one transaction.
+
+    Args:
+        specification (CreateBulkInternalBillRequest): The fields of the new bills and
+            the members to bill.
+        tx (db.Transaction): The request's database transaction.
+        authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
+            Defaults to None.
+
+    Raises:
+        HTTPException: 401, 403; if the user does not have permission to perform this action.
+
+    Returns:
+        BulkInternalBillResult: The created bills and the requested members that were
+            not billed.
+    """
+    auth.get(authorization).is_chapter_admin(specification.chapter_id).raise_for_http()
+
+    member = db.tb.member
+    bill = db.tb.bill
+    internal_bill = db.tb.internal_bill
+
+    targets = select(
+        member.c.email.label("member_email"),
+        func.gen_random_uuid().label("bill_id"),
+    ).where(member.c.chapter_id == specification.chapter_id)
+    if specification.member_emails is not None:
+        targets = targets.where(member.c.email.in_(specification.member_emails))
+    if specification.member_status is not None:
+        targets = targets.where(member.c.member_status == specification.member_status)
+    targets = targets.cte("targets")
+
+    # the bill ids are generated once in `targets`, so both inserts agree on them
+    bill_values = {
+        "chapter_id": specification.chapter_id,
+        "amount": specification.amount,
+        "desc": specification.desc,
+        "due_date": specification.due_date,
+        "is_external": False,
+    }
+    new_bills = (
+        bill.insert()
+        .from_select(
+            ["bill_id", *bill_values],
+            select(
+                targets.c.bill_id,
+                *(literal(v, bill.c[k].type) for k, v in bill_values.items()),
+            ),
+        )
+        .returning(*bill.c)
+        .cte("new_bills")
+    )
+    new_internal_bills = (
+        internal_bill.insert()
+        .from_select(
+            ["bill_id", "member_email"],
+            select(targets.c.bill_id, targets.c.member_email),
+        )
+        .returning(*internal_bill.c)
+        .cte("new_internal_bills")
+    )
+    query = (
+        select(*new_bills.c, new_internal_bills.c.member_email)
+        .join_from(
+            new_bills,
+            new_internal_bills,
+            new_bills.c.bill_id == new_internal_bills.c.bill_id,
+        )
+        .order_by(new_internal_bills.c.member_email)
+    )
+
+    created = (await (await tx.connection()).execute(query)).all()
+
+    billed = {row.member_email for row in created}
+    skipped = [
+        SkippedMember(
+            member_email=email,
+            reason="Not a member of this chapter or does not have the requested status.",
+        )
+        for email in dict.fromkeys(specification.member_emails or [])
+        if email not in billed
+    ]
+
+    return BulkInternalBillResult(
+        created=[row._mapping for row in created], skipped=skipped
+    )
+
+
 class CreateExternalBillRequest(CreateBillRequest):
     chapter_contact: str
     payor_name: str
@@ -204,12 +371,14 @@ class CreateExternalBillRequest(CreateBillRequest):
 @router.post("/external", status_code=status.HTTP_201_CREATED)
 async def make_external_bill(
     specification: CreateExternalBillRequest,
+    tx: db.Transaction,
     authorization: Annotated[str | None, Header()] = None,
 ) -> models.ExternalBill:
     """Creates a new external bill.
 
     Args:
         specification (CreateExternalBillRequest): The fields of the new bill.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -221,38 +390,36 @@ async def make_external_bill(
     """
     auth.get(authorization).is_chapter_admin(specification.chapter_id).raise_for_http()
 
-    with db.get_connection() as conn:
-
-        bill_UUID = uuid.uuid4()
-
-        query = (
-            db.tb.bill.insert()
-            .returning(*db.tb.bill.c)
-            .values(
-                chapter_id=specification.chapter_id,
-                bill_id=bill_UUID,
-                amount=specification.amount,
-                desc=specification.desc,
-                due_date=specification.due_date,
-                is_external=True,
-            )
+    conn = await tx.connection()
+
+    bill_UUID = uuid.uuid4()
+
+    query = (
+        db.tb.bill.insert()
+        .returning(*db.tb.bill.c)
+        .values(
+            chapter_id=specification.chapter_id,
+            bill_id=bill_UUID,
+            amount=specification.amount,
+            desc=specification.desc,
+            due_date=specification.due_date,
+            is_external=True,
         )
-        bill_result = conn.execute(query).one()
-
-        query = (
-            db.tb.external_bill.insert()
-            .returning(*[c for c in db.tb.external_bill.c if c.name != "bill_id"])
-            .values(
-                bill_id=bill_UUID,
-                chapter_contact=specification.chapter_contact,
-                payor_name=specification.payor_name,
-                p_billing_address=specification.p_billing_address,
-                p_email=specification.p_email,
-                p_phone_num=specification.p_phone_num,
-            )
+    )
+    bill_result = (await conn.execute(query)).one()
+
+    query = (
+        db.tb.external_bill.insert()
+        .returning(*[c for c in db.tb.external_bill.c if c.name != "bill_id"])
+        .values(
+            bill_id=bill_UUID,
+            chapter_contact=specification.chapter_contact,
+            payor_name=specification.payor_name,
+            p_billing_address=specification.p_billing_address,
+            p_email=specification.p_email,
+            p_phone_num=specification.p_phone_num,
         )
-        external_result = conn.execute(query).one()
-
-        conn.commit()
+    )
+    external_result = (await conn.execute(query)).one()
 
     return dict(**bill_result._mapping, **external_result._mapping)
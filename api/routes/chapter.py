@@ -1,16 +1,23 @@
 from __future__ import annotations
 
+import csv
 import logging
 from datetime import date
-from typing import Annotated, Any, Sequence
+from typing import Annotated, Any, AsyncIterator, Final, Sequence
 
-from fastapi import APIRouter, Header, HTTPException, status
+from fastapi import APIRouter, Header, HTTPException, Request, Response, status
 from pydantic import BaseModel
-from sqlalchemy import Connection, Row, select
+from sqlalchemy import Column, ColumnElement, Row, func, select
+from sqlalchemy.ext.asyncio import AsyncConnection
 
-from api import auth, db, models
+from api import auth, cache, db, models, ownership, passwords
+from api.bills import BillFilters, bill_model, bill_query
+from api.export import ExportFormat, export
+from api.pagination import Page, Pagination
+from api.responses import project, rows_response
+from api.timing import TimedRoute
 
-router = APIRouter(prefix="/chapter", tags=["chapter"])
+router = APIRouter(prefix="/chapter", tags=["chapter"], route_class=TimedRoute)
 
 logger = logging.getLogger(__name__)
 
@@ -20,27 +27,42 @@ _CHAPTER_NOT_EXISTS = HTTPException(
 )
 
 
-def _get_chapter_members(conn: Connection, chapter_id: int) -> Sequence[Row[Any]]:
+async def _get_chapter_members(
+    conn: AsyncConnection, chapter_id: int, page: Pagination | None = None
+) -> Sequence[Row[Any]]:
     """Returns the members of the specified chapter.
 
     Args:
-        conn (Connection): The database connection with which to perform the query.
+        conn (AsyncConnection): The database connection with which to perform the query.
         chapter_id (int): The ID of the chapter from which to pull members.
+        page (Pagination | None, optional): The page of members to return, ordered by
+            member ID. Defaults to all members.
     """
+    query = db.tb.member.select().where(db.tb.member.c.chapter_id == chapter_id)
 
-    return conn.execute(
-        db.tb.member.select().where(db.tb.member.c.chapter_id == chapter_id)
-    ).all()
+    if page is None:
+        return (await conn.execute(query)).all()
 
+    query = page.apply(query, db.tb.member.c.member_id)
+    return page.paginate((await conn.execute(query)).all())
 
-@router.get("")
-def get_all_chapters(
-    authorization: Annotated[str | None, Header()] = None
-) -> list[models.Chapter]:
-    """Returns a list of all chapters. Use `/organization/{org_name}?include_chapters=true` to get all chapters for
-    an organization.
+
+@router.get("", response_model=list[models.Chapter])
+async def get_all_chapters(
+    page: Page,
+    request: Request,
+    response: Response,
+    authorization: Annotated[str | None, Header()] = None,
+) -> Response:
+    """Returns a list of all chapters, ordered by ID when paginated. Use
+    `/organization/{org_name}?include_chapters=true` to get all chapters for an organization.
+
+    Responses are cached (after authorization); see `api.cache.CATALOG`.
 
     Args:
+        page (Page): The requested page; see `api.pagination.Pagination`.
+        request (Request): The request, used as the cache key.
+        response (Response): The response, carrying pagination headers.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -52,17 +74,18 @@ def get_all_chapters(
     """
     auth.get(authorization).logged_in().raise_for_http()
 
-    with db.get_connection() as conn:
-        query = db.tb.chapter.select()
+    async def load():
+        async with db.get_async_connection() as conn:
+            query = page.apply(db.tb.chapter.select(), db.tb.chapter.c.id)
+            return page.paginate((await conn.execute(query)).all())
 
-        result = conn.execute(query).all()
-
-    return result
+    return await cache.CATALOG.respond(request, response, load, list[models.Chapter])
 
 
 @router.get("/{chapter_id}")
-def get_specific_chapter(
+async def get_specific_chapter(
     chapter_id: int,
+    tx: db.Transaction,
     include_members: bool = False,
     authorization: Annotated[str | None, Header()] = None,
 ) -> models.ChapterWithDetailsAndMembers | models.ChapterWithDetails:
@@ -70,6 +93,7 @@ def get_specific_chapter(
 
     Args:
         chapter_id (int): The ID of the chapter to fetch.
+        tx (db.Transaction): The request's database transaction.
         include_members (bool, optional): Whether to include a list of all chapter members in the result.
             Defaults to False.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
@@ -91,43 +115,43 @@ def get_specific_chapter(
         auth_checker.logged_in().raise_for_http()
 
     # fetch data
-    with db.get_connection() as conn:
-        chapter_query = (
-            select(
-                *db.tb.chapter.c,
-                db.tb.organization.c.greek_letters,
-                db.tb.organization.c.type,
-                db.tb.school.c.billing_address.label("sba"),
-                db.tb.school.c.name.label("sname"),
-            )
-            .select_from(db.tb.chapter)
-            .join(db.tb.organization)
-            .join(db.tb.school)
-            .where(db.tb.chapter.c.id == chapter_id)
+    conn = await tx.connection()
+    chapter_query = (
+        select(
+            *db.tb.chapter.c,
+            db.tb.organization.c.greek_letters,
+            db.tb.organization.c.type,
+            db.tb.school.c.billing_address.label("sba"),
+            db.tb.school.c.name.label("sname"),
         )
+        .select_from(db.tb.chapter)
+        .join(db.tb.organization)
+        .join(db.tb.school)
+        .where(db.tb.chapter.c.id == chapter_id)
+    )
 
-        result = conn.execute(chapter_query).one_or_none()
+    result = (await conn.execute(chapter_query)).one_or_none()
 
-        if result is None:
-            raise _CHAPTER_NOT_EXISTS
+    if result is None:
+        raise _CHAPTER_NOT_EXISTS
 
-        result = dict(result._mapping)
+    result = dict(result._mapping)
 
-        result["school"] = models.School(
-            name=result.pop("sname"), billing_address=result.pop("sba")
-        )
-        result["organization"] = models.Organization(
-            name=result["org_name"],
-            greek_letters=result.pop("greek_letters"),
-            type=result.pop("type"),
-        )
+    result["school"] = models.School(
+        name=result.pop("sname"), billing_address=result.pop("sba")
+    )
+    result["organization"] = models.Organization(
+        name=result["org_name"],
+        greek_letters=result.pop("greek_letters"),
+        type=result.pop("type"),
+    )
 
-        logger.debug(result)
+    logger.debug("Chapter %s: %s", chapter_id, result)
 
-        if include_members:
-            result["members"] = [
-                dict(row._mapping) for row in _get_chapter_members(conn, chapter_id)
-            ]
+    if include_members:
+        result["members"] = [
+            dict(row._mapping) for row in await _get_chapter_members(conn, chapter_id)
+        ]
 
     return (
         models.ChapterWithDetailsAndMembers
@@ -137,13 +161,16 @@ def get_specific_chapter(
 
 
 @router.delete("/{chapter_id}")
-def delete_chapter(
-    chapter_id: int, authorization: Annotated[str | None, Header()] = None
+async def delete_chapter(
+    chapter_id: int,
+    tx: db.Transaction,
+    authorization: Annotated[str | None, Header()] = None,
 ):
     """Deletes the specified chapter.
 
     Args:
         chapter_id (int): The ID of the chapter to delete.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -152,9 +179,11 @@ def delete_chapter(
     """
     auth.get(authorization).is_chapter_admin(chapter_id).raise_for_http()
 
-    with db.begin() as conn:
-        query = db.tb.chapter.delete().where(db.tb.chapter.c.chapter_id == chapter_id)
-        conn.execute(query)
+    query = db.tb.chapter.delete().where(db.tb.chapter.c.id == chapter_id)
+    await (await tx.connection()).execute(query)
+
+    tx.after_commit(cache.CATALOG.invalidate)
+    tx.after_commit(lambda: ownership.forget_chapter(chapter_id))
 
 
 class CreateChapter(BaseModel):
@@ -165,13 +194,16 @@ class CreateChapter(BaseModel):
 
 
 @router.post("")
-def create_chapter(
-    info: CreateChapter, authorization: Annotated[str | None, Header()] = None
+async def create_chapter(
+    info: CreateChapter,
+    tx: db.Transaction,
+    authorization: Annotated[str | None, Header()] = None,
 ) -> models.Chapter:
     """Creates a chapter.
 
     Args:
         info (CreateChapter): The specifications of the new chapter.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -183,14 +215,10 @@ def create_chapter(
     """
     auth.get(authorization).logged_in().raise_for_http()
 
-    with db.begin() as conn:
-
-        query = (
-            db.tb.chapter.insert().returning(*db.tb.chapter.c).values(info.model_dump())
-        )
-
-        result = conn.execute(query).one()
+    query = db.tb.chapter.insert().returning(*db.tb.chapter.c).values(info.model_dump())
+    result = (await (await tx.connection()).execute(query)).one()
 
+    tx.after_commit(cache.CATALOG.invalidate)
     return result
 
 
@@ -202,9 +230,10 @@ class UpdateChapter(BaseModel):
 
 
 @router.patch("/{chapter_id}")
-def update_chapter(
+async def update_chapter(
     chapter_id: int,
     updates: UpdateChapter,
+    tx: db.Transaction,
     authorization: Annotated[str | None, Header()] = None,
 ) -> models.Chapter:
     """Partially updates an existing chapter.
@@ -212,6 +241,7 @@ def update_chapter(
     Args:
         chapter_id (int): The chapter to update.
         updates (UpdateChapter): The fields to update. Any fields that are not provided will not be updated.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -224,31 +254,38 @@ def update_chapter(
     """
     auth.get(authorization).is_chapter_admin(chapter_id).raise_for_http()
 
-    with db.begin() as conn:
-
-        query = (
-            db.tb.chapter.update()
-            .returning(*db.tb.chapter.c)
-            .values(**updates.model_dump(exclude_unset=True))
-            .where(db.tb.chapter.c.id == chapter_id)
-        )
+    query = (
+        db.tb.chapter.update()
+        .returning(*db.tb.chapter.c)
+        .values(**updates.model_dump(exclude_unset=True))
+        .where(db.tb.chapter.c.id == chapter_id)
+    )
 
-        result = conn.execute(query).one_or_none()
+    result = (await (await tx.connection()).execute(query)).one_or_none()
 
-        if result is None:
-            raise _CHAPTER_NOT_EXISTS
+    if result is None:
+        raise _CHAPTER_NOT_EXISTS
 
+    tx.after_commit(cache.CATALOG.invalidate)
     return result
 
 
-@router.get("/{chapter_id}/members")
-def get_chapter_members(
-    chapter_id: int, authorization: Annotated[str | None, Header()] = None
-) -> list[models.Member]:
-    """Returns a list of a specific chapter's members.
+@router.get("/{chapter_id}/members", response_model=list[models.Member])
+async def get_chapter_members(
+    chapter_id: int,
+    page: Page,
+    response: Response,
+    tx: db.Transaction,
+    authorization: Annotated[str | None, Header()] = None,
+) -> Response:
+    """Returns a list of a specific chapter's members, ordered by member ID when
+    paginated.
 
     Args:
         chapter_id (int): The ID of the chapter to fetch members for.
+        page (Page): The requested page; see `api.pagination.Pagination`.
+        response (Response): The response, carrying pagination headers.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -260,20 +297,37 @@ def get_chapter_members(
     """
     auth.get(authorization).has_chapter_access(chapter_id).raise_for_http()
 
-    with db.get_connection() as conn:
-        result = _get_chapter_members(conn, chapter_id)
+    result = await _get_chapter_members(await tx.connection(), chapter_id, page)
 
-    return result
+    return rows_response(result, models.Member, response)
 
 
-@router.get("/{chapter_id}/bills")
-def get_chapter_bills(
-    chapter_id: int, authorization: Annotated[str | None, Header()] = None
-) -> list[models.InternalBill | models.ExternalBill]:
-    """Returns a list of all outgoing bills made by the specified chapter.
+def _bill_row(row: dict[str, Any]) -> dict[str, Any]:
+    """Drops the columns that do not apply to a bill's type from a `bill_query` row."""
+    return project(row, bill_model(row))
+
+
+@router.get(
+    "/{chapter_id}/bills",
+    response_model=list[models.InternalBill | models.ExternalBill],
+)
+async def get_chapter_bills(
+    chapter_id: int,
+    filters: BillFilters,
+    page: Page,
+    response: Response,
+    tx: db.Transaction,
+    authorization: Annotated[str | None, Header()] = None,
+) -> Response:
+    """Returns a list of the outgoing bills made by the specified chapter, ordered by
+    bill ID when paginated.
 
     Args:
         chapter_id (int): The chatper from which to fetch bills.
+        filters (BillFilters): The requested filters; see `api.bills.BillFilter`.
+        page (Page): The requested page; see `api.pagination.Pagination`.
+        response (Response): The response, carrying pagination headers.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -282,24 +336,241 @@ def get_chapter_bills(
     """
     auth.get(authorization).is_chapter_admin(chapter_id).raise_for_http()
 
-    with db.get_connection() as conn:
-        internal_query = (
-            select(*db.tb.bill.c, db.tb.internal_bill.c.member_email)
-            .select_from(db.tb.bill)
-            .join(db.tb.internal_bill)
-            .where(db.tb.bill.c.chapter_id == chapter_id)
-        )
-        external_query = (
-            select(
-                *db.tb.bill.c,
-                *[c for c in db.tb.external_bill.c if c.name != "bill_id"],
-            )
-            .select_from(db.tb.bill)
-            .join(db.tb.external_bill)
-            .where(db.tb.bill.c.chapter_id == chapter_id)
+    query = bill_query(db.tb.bill.c.chapter_id == chapter_id, filters=filters)
+    query = page.apply(query, db.tb.bill.c.bill_id)
+
+    bills = page.paginate((await (await tx.connection()).execute(query)).all())
+
+    return rows_response(bills, bill_model, response)
+
+
+# (min, max) days overdue of each aging bucket in a chapter's ledger
+LEDGER_AGING_BUCKETS: Final[tuple[tuple[int, int | None], ...]] = (
+    (1, 30),
+    (31, 60),
+    (61, 90),
+    (91, None),
+)
+
+
+@router.get("/{chapter_id}/ledger")
+async def get_chapter_ledger(
+    chapter_id: int,
+    tx: db.Transaction,
+    authorization: Annotated[str | None, Header()] = None,
+) -> models.ChapterLedger:
+    """Returns the totals of the bills made by the specified chapter.
+
+    The totals are read from `chapter_ledger`, which triggers on `bill` keep up to
+    date, so this does not read every bill. A bill is overdue from the day after it
+    is due until it is paid in full.
+
+    Args:
+        chapter_id (int): The chapter whose ledger to summarize.
+        tx (db.Transaction): The request's database transaction.
+        authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
+            Defaults to None.
+
+    Raises:
+        HTTPException: 401, 403; if the user does not have permission to perform this action.
+    """
+    auth.get(authorization).is_chapter_admin(chapter_id).raise_for_http()
+
+    ledger = db.tb.chapter_ledger.c
+    days_overdue = func.current_date() - ledger.due_date
+
+    def total(column: Column, *where: ColumnElement[bool]) -> ColumnElement:
+        total = func.sum(column)
+        if where:
+            total = total.filter(*where)
+        return func.coalesce(total, 0)
+
+    totals = {
+        "bill_count": total(ledger.bill_count),
+        "total_billed": total(ledger.total_billed),
+        "total_paid": total(ledger.total_paid),
+        "outstanding_count": total(ledger.outstanding_count),
+        "outstanding_amount": total(ledger.outstanding_amount),
+        "overdue_count": total(ledger.outstanding_count, days_overdue > 0),
+        "overdue_amount": total(ledger.outstanding_amount, days_overdue > 0),
+    }
+    for i, (low, high) in enumerate(LEDGER_AGING_BUCKETS):
+        in_bucket = [days_overdue >= low]
+        if high is not None:
+            in_bucket.append(days_overdue <= high)
+        totals[f"aging_{i}_count"] = total(ledger.outstanding_count, *in_bucket)
+        totals[f"aging_{i}_amount"] = total(ledger.outstanding_amount, *in_bucket)
+
+    query = select(*(value.label(name) for name, value in totals.items())).where(
+        ledger.chapter_id == chapter_id
+    )
+
+    result = dict((await (await tx.connection()).execute(query)).one()._mapping)
+
+    aging = [
+        models.LedgerAgingBucket(
+            min_days_overdue=low,
+            max_days_overdue=high,
+            count=result.pop(f"aging_{i}_count"),
+            amount=result.pop(f"aging_{i}_amount"),
         )
+        for i, (low, high) in enumerate(LEDGER_AGING_BUCKETS)
+    ]
+
+    return models.ChapterLedger(chapter_id=chapter_id, aging=aging, **result)
+
+
+@router.get("/{chapter_id}/members/export")
+async def export_chapter_members(
+    chapter_id: int,
+    format: ExportFormat = ExportFormat.ndjson,
+    authorization: Annotated[str | None, Header()] = None,
+):
+    """Streams a chapter's full roster as NDJSON or CSV, ordered by member ID.
 
-        internal_bills = conn.execute(internal_query).all()
-        external_bills = conn.execute(external_query).all()
+    Rows are read through a server-side cursor, so memory use does not grow with
+    the size of the chapter.
 
-    return [*internal_bills, *external_bills]
+    Args:
+        chapter_id (int): The ID of the chapter to export members for.
+        format (ExportFormat, optional): The export format. Defaults to NDJSON.
+        authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
+            Defaults to None.
+
+    Raises:
+        HTTPException: 401, 403; if the user does not have permission to perform this action.
+    """
+    auth.get(authorization).is_chapter_admin(chapter_id).raise_for_http()
+
+    query = (
+        db.tb.member.select()
+        .where(db.tb.member.c.chapter_id == chapter_id)
+        .order_by(db.tb.member.c.member_id)
+    )
+
+    return export(query, format, f"chapter-{chapter_id}-members")
+
+
+@router.get("/{chapter_id}/bills/export")
+async def export_chapter_bills(
+    chapter_id: int,
+    filters: BillFilters,
+    format: ExportFormat = ExportFormat.ndjson,
+    authorization: Annotated[str | None, Header()] = None,
+):
+    """Streams every bill made by a chapter as NDJSON or CSV, ordered by issue date.
+
+    Internal and external bills are exported together; in CSV, columns that do not
+    apply to a bill's type are left empty. Rows are read through a server-side
+    cursor, so memory use does not grow with the number of bills.
+
+    Args:
+        chapter_id (int): The chapter from which to export bills.
+        filters (BillFilters): The requested filters; see `api.bills.BillFilter`.
+        format (ExportFormat, optional): The export format. Defaults to NDJSON.
+        authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
+            Defaults to None.
+
+    Raises:
+        HTTPException: 401, 403; if the user does not have permission to perform this action.
+    """
+    auth.get(authorization).is_chapter_admin(chapter_id).raise_for_http()
+
+    bill = db.tb.bill
+    query = bill_query(bill.c.chapter_id == chapter_id, filters=filters).order_by(
+        bill.c.issue_date, bill.c.bill_id
+    )
+
+    return export(query, format, f"chapter-{chapter_id}-bills", _bill_row)
+
+
+async def _split_csv_header(
+    chunks: AsyncIterator[bytes],
+) -> tuple[list[str], AsyncIterator[bytes]]:
+    """Reads the header line from a stream of CSV data.
+
+    Returns:
+        tuple[list[str], AsyncIterator[bytes]]: The lower-cased column names and the
+            rest of the stream.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        if b"\n" in buffer:
+            break
+
+    header, _, rest = buffer.partition(b"\n")
+    try:
+        columns = next(csv.reader([header.decode("utf-8-sig")]), [])
+    except UnicodeDecodeError:
+        columns = []
+
+    async def body() -> AsyncIterator[bytes]:
+        if rest:
+            yield rest
+        async for chunk in chunks:
+            yield chunk
+
+    return [column.strip().lower() for column in columns], body()
+
+
+class RosterImportRow(BaseModel):
+    row_num: int
+    email: str
+    status: str
+
+
+@router.post(
+    "/{chapter_id}/members/import",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"text/csv": {"schema": {"type": "string"}}},
+        }
+    },
+)
+async def import_chapter_members(
+    chapter_id: int,
+    request: Request,
+    tx: db.Transaction,
+    authorization: Annotated[str | None, Header()] = None,
+) -> list[RosterImportRow]:
+    """Creates users and members of a chapter from a CSV roster sent as the request
+    body.
+
+    The first line names the columns: email, password, fname, lname, dob and
+    phone_num are required and must not be blank; member_status and is_chapter_admin
+    are optional (a blank is_chapter_admin is false). Rows whose email already belongs
+    to a user, or that repeat an earlier row's email, are skipped. Either every valid
+    row is imported or, if the data is malformed, none are.
+
+    Args:
+        chapter_id (int): The ID of the chapter the members join.
+        request (Request): The request, whose body is the roster.
+        tx (db.Transaction): The request's database transaction.
+        authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
+            Defaults to None.
+
+    Raises:
+        HTTPException: 400; if the roster is malformed.
+        HTTPException: 401, 403; if the user does not have permission to perform this action.
+        HTTPException: 404; if the chapter does not exist.
+
+    Returns:
+        list[RosterImportRow]: Whether each row was "created", skipped because the user
+            "exists", or skipped as a "duplicate", in order; `row_num` starts at 1.
+    """
+    auth_checker = auth.get(authorization)
+    auth_checker.is_chapter_admin(chapter_id).raise_for_http()
+
+    conn = await tx.connection()
+    query = select(1).where(db.tb.chapter.c.id == chapter_id)
+    if (await conn.execute(query)).one_or_none() is None:
+        raise _CHAPTER_NOT_EXISTS
+
+    columns, rows = await _split_csv_header(request.stream())
+    result = await db.import_members(conn, auth_checker, chapter_id, columns, rows)
+
+    # attempts to log in as the new users before they existed failed
+    tx.after_commit(passwords.FAILED_LOGINS.clear)
+    return result
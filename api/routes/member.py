@@ -4,13 +4,18 @@ import logging
 from datetime import date
 from typing import Annotated
 
-from fastapi import APIRouter, Header, HTTPException, status
+from fastapi import APIRouter, Header, HTTPException, Response, status
 from pydantic import BaseModel
-from sqlalchemy import Connection, select
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncConnection
 
-from api import auth, db, models
+from api import auth, db, models, ownership
+from api.bills import BillFilters, bill_query
+from api.pagination import Page
+from api.responses import rows_response
+from api.timing import TimedRoute
 
-router = APIRouter(prefix="/member", tags=["member"])
+router = APIRouter(prefix="/member", tags=["member"], route_class=TimedRoute)
 
 logger = logging.getLogger(__name__)
 
@@ -19,34 +24,53 @@ _MEMBER_NOT_EXISTS = HTTPException(
 )
 
 
-def _get_chapter_id_from_member_email(conn: Connection, member_email: str) -> int:
+async def _get_chapter_id_from_member_email(
+    conn: AsyncConnection, member_email: str
+) -> int:
     """Returns the chapter ID corresponding to the provided email, if applicable; else
     raises an HTTP 404 exception.
 
     Args:
-        conn (Connection): The database connection with which to query the database.
+        conn (AsyncConnection): The database connection with which to query the database.
         member_email (str): The email to for which to aquire the corresponding chapter ID.
 
     Raises:
         HTTPException: 404; if there is no Member with email `member_email`.
     """
-    result = conn.execute(
-        select(db.tb.member.c.chapter_id).where(db.tb.member.c.email == member_email)
+    chapter_id = ownership.MEMBER_CHAPTERS.get(member_email)
+    if chapter_id is not None:
+        return chapter_id
+
+    generation = ownership.MEMBER_CHAPTERS.generation
+    result = (
+        await conn.execute(
+            select(db.tb.member.c.chapter_id).where(
+                db.tb.member.c.email == member_email
+            )
+        )
     ).one_or_none()
 
     if result is None:
         raise _MEMBER_NOT_EXISTS
 
+    ownership.MEMBER_CHAPTERS.set(member_email, result[0], generation)
     return result[0]
 
 
-@router.get("")
-def get_all_members(
-    authorization: Annotated[str | None, Header()] = None
-) -> list[models.Member]:
-    """Returns a list of all members in the database.
+@router.get("", response_model=list[models.Member])
+async def get_all_members(
+    page: Page,
+    response: Response,
+    tx: db.Transaction,
+    authorization: Annotated[str | None, Header()] = None,
+) -> Response:
+    """Returns a list of all members in the database, ordered by member ID when
+    paginated.
 
     Args:
+        page (Page): The requested page; see `api.pagination.Pagination`.
+        response (Response): The response, carrying pagination headers.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -55,17 +79,16 @@ def get_all_members(
     """
     auth.get(authorization).is_global_admin().raise_for_http()
 
-    with db.get_connection() as conn:
-
-        query = db.tb.member.select()
-        result = conn.execute(query).all()
+    query = page.apply(db.tb.member.select(), db.tb.member.c.member_id)
+    result = page.paginate((await (await tx.connection()).execute(query)).all())
 
-    return result
+    return rows_response(result, models.Member, response)
 
 
 @router.post("")
-def create_member(
+async def create_member(
     specification: models.CreateMemberRequest,
+    tx: db.Transaction,
     authorization: Annotated[str | None, Header()] = None,
 ) -> models.Member:
     """Creates a new member.
@@ -75,6 +98,7 @@ def create_member(
 
     Args:
         specification (models.CreateMemberRequest): The specification of the member to create.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -90,20 +114,20 @@ def create_member(
         or auth_checker.is_chapter_admin(specification.chapter_id)
     ).raise_for_http()
 
-    with db.begin() as conn:
-        result = db.create_member(conn, auth_checker, specification)
-
-    return result
+    return await db.create_member(await tx.connection(), auth_checker, specification)
 
 
 @router.get("/{member_email}")
-def get_specific_member(
-    member_email: str, authorization: Annotated[str | None, Header()] = None
+async def get_specific_member(
+    member_email: str,
+    tx: db.Transaction,
+    authorization: Annotated[str | None, Header()] = None,
 ) -> models.MemberWithSiteAdmin:
     """Returns the details for a specific member.
 
     Args:
         member_email (str): _description_
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -117,16 +141,14 @@ def get_specific_member(
     # check if user is logged in to prevent DB querying early
     auth_checker.logged_in().raise_for_http()
 
-    with db.get_connection() as conn:
-
-        query = (
-            select(*db.tb.member.c, db.tb.user.c.is_admin.label("is_site_admin"))
-            .select_from(db.tb.member)
-            .join(db.tb.user)
-            .where(db.tb.member.c.email == member_email)
-        )
+    query = (
+        select(*db.tb.member.c, db.tb.user.c.is_admin.label("is_site_admin"))
+        .select_from(db.tb.member)
+        .join(db.tb.user)
+        .where(db.tb.member.c.email == member_email)
+    )
 
-        result = conn.execute(query).one_or_none()
+    result = (await (await tx.connection()).execute(query)).one_or_none()
 
     if result is None:
         raise _MEMBER_NOT_EXISTS
@@ -137,14 +159,16 @@ def get_specific_member(
 
 
 @router.delete("/{member_email}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_member(
+async def delete_member(
     member_email: str,
+    tx: db.Transaction,
     authorization: Annotated[str | None, Header()] = None,
 ):
     """Deletes an member; that is, removes a user from as a member of a chapter.
 
     Args:
         member_email (str): The email of the member to remove.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -157,14 +181,15 @@ def delete_member(
     if not auth_checker.is_user(member_email):
         auth_checker.logged_in().raise_for_http()
 
-        with db.get_connection() as conn:
-            chapter_id = _get_chapter_id_from_member_email(conn, member_email)
-
+        chapter_id = await _get_chapter_id_from_member_email(
+            await tx.connection(), member_email
+        )
         auth_checker.is_chapter_admin(chapter_id).raise_for_http()
 
-    with db.begin() as conn:
-        query = db.tb.member.delete().where(db.tb.member.c.email == member_email)
-        conn.execute(query)
+    query = db.tb.member.delete().where(db.tb.member.c.email == member_email)
+    await (await tx.connection()).execute(query)
+
+    tx.after_commit(lambda: ownership.forget_member(member_email))
 
 
 # TODO: allow None in type hint where applicable
@@ -181,9 +206,10 @@ class MemberUpdateRequest(BaseModel):
 
 
 @router.patch("/{member_email}")
-def update_member(
+async def update_member(
     member_email: str,
     updates: MemberUpdateRequest,
+    tx: db.Transaction,
     authorization: Annotated[str | None, Header()] = None,
 ) -> models.Member:
     """Partially updates a member according to the values provided in `updates`.
@@ -196,6 +222,7 @@ def update_member(
     Args:
         member_email (str): The email of the member to change.
         updates (MemberUpdateRequest): The values to modify.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -211,8 +238,8 @@ def update_member(
     auth_checker = auth.get(authorization)
     auth_checker.logged_in().raise_for_http()
 
-    with db.get_connection() as conn:
-        member_chapter_id = _get_chapter_id_from_member_email(conn, member_email)
+    conn = await tx.connection()
+    member_chapter_id = await _get_chapter_id_from_member_email(conn, member_email)
 
     # exclude_unset is important; we only want data manually set
     update_dict = updates.model_dump(exclude_unset=True)
@@ -231,32 +258,42 @@ def update_member(
             or auth_checker.is_chapter_admin(member_chapter_id)
         ).raise_for_http()
 
-    with db.get_connection() as conn:
-
-        update_query = (
-            db.tb.member.update()
-            .values(update_dict)
-            .where(db.tb.member.c.email == member_email)
-            .returning(*db.tb.member.c)
-        )
+    update_query = (
+        db.tb.member.update()
+        .values(update_dict)
+        .where(db.tb.member.c.email == member_email)
+        .returning(*db.tb.member.c)
+    )
 
-        result = conn.execute(update_query).one_or_none()
-        conn.commit()
+    result = (await conn.execute(update_query)).one_or_none()
 
     if result is None:
         raise HTTPException(status.HTTP_304_NOT_MODIFIED, "Nothing was changed.")
 
+    if "chapter_id" in update_dict or "email" in update_dict:
+        tx.after_commit(lambda: ownership.forget_member(member_email))
+
     return result
 
 
-@router.get("/{member_email}/bills")
-def get_member_bills(
-    member_email: str, authorization: Annotated[str | None, Header()] = None
-) -> list[models.Bill]:
-    """Returns a list of bills billed to the specified member.
+@router.get("/{member_email}/bills", response_model=list[models.Bill])
+async def get_member_bills(
+    member_email: str,
+    filters: BillFilters,
+    page: Page,
+    response: Response,
+    tx: db.Transaction,
+    authorization: Annotated[str | None, Header()] = None,
+) -> Response:
+    """Returns a list of bills billed to the specified member, ordered by bill ID
+    when paginated.
 
     Args:
         member_email (str): The email of the member for which to fetch bills.
+        filters (BillFilters): The requested filters; see `api.bills.BillFilter`.
+        page (Page): The requested page; see `api.pagination.Pagination`.
+        response (Response): The response, carrying pagination headers.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -267,20 +304,18 @@ def get_member_bills(
     auth_checker = auth.get(authorization)
     auth_checker.logged_in().raise_for_http()
 
-    with db.get_connection() as conn:
-        if not auth_checker.is_user(member_email):
-            chapter_id = _get_chapter_id_from_member_email(conn, member_email)
-            auth_checker.is_chapter_admin(chapter_id).raise_for_http()
+    conn = await tx.connection()
+    if not auth_checker.is_user(member_email):
+        chapter_id = await _get_chapter_id_from_member_email(conn, member_email)
+        auth_checker.is_chapter_admin(chapter_id).raise_for_http()
 
-        query = (
-            select(*db.tb.bill.c)
-            .select_from(db.tb.bill)
-            .join(db.tb.internal_bill)
-            .where(db.tb.internal_bill.c.member_email == member_email)
-        )
-        result = conn.execute(query).all()
+    query = bill_query(
+        db.tb.internal_bill.c.member_email == member_email, filters=filters
+    )
+    query = page.apply(query, db.tb.bill.c.bill_id)
+    result = page.paginate((await conn.execute(query)).all())
 
-    return result
+    return rows_response(result, models.Bill, response)
 
 
 class MemberPaymentInfos(BaseModel):
@@ -289,13 +324,16 @@ class MemberPaymentInfos(BaseModel):
 
 
 @router.get("/{member_email}/payment_info")
-def get_member_payment_info(
-    member_email: str, authorization: Annotated[str | None, Header()] = None
+async def get_member_payment_info(
+    member_email: str,
+    tx: db.Transaction,
+    authorization: Annotated[str | None, Header()] = None,
 ) -> MemberPaymentInfos:
     """Fetches the payment info for a member.
 
     Args:
         member_email (str): The member's email.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -304,25 +342,22 @@ def get_member_payment_info(
     """
     auth.get(authorization).is_user(member_email).raise_for_http()
 
-    with db.get_connection() as conn:
-        payment_info = db.tb.payment_info.c
-
-        bank_query = (
-            select(
-                payment_info.member_email, payment_info.nickname, *db.tb.bank_account.c
-            )
-            .select_from(db.tb.payment_info)
-            .join(db.tb.bank_account)
-            .where(payment_info.member_email == member_email)
-        )
-        card_query = (
-            select(payment_info.member_email, payment_info.nickname, *db.tb.card.c)
-            .select_from(db.tb.payment_info)
-            .join(db.tb.card)
-            .where(payment_info.member_email == member_email)
-        )
-
-        banks = conn.execute(bank_query).all()
-        cards = conn.execute(card_query).all()
-    print(banks, cards)
+    payment_info = db.tb.payment_info.c
+
+    bank_query = (
+        select(payment_info.member_email, payment_info.nickname, *db.tb.bank_account.c)
+        .select_from(db.tb.payment_info)
+        .join(db.tb.bank_account)
+        .where(payment_info.member_email == member_email)
+    )
+    card_query = (
+        select(payment_info.member_email, payment_info.nickname, *db.tb.card.c)
+        .select_from(db.tb.payment_info)
+        .join(db.tb.card)
+        .where(payment_info.member_email == member_email)
+    )
+
+    conn = await tx.connection()
+    banks = (await conn.execute(bank_query)).all()
+    cards = (await conn.execute(card_query)).all()
     return dict(bank_accounts=banks, cards=cards)
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import hmac
+import logging
+from typing import Annotated
+
+from fastapi import APIRouter, Header
+from fastapi.responses import PlainTextResponse
+
+from api import auth, cache, db, metrics, ownership
+from api.config import CONFIG
+from api.timing import TimedRoute
+
+router = APIRouter(tags=["stats"], route_class=TimedRoute)
+
+logger = logging.getLogger(__name__)
+
+# (statistic, metric name, type, description) of the pool statistics to export
+_POOL_METRICS = (
+    ("size", "db_pool_size", "gauge", "Configured size of the connection pool."),
+    ("checkedout", "db_pool_checked_out", "gauge", "Connections checked out."),
+    ("waiting", "db_pool_waiting", "gauge", "Checkouts waiting for a connection."),
+    ("checkouts", "db_pool_checkouts_total", "counter", "Connection checkouts."),
+    ("timeouts", "db_pool_timeouts_total", "counter", "Checkouts that timed out."),
+    ("connects", "db_pool_connects_total", "counter", "Connections opened."),
+    ("closes", "db_pool_closes_total", "counter", "Connections closed."),
+    (
+        "invalidations",
+        "db_pool_invalidations_total",
+        "counter",
+        "Connections invalidated.",
+    ),
+)
+
+
+def _is_scraper(authorization: str | None) -> bool:
+    if CONFIG.metrics_token is None or authorization is None:
+        return False
+    return hmac.compare_digest(
+        authorization.encode(), f"Bearer {CONFIG.metrics_token}".encode()
+    )
+
+
+def _render_pools() -> list[str]:
+    pools = {
+        metrics.format_labels(pool=name): stats
+        for name, stats in db.get_pool_stats().items()
+    }
+
+    lines = []
+    for statistic, name, kind, help in _POOL_METRICS:
+        lines += metrics.format_family(
+            name,
+            kind,
+            help,
+            (("", labels, stats[statistic]) for labels, stats in pools.items()),
+        )
+
+    lines += metrics.format_family(
+        "db_pool_wait_seconds",
+        "histogram",
+        "Time spent waiting for a pooled connection.",
+        (
+            sample
+            for labels, stats in pools.items()
+            for sample in metrics.format_histogram(
+                labels,
+                list(stats["wait_time_buckets"])[:-1],
+                stats["wait_time_buckets"].values(),
+                stats["wait_time_total"],
+            )
+        ),
+    )
+    return lines
+
+
+def _render_stats(
+    prefix: str, stats: dict[str, int | float], counters: set[str], help: str
+) -> list[str]:
+    lines = []
+    for statistic, value in stats.items():
+        if statistic in counters:
+            name, kind = f"{prefix}_{statistic}_total", "counter"
+        else:
+            name, kind = f"{prefix}_{statistic}", "gauge"
+        lines += metrics.format_family(
+            name, kind, f"{help}: {statistic}.", [("", "", value)]
+        )
+    return lines
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(
+    authorization: Annotated[str | None, Header()] = None
+) -> PlainTextResponse:
+    """Returns request, query, pool, cache, and session metrics in the Prometheus text
+    format.
+
+    Request metrics are labelled by route template, and only cover the worker
+    process that serves the scrape.
+
+    Args:
+        authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action,
+            or `Bearer <metrics_token>` if a metrics token is configured. Defaults to None.
+
+    Raises:
+        HTTPException: 401, 403; if the user does not have permission to perform this action.
+    """
+    if not _is_scraper(authorization):
+        auth.get(authorization).is_global_admin().raise_for_http()
+
+    lines = [
+        *metrics.render_requests(),
+        *_render_pools(),
+        *_render_stats(
+            "catalog_cache",
+            cache.CATALOG.stats(),
+            {"hits", "misses", "coalesced", "evictions", "invalidations"},
+            "Catalog response cache",
+        ),
+        *_render_stats(
+            "sessions", auth.get_session_stats(), {"expired", "evicted"}, "Sessions"
+        ),
+    ]
+    for name, stats in ownership.stats().items():
+        lines += _render_stats(
+            f"ownership_{name}",
+            stats,
+            {"hits", "misses", "evictions", "invalidations"},
+            f"Ownership cache ({name})",
+        )
+
+    return PlainTextResponse("\n".join(lines) + "\n", media_type=metrics.CONTENT_TYPE)
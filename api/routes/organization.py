@@ -3,48 +3,73 @@ from __future__ import annotations
 import logging
 from typing import Annotated, Any, Sequence
 
-from fastapi import APIRouter, Header, HTTPException, status
+from fastapi import APIRouter, Header, HTTPException, Request, Response, status
 from pydantic import BaseModel
-from sqlalchemy import Connection, Row
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncConnection
 
-from api import auth, db, models
+from api import auth, cache, db, models, ownership
+from api.pagination import Page
+from api.timing import TimedRoute
 
-router = APIRouter(prefix="/organization", tags=["organization"])
+router = APIRouter(
+    prefix="/organization", tags=["organization"], route_class=TimedRoute
+)
 
 logger = logging.getLogger(__name__)
 
 
-def _get_org_chapters(conn: Connection, org_name: str) -> Sequence[Row[Any]]:
+async def _get_org_chapters(conn: AsyncConnection, org_name: str) -> Sequence[Row[Any]]:
     """Returns all chapters belonging to an organization.
 
     Args:
-        conn (Connection): The database connection to use.
+        conn (AsyncConnection): The database connection to use.
         org_name (str): The name of the organization.
     """
     query = db.tb.chapter.select().where(db.tb.chapter.c.org_name == org_name)
-    return conn.execute(query).all()
+    return (await conn.execute(query)).all()
 
 
-@router.get("")
-def get_all_organizations() -> list[models.Organization]:
-    """Returns a list of all organizations in the database.
+@router.get("", response_model=list[models.Organization])
+async def get_all_organizations(
+    page: Page, request: Request, response: Response
+) -> Response:
+    """Returns a list of all organizations in the database, ordered by name when
+    paginated. Responses are cached; see `api.cache.CATALOG`.
 
     This does not require authentication to use.
+
+    Args:
+        page (Page): The requested page; see `api.pagination.Pagination`.
+        request (Request): The request, used as the cache key.
+        response (Response): The response, carrying pagination headers.
     """
-    with db.get_connection() as conn:
-        result = conn.execute(db.tb.organization.select()).all()
-    return result
+
+    async def load():
+        async with db.get_async_connection() as conn:
+            query = page.apply(db.tb.organization.select(), db.tb.organization.c.name)
+            return page.paginate((await conn.execute(query)).all())
+
+    return await cache.CATALOG.respond(
+        request,
+        response,
+        load,
+        list[models.Organization],
+        cache_control=cache.PUBLIC_CACHE_CONTROL,
+    )
 
 
 @router.post("", status_code=status.HTTP_204_NO_CONTENT)
-def create_organization(
+async def create_organization(
     specification: models.Organization,
+    tx: db.Transaction,
     authorization: Annotated[str | None, Header()] = None,
 ):
     """Creates an organization based on the provided specifications.
 
     Args:
         specification (models.Organization): The fields of the organization to create.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -53,34 +78,51 @@ def create_organization(
     """
     auth.get(authorization).is_global_admin().raise_for_http()
 
-    with db.begin() as conn:
+    query = db.tb.organization.insert().values(specification.model_dump())
+    await (await tx.connection()).execute(query)
 
-        query = db.tb.organization.insert().values(specification.model_dump())
-        conn.execute(query)
+    tx.after_commit(cache.CATALOG.invalidate)
 
 
-@router.get("/{org_name}")
-def get_specific_organization(
+@router.get(
+    "/{org_name}",
+    response_model=models.OrganizationWithChapters | models.Organization,
+)
+async def get_specific_organization(
     org_name: str,
+    request: Request,
+    response: Response,
     include_chapters: bool = False,
-) -> models.OrganizationWithChapters | models.Organization:
+) -> Response:
     """Returns a specific organization, optionally with all chapters belonging to it.
+    Responses are cached; see `api.cache.CATALOG`.
 
     Args:
         org_name (str): The name of the desired organization.
+        request (Request): The request, used as the cache key.
+        response (Response): The response.
         include_chapters (bool, optional): Whether to include chapters with the result.
             Defaults to False.
 
     Raises:
         HTTPException: 404; if the provided organization does not exist.
     """
+    return await cache.CATALOG.respond(
+        request,
+        response,
+        lambda: _get_organization(org_name, include_chapters),
+        models.OrganizationWithChapters | models.Organization,
+        cache_control=cache.PUBLIC_CACHE_CONTROL,
+    )
+
 
-    with db.get_connection() as conn:
+async def _get_organization(org_name: str, include_chapters: bool) -> dict[str, Any]:
+    async with db.get_async_connection() as conn:
 
         org_query = db.tb.organization.select().where(
             db.tb.organization.c.name == org_name
         )
-        result = conn.execute(org_query).one_or_none()
+        result = (await conn.execute(org_query)).one_or_none()
 
         if result is None:
             raise HTTPException(
@@ -90,27 +132,41 @@ def get_specific_organization(
         result = dict(result._mapping)
 
         if include_chapters:
-            result["chapters"] = _get_org_chapters(conn, org_name)
+            result["chapters"] = await _get_org_chapters(conn, org_name)
 
     return result
 
 
-@router.get("/{org_name}/chapters")
-def get_organization_chapters(org_name: str) -> list[models.Chapter]:
-    """Returns a list of chapters belonging to the provided organization.
+@router.get("/{org_name}/chapters", response_model=list[models.Chapter])
+async def get_organization_chapters(
+    org_name: str, request: Request, response: Response
+) -> Response:
+    """Returns a list of chapters belonging to the provided organization. Responses
+    are cached; see `api.cache.CATALOG`.
 
     Args:
         org_name (str): The name of the organization for which to retreive chapters.
+        request (Request): The request, used as the cache key.
+        response (Response): The response.
     """
-    with db.get_connection() as conn:
-        result = _get_org_chapters(conn, org_name)
 
-    return result
+    async def load():
+        async with db.get_async_connection() as conn:
+            return await _get_org_chapters(conn, org_name)
+
+    return await cache.CATALOG.respond(
+        request,
+        response,
+        load,
+        list[models.Chapter],
+        cache_control=cache.PUBLIC_CACHE_CONTROL,
+    )
 
 
 @router.delete("/{org_name}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_organization(
+async def delete_organization(
     org_name: str,
+    tx: db.Transaction,
     authorization: Annotated[str | None, Header()] = None,
 ):
     """Deletes the specified organization.
@@ -119,6 +175,7 @@ def delete_organization(
 
     Args:
         org_name (str): The name of the organization to remove.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -127,16 +184,19 @@ def delete_organization(
     """
     auth.get(authorization).is_global_admin().raise_for_http()
 
-    with db.begin() as conn:
-        query = (
-            db.tb.organization.delete()
-            .returning(*db.tb.organization.c)
-            .where(db.tb.organization.c.name == org_name)
-        )
-        result = conn.execute(query).one_or_none()
+    query = (
+        db.tb.organization.delete()
+        .returning(*db.tb.organization.c)
+        .where(db.tb.organization.c.name == org_name)
+    )
+    result = (await (await tx.connection()).execute(query)).one_or_none()
 
-        if result is None:
-            raise HTTPException(status.HTTP_304_NOT_MODIFIED, "Nothing was deleted.")
+    if result is None:
+        raise HTTPException(status.HTTP_304_NOT_MODIFIED, "Nothing was deleted.")
+
+    tx.after_commit(cache.CATALOG.invalidate)
+    # the organization's chapters, with their bills and members, were deleted with it
+    tx.after_commit(ownership.clear)
 
 
 class OrganizationUpdateRequest(BaseModel):
@@ -146,9 +206,10 @@ class OrganizationUpdateRequest(BaseModel):
 
 
 @router.patch("/{org_name}")
-def update_organization(
+async def update_organization(
     org_name: str,
     updates: OrganizationUpdateRequest,
+    tx: db.Transaction,
     authorization: Annotated[str | None, Header()] = None,
 ) -> models.Organization:
     """Partially updates an organization based on the provided `updates`.
@@ -156,6 +217,7 @@ def update_organization(
     Args:
         org_name (str): The name of the organization to update.
         updates (OrganizationUpdateRequest): The changes to make (exclude fields to leave them unmodified).
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -168,17 +230,16 @@ def update_organization(
     """
     auth.get(authorization).is_global_admin().raise_for_http()
 
-    with db.begin() as conn:
+    query = (
+        db.tb.organization.update()
+        .returning(*db.tb.organization.c)
+        .where(db.tb.organization.c.name == org_name)
+        .values(**updates.model_dump(exclude_unset=True))
+    )
+    result = (await (await tx.connection()).execute(query)).one_or_none()
 
-        query = (
-            db.tb.organization.update()
-            .returning(*db.tb.organization.c)
-            .where(db.tb.organization.c.name == org_name)
-            .values(**updates.model_dump(exclude_unset=True))
-        )
-        result = conn.execute(query).one_or_none()
-
-        if result is None:
-            raise HTTPException(status.HTTP_304_NOT_MODIFIED)
+    if result is None:
+        raise HTTPException(status.HTTP_304_NOT_MODIFIED)
 
+    tx.after_commit(cache.CATALOG.invalidate)
     return result
@@ -5,11 +5,15 @@ from typing import Annotated, Any, Sequence
 
 from fastapi import APIRouter, Header, HTTPException, status
 from pydantic import BaseModel
-from sqlalchemy import Connection, Insert, Row, select
+from sqlalchemy import Insert, Row, select
+from sqlalchemy.ext.asyncio import AsyncConnection
 
-from api import auth, db, models
+from api import auth, db, models, ownership
+from api.timing import TimedRoute
 
-router = APIRouter(prefix="/payment_info", tags=["payment_info"])
+router = APIRouter(
+    prefix="/payment_info", tags=["payment_info"], route_class=TimedRoute
+)
 
 logger = logging.getLogger(__name__)
 
@@ -31,56 +35,64 @@ class CreateCardRequest(CreatePaymentInfoRequest):
     name: str
 
 
-def _get_member_email_from_payment_id(conn: Connection, payment_id: int) -> str:
+async def _get_member_email_from_payment_id(
+    conn: AsyncConnection, payment_id: int
+) -> str:
+    member_email = ownership.PAYMENT_MEMBERS.get(payment_id)
+    if member_email is not None:
+        return member_email
+
+    generation = ownership.PAYMENT_MEMBERS.generation
     query = select(db.tb.payment_info.c.member_email).where(
         db.tb.payment_info.c.payment_id == payment_id
     )
-    result = conn.execute(query).one_or_none()
+    result = (await conn.execute(query)).one_or_none()
 
     if result is None:
         raise HTTPException(
             status.HTTP_404_NOT_FOUND, "Specified payment option does not exist."
         )
 
+    ownership.PAYMENT_MEMBERS.set(payment_id, result[0], generation)
     return result[0]
 
 
 @router.post("")
-def create_payment_info(
+async def create_payment_info(
     specification: CreateBankAccountRequest | CreateCardRequest,
+    tx: db.Transaction,
     authorization: Annotated[str | None, Header()] = None,
 ) -> models.BankAccount | models.Card:
     auth.get(authorization).is_user(specification.member_email).raise_for_http()
 
-    with db.get_connection() as conn:
+    conn = await tx.connection()
 
-        spec_dict = specification.model_dump(exclude_unset=True)
+    spec_dict = specification.model_dump(exclude_unset=True)
 
-        info_query = (
-            db.tb.payment_info.insert()
-            .returning(db.tb.payment_info.c.payment_id)
-            .values(
-                member_email=spec_dict.pop("member_email"),
-                nickname=spec_dict.pop("nickname", None),
-            )
+    info_query = (
+        db.tb.payment_info.insert()
+        .returning(db.tb.payment_info.c.payment_id)
+        .values(
+            member_email=spec_dict.pop("member_email"),
+            nickname=spec_dict.pop("nickname", None),
         )
+    )
 
-        (created_id,) = conn.execute(info_query).one()
+    (created_id,) = (await conn.execute(info_query)).one()
 
-        spec_dict["payment_id"] = created_id
+    spec_dict["payment_id"] = created_id
 
-        query: Insert
-        if isinstance(specification, CreateBankAccountRequest):
-            query = (
-                db.tb.bank_account.insert()
-                .returning(*db.tb.bank_account.c)
-                .values(spec_dict)
-            )
-        else:
-            query = db.tb.card.insert().returning(*db.tb.card.c).values(spec_dict)
+    query: Insert
+    if isinstance(specification, CreateBankAccountRequest):
+        query = (
+            db.tb.bank_account.insert()
+            .returning(*db.tb.bank_account.c)
+            .values(spec_dict)
+        )
+    else:
+        query = db.tb.card.insert().returning(*db.tb.card.c).values(spec_dict)
 
-        created = conn.execute(query).one()
-        conn.commit()
+    created = (await conn.execute(query)).one()
 
     return dict(
         member_email=specification.member_email,
@@ -91,17 +103,21 @@ def create_payment_info(
 
 # TODO: update, delete
 @router.delete("/{payment_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_payment_info(
-    payment_id: int, authorization: Annotated[str | None, Header()] = None
+async def delete_payment_info(
+    payment_id: int,
+    tx: db.Transaction,
+    authorization: Annotated[str | None, Header()] = None,
 ):
     auth_checker = auth.get(authorization)
     auth_checker.logged_in().raise_for_http()
 
-    with db.begin() as conn:
-        member_email = _get_member_email_from_payment_id(conn, payment_id)
-        auth_checker.is_user(member_email).raise_for_http()
+    conn = await tx.connection()
+    member_email = await _get_member_email_from_payment_id(conn, payment_id)
+    auth_checker.is_user(member_email).raise_for_http()
 
-        query = db.tb.payment_info.delete().where(
-            db.tb.payment_info.c.payment_id == payment_id
-        )
-        conn.execute(query)
+    query = db.tb.payment_info.delete().where(
+        db.tb.payment_info.c.payment_id == payment_id
+    )
+    await conn.execute(query)
+
+    tx.after_commit(lambda: ownership.PAYMENT_MEMBERS.discard(payment_id))
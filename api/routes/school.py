@@ -4,48 +4,71 @@ import logging
 from datetime import date
 from typing import Annotated, Any, Sequence
 
-from fastapi import APIRouter, Header, HTTPException, status
+from fastapi import APIRouter, Header, HTTPException, Request, Response, status
 from pydantic import BaseModel
-from sqlalchemy import Connection, Row, select
+from sqlalchemy import Row, select
+from sqlalchemy.ext.asyncio import AsyncConnection
 
-from api import auth, db, models
+from api import auth, cache, db, models, ownership
+from api.pagination import Page
+from api.timing import TimedRoute
 
-router = APIRouter(prefix="/school", tags=["school"])
+router = APIRouter(prefix="/school", tags=["school"], route_class=TimedRoute)
 
 logger = logging.getLogger(__name__)
 
 
-def _get_school_chapters(conn: Connection, school_name: str) -> Sequence[Row[Any]]:
+async def _get_school_chapters(
+    conn: AsyncConnection, school_name: str
+) -> Sequence[Row[Any]]:
     """Returns all chapters belonging to a school.
 
     Args:
-        conn (Connection): The database connection to use.
+        conn (AsyncConnection): The database connection to use.
         school_name (str): The name of the school.
     """
     query = db.tb.chapter.select().where(db.tb.chapter.c.school_name == school_name)
-    return conn.execute(query).all()
+    return (await conn.execute(query)).all()
 
 
-@router.get("")
-def get_all_schools() -> list[models.School]:
-    """Returns a list of all schools in the database.
+@router.get("", response_model=list[models.School])
+async def get_all_schools(page: Page, request: Request, response: Response) -> Response:
+    """Returns a list of all schools in the database, ordered by name when paginated.
+    Responses are cached; see `api.cache.CATALOG`.
 
     This does not require authentication to use.
+
+    Args:
+        page (Page): The requested page; see `api.pagination.Pagination`.
+        request (Request): The request, used as the cache key.
+        response (Response): The response, carrying pagination headers.
     """
-    with db.get_connection() as conn:
-        result = conn.execute(db.tb.school.select()).all()
-    return result
+
+    async def load():
+        async with db.get_async_connection() as conn:
+            query = page.apply(db.tb.school.select(), db.tb.school.c.name)
+            return page.paginate((await conn.execute(query)).all())
+
+    return await cache.CATALOG.respond(
+        request,
+        response,
+        load,
+        list[models.School],
+        cache_control=cache.PUBLIC_CACHE_CONTROL,
+    )
 
 
 @router.post("", status_code=status.HTTP_204_NO_CONTENT)
-def create_school(
+async def create_school(
     specification: models.School,
+    tx: db.Transaction,
     authorization: Annotated[str | None, Header()] = None,
 ):
     """Creates a school based on the provided specifications.
 
     Args:
         specification (models.School): The fields of the school to create.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -54,32 +77,46 @@ def create_school(
     """
     auth.get(authorization).is_global_admin().raise_for_http()
 
-    with db.begin() as conn:
+    query = db.tb.school.insert().values(specification.model_dump())
+    await (await tx.connection()).execute(query)
 
-        query = db.tb.school.insert().values(specification.model_dump())
-        conn.execute(query)
+    tx.after_commit(cache.CATALOG.invalidate)
 
 
-@router.get("/{school_name}")
-def get_specific_school(
+@router.get("/{school_name}", response_model=models.SchoolWithChapters | models.School)
+async def get_specific_school(
     school_name: str,
+    request: Request,
+    response: Response,
     include_chapters: bool = False,
-) -> models.SchoolWithChapters | models.School:
+) -> Response:
     """Returns a specific school, optionally with all chapters belonging to it.
+    Responses are cached; see `api.cache.CATALOG`.
 
     Args:
         school_name (str): The name of the desired school.
+        request (Request): The request, used as the cache key.
+        response (Response): The response.
         include_chapters (bool, optional): Whether to include chapters with the result.
             Defaults to False.
 
     Raises:
         HTTPException: 404; if the provided school does not exist.
     """
+    return await cache.CATALOG.respond(
+        request,
+        response,
+        lambda: _get_school(school_name, include_chapters),
+        models.SchoolWithChapters | models.School,
+        cache_control=cache.PUBLIC_CACHE_CONTROL,
+    )
+
 
-    with db.get_connection() as conn:
+async def _get_school(school_name: str, include_chapters: bool) -> dict[str, Any]:
+    async with db.get_async_connection() as conn:
 
         org_query = db.tb.school.select().where(db.tb.school.c.name == school_name)
-        result = conn.execute(org_query).one_or_none()
+        result = (await conn.execute(org_query)).one_or_none()
 
         if result is None:
             raise HTTPException(
@@ -89,27 +126,41 @@ def get_specific_school(
         result = dict(result._mapping)
 
         if include_chapters:
-            result["chapters"] = _get_school_chapters(conn, school_name)
+            result["chapters"] = await _get_school_chapters(conn, school_name)
 
     return result
 
 
-@router.get("/{school_name}/chapters")
-def get_school_chapters(school_name: str) -> list[models.Chapter]:
-    """Returns a list of chapters belonging to the provided school.
+@router.get("/{school_name}/chapters", response_model=list[models.Chapter])
+async def get_school_chapters(
+    school_name: str, request: Request, response: Response
+) -> Response:
+    """Returns a list of chapters belonging to the provided school. Responses are
+    cached; see `api.cache.CATALOG`.
 
     Args:
         school_name (str): The name of the school for which to retreive chapters.
+        request (Request): The request, used as the cache key.
+        response (Response): The response.
     """
-    with db.get_connection() as conn:
-        result = _get_school_chapters(conn, school_name)
 
-    return result
+    async def load():
+        async with db.get_async_connection() as conn:
+            return await _get_school_chapters(conn, school_name)
+
+    return await cache.CATALOG.respond(
+        request,
+        response,
+        load,
+        list[models.Chapter],
+        cache_control=cache.PUBLIC_CACHE_CONTROL,
+    )
 
 
 @router.delete("/{school_name}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_school(
+async def delete_school(
     school_name: str,
+    tx: db.Transaction,
     authorization: Annotated[str | None, Header()] = None,
 ):
     """Deletes the specified school.
@@ -118,6 +169,7 @@ def delete_school(
 
     Args:
         school_name (str): The name of the school to remove.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -127,16 +179,19 @@ def delete_school(
     """
     auth.get(authorization).is_global_admin().raise_for_http()
 
-    with db.begin() as conn:
-        query = (
-            db.tb.school.delete()
-            .returning(*db.tb.school.c)
-            .where(db.tb.school.c.name == school_name)
-        )
-        result = conn.execute(query).one_or_none()
+    query = (
+        db.tb.school.delete()
+        .returning(*db.tb.school.c)
+        .where(db.tb.school.c.name == school_name)
+    )
+    result = (await (await tx.connection()).execute(query)).one_or_none()
 
-        if result is None:
-            raise HTTPException(status.HTTP_304_NOT_MODIFIED, "Nothing was deleted.")
+    if result is None:
+        raise HTTPException(status.HTTP_304_NOT_MODIFIED, "Nothing was deleted.")
+
+    tx.after_commit(cache.CATALOG.invalidate)
+    # the school's chapters, with their bills and members, were deleted with it
+    tx.after_commit(ownership.clear)
 
 
 class SchoolUpdateRequest(BaseModel):
@@ -145,9 +200,10 @@ class SchoolUpdateRequest(BaseModel):
 
 
 @router.patch("/{school_name}")
-def update_school(
+async def update_school(
     school_name: str,
     updates: SchoolUpdateRequest,
+    tx: db.Transaction,
     authorization: Annotated[str | None, Header()] = None,
 ) -> models.School:
     """Partially updates a school based on the provided `updates`.
@@ -155,6 +211,7 @@ def update_school(
     Args:
         school_name (str): The name of the school to update.
         updates (SchoolUpdateRequest): The changes to make (exclude fields to leave them unmodified).
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
             Defaults to None.
 
@@ -167,17 +224,16 @@ def update_school(
     """
     auth.get(authorization).is_global_admin().raise_for_http()
 
-    with db.begin() as conn:
-
-        query = (
-            db.tb.school.update()
-            .returning(*db.tb.school.c)
-            .where(db.tb.school.c.name == school_name)
-            .values(**updates.model_dump(exclude_unset=True))
-        )
-        result = conn.execute(query).one_or_none()
+    query = (
+        db.tb.school.update()
+        .returning(*db.tb.school.c)
+        .where(db.tb.school.c.name == school_name)
+        .values(**updates.model_dump(exclude_unset=True))
+    )
+    result = (await (await tx.connection()).execute(query)).one_or_none()
 
-        if result is None:
-            raise HTTPException(status.HTTP_304_NOT_MODIFIED)
+    if result is None:
+        raise HTTPException(status.HTTP_304_NOT_MODIFIED)
 
+    tx.after_commit(cache.CATALOG.invalidate)
     return result
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import logging
+from typing import Annotated, Any
+
+from fastapi import APIRouter, Header
+
+from api import auth, cache, db, ownership, passwords
+from api.timing import TimedRoute
+
+router = APIRouter(prefix="/stats", tags=["stats"], route_class=TimedRoute)
+
+logger = logging.getLogger(__name__)
+
+
+@router.get("/pool")
+async def get_pool_stats(
+    authorization: Annotated[str | None, Header()] = None
+) -> dict[str, dict[str, Any]]:
+    """Returns the state and usage statistics of the database connection pools.
+
+    Includes checked-out connections, waiters, a checkout wait-time histogram (in
+    seconds), and connection churn counters.
+
+    Args:
+        authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
+            Defaults to None.
+
+    Raises:
+        HTTPException: 401, 403; if the user does not have permission to perform this action.
+    """
+    auth.get(authorization).is_global_admin().raise_for_http()
+
+    return db.get_pool_stats()
+
+
+@router.get("/sessions")
+async def get_session_stats(
+    authorization: Annotated[str | None, Header()] = None
+) -> dict[str, int]:
+    """Returns counters for live, expired, and evicted login sessions.
+
+    Args:
+        authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
+            Defaults to None.
+
+    Raises:
+        HTTPException: 401, 403; if the user does not have permission to perform this action.
+    """
+    auth.get(authorization).is_global_admin().raise_for_http()
+
+    return auth.get_session_stats()
+
+
+@router.get("/cache")
+async def get_cache_stats(
+    authorization: Annotated[str | None, Header()] = None
+) -> dict[str, int | float]:
+    """Returns the size and hit, miss, and eviction counters of the catalog cache.
+
+    `coalesced` counts misses that waited for another request's load instead of
+    querying the database themselves.
+
+    Args:
+        authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
+            Defaults to None.
+
+    Raises:
+        HTTPException: 401, 403; if the user does not have permission to perform this action.
+    """
+    auth.get(authorization).is_global_admin().raise_for_http()
+
+    return cache.CATALOG.stats()
+
+
+@router.get("/ownership")
+async def get_ownership_stats(
+    authorization: Annotated[str | None, Header()] = None
+) -> dict[str, dict[str, int | float]]:
+    """Returns the size and hit, miss, eviction, and invalidation counters of the
+    caches of bill, member, and payment option owners.
+
+    Args:
+        authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
+            Defaults to None.
+
+    Raises:
+        HTTPException: 401, 403; if the user does not have permission to perform this action.
+    """
+    auth.get(authorization).is_global_admin().raise_for_http()
+
+    return ownership.stats()
+
+
+@router.get("/passwords")
+async def get_password_stats(
+    authorization: Annotated[str | None, Header()] = None
+) -> dict[str, Any]:
+    """Returns the state of the password hashing processes, the number of hashes and
+    verifications run (and of logins checked against plaintext passwords not yet
+    rehashed), and the counters of the cache of failed logins.
+
+    Args:
+        authorization (Annotated[str  |  None, Header, optional): The auth token used to authorize this action.
+            Defaults to None.
+
+    Raises:
+        HTTPException: 401, 403; if the user does not have permission to perform this action.
+    """
+    auth.get(authorization).is_global_admin().raise_for_http()
+
+    return passwords.stats()
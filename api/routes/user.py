@@ -6,11 +6,12 @@ from fastapi import APIRouter, Header, HTTPException, status
 from pydantic import BaseModel
 from sqlalchemy import select
 
-from api import auth, db, models
+from api import auth, db, models, ownership, passwords
+from api.timing import TimedRoute
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/user", tags=["user"])
+router = APIRouter(prefix="/user", tags=["user"], route_class=TimedRoute)
 
 
 class MemberInfo(BaseModel):
@@ -40,7 +41,7 @@ class LoginResponse(BaseModel):
 
 
 @router.post("/login")
-def login(req: LoginRequest) -> LoginResponse:
+async def login(req: LoginRequest) -> LoginResponse:
     """Logs in a user to the application, granting them an authentication token registered
     with the `api.auth` module.
 
@@ -55,8 +56,10 @@ def login(req: LoginRequest) -> LoginResponse:
             track of.
     """
 
-    logger.info(f"Logging in user {req.email}")
-    authorization = db.authenticate(**dict(req))
+    logger.info("Logging in user %s", req.email)
+    # not through `db.Transaction`, whose connection would be held while the password
+    # is verified
+    authorization = await db.authenticate(**dict(req))
 
     if authorization is None:
         raise HTTPException(
@@ -74,10 +77,13 @@ def login(req: LoginRequest) -> LoginResponse:
 
 
 @router.post("/logout")
-def logout(authorization: Annotated[str | None, Header()] = None) -> dict[str, str]:
+async def logout(
+    tx: db.Transaction, authorization: Annotated[str | None, Header()] = None
+) -> dict[str, str]:
     """Logs out a user from the application, unregistering them from the `api.auth` module.
 
     Args:
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The auth token of the user to log out.
             Defaults to None.
 
@@ -91,7 +97,7 @@ def logout(authorization: Annotated[str | None, Header()] = None) -> dict[str, s
 
     authentication.logged_in().raise_for_http()
 
-    authentication.unregister_self()
+    await db.revoke_token(await tx.connection(), authentication)
 
     return {"message": "Successfully logged out."}
 
@@ -102,13 +108,16 @@ class CreateUserRequest(User):
 
 
 @router.post("", status_code=status.HTTP_201_CREATED)
-def create_user(
-    user: CreateUserRequest, authorization: Annotated[str | None, Header()] = None
+async def create_user(
+    user: CreateUserRequest,
+    tx: db.Transaction,
+    authorization: Annotated[str | None, Header()] = None,
 ) -> dict[str, str]:
     """Creates a new user, optionally creating a corresponding chapter member along with it.
 
     Args:
         user (CreateUserRequest): The user information.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): An auth token (only needed if providing any
             admin permissions on user creation).
 
@@ -121,50 +130,61 @@ def create_user(
     """
     auth_checker = auth.get(authorization)
 
-    with db.get_connection() as conn:
+    # hashed before checking out a connection, so that it is not held while hashing
+    password = await passwords.hash_password(user.password)
 
-        # check for conflicts
-        exists = conn.execute(
-            select(1).select_from(db.tb.user).where(db.tb.user.c.email == user.email)
-        ).one_or_none()
+    conn = await tx.connection()
 
-        if exists is not None:
-            raise HTTPException(
-                status.HTTP_409_CONFLICT,
-                f"User with email '{user.email}' already exists.",
-            )
-
-        # create new user
-        user_values = {"email": user.email, "password": user.password}
+    # check for conflicts
+    exists = (
+        await conn.execute(
+            select(1).select_from(db.tb.user).where(db.tb.user.c.email == user.email)
+        )
+    ).one_or_none()
 
-        if user.is_admin is not None:
-            auth_checker.is_global_admin().raise_for_http()
-            user_values["is_admin"] = user.is_admin
+    if exists is not None:
+        raise HTTPException(
+            status.HTTP_409_CONFLICT,
+            f"User with email '{user.email}' already exists.",
+        )
 
-        user_insert = db.tb.user.insert().values(user_values)
-        conn.execute(user_insert)
+    # create new user
+    user_values = {"email": user.email, "password": password}
 
-        # create member if needed
-        if user.organization_info is not None:
-            db.create_member(
-                conn,
-                auth_checker,
-                models.CreateMemberRequest(
-                    **user.organization_info.model_dump(), email=user.email
-                ),
-            )
+    if user.is_admin is not None:
+        auth_checker.is_global_admin().raise_for_http()
+        user_values["is_admin"] = user.is_admin
+
+    user_insert = db.tb.user.insert().values(user_values)
+    await conn.execute(user_insert)
+
+    # create member if needed
+    if user.organization_info is not None:
+        await db.create_member(
+            conn,
+            auth_checker,
+            models.CreateMemberRequest(
+                **user.organization_info.model_dump(), email=user.email
+            ),
+        )
 
-        conn.commit()
+    # attempts to log in before the user existed failed
+    tx.after_commit(lambda: passwords.forget_failures(user.email))
 
     return {"message": "User created!"}
 
 
 @router.delete("/{user_email}")
-def delete_user(user_email: str, authorization: Annotated[str | None, Header()] = None):
+async def delete_user(
+    user_email: str,
+    tx: db.Transaction,
+    authorization: Annotated[str | None, Header()] = None,
+):
     """Deletes the specified user.
 
     Args:
         user_email (str): _description_
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): _description_. Defaults to None.
 
     Raises:
@@ -173,12 +193,18 @@ def delete_user(user_email: str, authorization: Annotated[str | None, Header()]
     auth_checker = auth.get(authorization)
     auth_checker.is_user(user_email).raise_for_http()
 
-    with db.begin() as conn:
-        conn.execute(db.tb.user.delete().where(db.tb.user.c.email == user_email))
+    conn = await tx.connection()
+    await conn.execute(db.tb.user.delete().where(db.tb.user.c.email == user_email))
+
+    # invalidate any signed tokens the deleted user still holds
+    await db.revoke_user_tokens(conn, user_email)
 
-        # if the user deletes their own account, invalidate their auth token
-        if auth_checker.email == user_email:
-            auth_checker.unregister_self()
+    # if the user deletes their own account, invalidate their auth token
+    if auth_checker.email == user_email:
+        await db.revoke_token(conn, auth_checker)
+
+    # deleting the user also deletes their membership
+    tx.after_commit(lambda: ownership.forget_member(user_email))
 
 
 class UpdateUserRequest(BaseModel):
@@ -187,9 +213,10 @@ class UpdateUserRequest(BaseModel):
 
 
 @router.patch("/{user_email}")
-def update_user(
+async def update_user(
     user_email: str,
     req: UpdateUserRequest,
+    tx: db.Transaction,
     authorization: Annotated[str | None, Header()] = None,
 ):
     """Update a user's information.
@@ -197,6 +224,7 @@ def update_user(
     Args:
         user_email (str): The email of the user to modify.
         req (UpdateUserRequest): The fields to modify.
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The authorization needed to perform this action.
             Defaults to None.
 
@@ -221,15 +249,19 @@ def update_user(
 
     if req.password is not None:
         auth_checker.is_user(user_email).raise_for_http()
-        update_clause["password"] = req.password
+        update_clause["password"] = await passwords.hash_password(req.password)
         unregister_auth = True
 
-    with db.begin() as conn:
-        conn.execute(query.values(**update_clause))
+    conn = await tx.connection()
+    await conn.execute(query.values(**update_clause))
 
-    # delay logout to after change goes through
+    # a new password invalidates every signed token issued with the old one
     if unregister_auth:
-        auth_checker.unregister_self()
+        await db.revoke_user_tokens(conn, user_email)
+
+        # delay logout to after change goes through
+        tx.after_commit(auth_checker.unregister_self)
+        tx.after_commit(lambda: passwords.forget_failures(user_email))
 
 
 class UserResponse(BaseModel):
@@ -238,13 +270,16 @@ class UserResponse(BaseModel):
 
 
 @router.get("/{user_email}")
-def get_user(
-    user_email: str, authorization: Annotated[str | None, Header()] = None
+async def get_user(
+    user_email: str,
+    tx: db.Transaction,
+    authorization: Annotated[str | None, Header()] = None,
 ) -> UserResponse:
     """Fetch basic user information on a user.
 
     Args:
         user_email (str): _description_
+        tx (db.Transaction): The request's database transaction.
         authorization (Annotated[str  |  None, Header, optional): The authorization needed to perform this action.
             Defaults to None.
 
@@ -257,15 +292,12 @@ def get_user(
     """
     auth.get(authorization).logged_in().raise_for_http()
 
-    with db.get_connection() as conn:
-        user = db.tb.user.c
-        query = select(user.email, user.is_admin).where(user.email == user_email)
+    user = db.tb.user.c
+    query = select(user.email, user.is_admin).where(user.email == user_email)
 
-        result = conn.execute(query).one_or_none()
+    result = (await (await tx.connection()).execute(query)).one_or_none()
 
-        if result is None:
-            raise HTTPException(
-                status.HTTP_404_NOT_FOUND, "Requested user does not exist."
-            )
+    if result is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Requested user does not exist.")
 
-        return UserResponse(email=result[0], is_admin=result[1])
+    return UserResponse(email=result[0], is_admin=result[1])
@@ -0,0 +1,217 @@
+"""Opt-in `Server-Timing` headers breaking down where a request's time went.
+
+With `SERVER_TIMING=true`, `ServerTimingMiddleware` collects the time spent in each
+phase of a request and reports it in a `Server-Timing` header, which browser
+devtools show in the network panel:
+
+- `auth`: token lookups (`auth.get`);
+- `db-connect`: waiting for (or opening) pooled connections;
+- `sql`: one entry per statement, described by its first few words;
+- `validate`: validating and dumping the returned value against the route's
+  `response_model` (only for routes using `TimedRoute`);
+- `project`: picking model fields out of rows in `responses.rows_response`;
+- `encode`: encoding the response body as JSON;
+- `total`: the whole request, up to the response being sent.
+
+Durations are in milliseconds. Time spent after the response starts (e.g., in a
+streamed export) is not included.
+
+When disabled, `timed` and the recording functions return after a context variable
+lookup and `TimedRoute` does not wrap anything.
+"""
+
+import contextvars
+import time
+from typing import Any, Final
+
+from fastapi.routing import APIRoute
+from sqlalchemy import Engine, event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from api.config import CONFIG
+
+# the number of `sql` entries reported per request; later statements are summed
+# into a single `sql-other` entry to keep the header small
+MAX_QUERIES: Final[int] = 25
+
+# the number of characters of a statement used to describe it
+_STATEMENT_LENGTH: Final[int] = 40
+
+# the descriptions of the entries that are summed per request
+_DESCRIPTIONS: Final[dict[str, str]] = {
+    "auth": "token lookup",
+    "db-connect": "connection acquisition",
+    "sql-other": "remaining statements",
+    "validate": "response validation",
+    "project": "row projection",
+    "encode": "JSON encoding",
+}
+
+
+class _Timings:
+    """The timing entries of the current request."""
+
+    __slots__ = ("entries", "queries", "_totals")
+
+    def __init__(self):
+        # [name, seconds, description]
+        self.entries: list[list[Any]] = []
+        self.queries = 0
+        self._totals: dict[str, list[Any]] = {}
+
+    def add(self, name: str, seconds: float):
+        """Adds `seconds` to the entry named `name`, creating it if needed."""
+        entry = self._totals.get(name)
+        if entry is None:
+            entry = self._totals[name] = [name, 0.0, _DESCRIPTIONS.get(name)]
+            self.entries.append(entry)
+        entry[1] += seconds
+
+    def add_query(self, statement: str, seconds: float):
+        self.queries += 1
+        if self.queries > MAX_QUERIES:
+            self.add("sql-other", seconds)
+            return
+
+        description = " ".join(statement.split())[:_STATEMENT_LENGTH]
+        self.entries.append(["sql", seconds, description])
+
+    def header(self, total: float) -> bytes:
+        def format_entry(name: str, seconds: float, description: str | None) -> str:
+            entry = f"{name};dur={seconds * 1000:.3f}"
+            if description:
+                description = description.replace("\\", "\\\\").replace('"', '\\"')
+                entry += f';desc="{description}"'
+            return entry
+
+        return ", ".join(
+            format_entry(*entry) for entry in [*self.entries, ["total", total, None]]
+        ).encode("latin-1", "replace")
+
+
+_CURRENT: contextvars.ContextVar[_Timings | None] = contextvars.ContextVar(
+    "server_timing", default=None
+)
+
+
+class timed:
+    """Context manager adding the time spent in its body to the entry `name` of the
+    current request's `Server-Timing` header.
+
+    Args:
+        name (str): The name of the entry.
+    """
+
+    __slots__ = ("_name", "_timings", "_start")
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __enter__(self):
+        self._timings = _CURRENT.get()
+        if self._timings is not None:
+            self._start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self._timings is not None:
+            self._timings.add(self._name, time.perf_counter() - self._start)
+
+
+def record_pool_wait(seconds: float):
+    """Adds time spent waiting for a pooled connection to the current request."""
+    timings = _CURRENT.get()
+    if timings is not None:
+        timings.add("db-connect", seconds)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._timing_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = _CURRENT.get()
+    if timings is not None:
+        timings.add_query(statement, time.perf_counter() - context._timing_start)
+
+
+def _handle_error(exception_context):
+    context = exception_context.execution_context
+    if context is not None and hasattr(context, "_timing_start"):
+        _after_cursor_execute(
+            None, None, exception_context.statement or "", None, context, None
+        )
+
+
+def instrument_engine(engine: Engine):
+    """Reports the statements executed by `engine` in `Server-Timing` headers.
+
+    Args:
+        engine (Engine): The engine to instrument; use `AsyncEngine.sync_engine` for
+            async engines.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class _TimedField:
+    """Wraps a route's response field to time validating and dumping responses."""
+
+    def __init__(self, field: Any):
+        self._field = field
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._field, name)
+
+    def validate(self, *args, **kwargs) -> Any:
+        with timed("validate"):
+            return self._field.validate(*args, **kwargs)
+
+    def serialize(self, *args, **kwargs) -> Any:
+        with timed("validate"):
+            return self._field.serialize(*args, **kwargs)
+
+
+class TimedRoute(APIRoute):
+    """A route whose response validation is reported in `Server-Timing` headers.
+
+    Use it as the `route_class` of an `APIRouter`.
+    """
+
+    def get_route_handler(self):
+        field = self.secure_cloned_response_field
+        if CONFIG.server_timing and field is not None:
+            if not isinstance(field, _TimedField):
+                self.secure_cloned_response_field = _TimedField(field)
+
+        return super().get_route_handler()
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware adding a `Server-Timing` header to every response."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = _Timings()
+        start = time.perf_counter()
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start":
+                header = timings.header(time.perf_counter() - start)
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"server-timing", header),
+                ]
+            await send(message)
+
+        token = _CURRENT.set(timings)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _CURRENT.reset(token)
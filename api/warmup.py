@@ -0,0 +1,90 @@
+"""Startup warm-up, so that the first requests after a deploy are not slower.
+
+Without it, the first requests pay for opening database connections (TCP, TLS, and
+authentication handshakes), for SQLAlchemy compiling the hottest statements, for
+asyncpg preparing them on each connection, for building the catalog cache's
+serializers, and for starting the password hashing processes.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+
+from fastapi import FastAPI, HTTPException
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from api import cache, db, passwords
+from api.db.queries import _get_credentials
+from api.routes.bill import _get_chapter_id_from_bill_id
+from api.routes.chapter import _get_chapter_members
+from api.routes.member import _get_chapter_id_from_member_email
+
+logger = logging.getLogger(__name__)
+
+
+async def _run_hot_statements(conn: AsyncConnection):
+    # the parameters match nothing; only compiling and preparing matters
+    await _get_credentials(conn, "")
+    await _get_chapter_members(conn, 0)
+
+    for lookup, missing in (
+        (_get_chapter_id_from_bill_id, uuid.UUID(int=0)),
+        (_get_chapter_id_from_member_email, ""),
+    ):
+        try:
+            await lookup(conn, missing)
+        except HTTPException:
+            pass
+
+
+async def _warm_connections(connections: int):
+    remaining = connections
+    all_warm = asyncio.Event()
+
+    async def warm():
+        nonlocal remaining
+        try:
+            async with db.get_async_connection() as conn:
+                await _run_hot_statements(conn)
+
+                # hold the connection until every other one is open, so that each
+                # task warms a different connection
+                remaining -= 1
+                if remaining == 0:
+                    all_warm.set()
+                await all_warm.wait()
+        except BaseException:
+            all_warm.set()
+            raise
+
+    await asyncio.gather(*(warm() for _ in range(connections)))
+
+
+def _prime_serializers(app: FastAPI):
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.response_model is not None:
+            cache.CATALOG.prime(route.response_model)
+
+
+async def warm_up(app: FastAPI, connections: int):
+    """Opens `connections` pooled connections, runs the hottest statements on each,
+    builds the serializers of `app`'s response models, and starts the password hashing
+    processes.
+
+    Args:
+        app (FastAPI): The application to warm up.
+        connections (int): The number of connections to open; at most the pool size,
+            as connections beyond it would be closed when returned to the pool.
+    """
+    start = time.perf_counter()
+
+    _prime_serializers(app)
+    await asyncio.gather(_warm_connections(connections), passwords.warm_up())
+
+    logger.info(
+        "Warmed up %d connections in %.1f ms",
+        connections,
+        (time.perf_counter() - start) * 1000,
+    )
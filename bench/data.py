@@ -0,0 +1,97 @@
+"""Synthetic data shared by the benchmarks.
+
+Each benchmark builds the project's schema in its own scratch Postgres schema and
+drops it afterwards, so the benchmarks are safe to run against a development
+database.
+"""
+
+from __future__ import annotations
+
+import re
+from pathlib import Path
+
+from sqlalchemy import Connection, text
+
+CREATE_TABLES_PATH = (
+    Path(__file__).parent.parent / "api" / "db" / "sql" / "create_tables.sql"
+)
+
+
+def create_schema(conn: Connection, schema: str, indexes: bool = True):
+    """(Re)creates the tables of `create_tables.sql`, without its sample rows, in
+    the Postgres schema `schema` and sets it as the `search_path` of `conn`.
+
+    Args:
+        conn (Connection): The connection to create the schema with.
+        schema (str): The name of the scratch schema; it is dropped first if it exists.
+        indexes (bool, optional): Whether to create the indexes of
+            `create_tables.sql`. Defaults to True.
+    """
+    ddl = CREATE_TABLES_PATH.read_text()
+
+    # keep the table definitions only; sample rows are generated separately
+    ddl = ddl[: re.search(r"^INSERT INTO", ddl, flags=re.M).start()]
+    if not indexes:
+        ddl = re.sub(r"^CREATE INDEX .*$", "", ddl, flags=re.M)
+
+    drop_schema(conn, schema)
+    conn.exec_driver_sql(f"CREATE SCHEMA {schema}")
+    conn.exec_driver_sql(f"SET search_path TO {schema}")
+    conn.exec_driver_sql(ddl)
+
+
+def drop_schema(conn: Connection, schema: str):
+    """Drops the scratch schema `schema` and everything in it."""
+    conn.exec_driver_sql(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+
+
+def generate_data(conn: Connection, members: int, bills: int):
+    """Fills the tables in the current `search_path` with generated rows.
+
+    There is a chapter per 100 members and an organization and school per 20
+    chapters. Bill `i` (starting at 1) has the ID `md5(i::text)::uuid`; every tenth
+    bill is external and the rest belong to member `i % members + 1`, whose email is
+    `member{n}@example.com`.
+
+    Args:
+        conn (Connection): The connection to insert with.
+        members (int): The number of users and members to create.
+        bills (int): The number of bills to create.
+    """
+    chapters = max(members // 100, 1)
+    params = {"chapters": chapters, "members": members, "bills": bills}
+
+    for stmt in (
+        "INSERT INTO organization SELECT 'org ' || i, 'O' || i, 'Social' "
+        "FROM generate_series(1, greatest(:chapters / 20, 1)) i",
+        "INSERT INTO school SELECT 'school ' || i, 'address ' || i "
+        "FROM generate_series(1, greatest(:chapters / 20, 1)) i",
+        "INSERT INTO chapter (name, billing_address, org_name, school_name) "
+        "SELECT 'chapter ' || i, 'address', "
+        "'org ' || (i % greatest(:chapters / 20, 1) + 1), "
+        "'school ' || ((i * 7) % greatest(:chapters / 20, 1) + 1) "
+        "FROM generate_series(1, :chapters) i",
+        'INSERT INTO "user" (email, password) '
+        "SELECT 'member' || i || '@example.com', 'password' "
+        "FROM generate_series(1, :members) i",
+        "INSERT INTO member (chapter_id, email, fname, lname, dob, phone_num) "
+        "SELECT i % :chapters + 1, 'member' || i || '@example.com', 'first', 'last', "
+        "'2000-01-01', '555-555-5555' FROM generate_series(1, :members) i",
+        "INSERT INTO bill (chapter_id, bill_id, amount, due_date, is_external) "
+        "SELECT i % :chapters + 1, md5(i::text)::uuid, 100, "
+        "now() - (i % 365) * interval '1 day', i % 10 = 0 "
+        "FROM generate_series(1, :bills) i",
+        "INSERT INTO internal_bill SELECT md5(i::text)::uuid, "
+        "'member' || (i % :members + 1) || '@example.com' "
+        "FROM generate_series(1, :bills) i WHERE i % 10 <> 0",
+        "INSERT INTO external_bill SELECT md5(i::text)::uuid, 'contact', 'payor', "
+        "'address', 'payor@example.com', '555-555-5555' "
+        "FROM generate_series(1, :bills) i WHERE i % 10 = 0",
+        "INSERT INTO payment_info (member_email, nickname) "
+        "SELECT 'member' || i || '@example.com', 'card' "
+        "FROM generate_series(1, :members) i",
+        "INSERT INTO bank_account SELECT payment_id, payment_id, 1 FROM payment_info",
+    ):
+        conn.execute(text(stmt), params)
+
+    conn.exec_driver_sql("ANALYZE")
@@ -0,0 +1,146 @@
+"""Measures the effect of `api/db/migrations/002_lookup_indexes.sql`.
+
+Builds the schema from `create_tables.sql` (without its indexes) in a scratch
+Postgres schema, fills it with generated data, and runs each hot lookup query
+with `EXPLAIN ANALYZE` before and after applying the index migration. The scratch
+schema is dropped afterwards, so this is safe to run against a development
+database.
+
+Usage (from the project root):
+
+    python -m bench.indexes [--members 100000] [--bills 1000000] [--runs 20]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import time
+
+from sqlalchemy import Connection, text
+
+from api.db import engine, migrate
+
+from . import data
+
+INDEX_MIGRATION_PATH = migrate.MIGRATIONS_PATH / "002_lookup_indexes.sql"
+
+SCHEMA = "bench_indexes"
+
+# (name, query) pairs mirroring the lookups made by the routes
+QUERIES: list[tuple[str, str]] = [
+    ("chapter members", "SELECT * FROM member WHERE chapter_id = :chapter_id"),
+    ("organization chapters", "SELECT * FROM chapter WHERE org_name = :org_name"),
+    ("school chapters", "SELECT * FROM chapter WHERE school_name = :school_name"),
+    (
+        "chapter bills (internal)",
+        "SELECT * FROM bill JOIN internal_bill USING (bill_id) "
+        "WHERE bill.chapter_id = :chapter_id",
+    ),
+    (
+        "chapter bills (external)",
+        "SELECT * FROM bill JOIN external_bill USING (bill_id) "
+        "WHERE bill.chapter_id = :chapter_id",
+    ),
+    (
+        "pay bill lookup",
+        "SELECT member_email FROM internal_bill WHERE bill_id = :bill_id",
+    ),
+    (
+        "member bills",
+        "SELECT bill.* FROM bill JOIN internal_bill USING (bill_id) "
+        "WHERE internal_bill.member_email = :email",
+    ),
+    (
+        "member payment info",
+        "SELECT * FROM payment_info JOIN bank_account USING (payment_id) "
+        "WHERE payment_info.member_email = :email",
+    ),
+]
+
+
+def _measure(conn: Connection, query: str, params: dict, runs: int) -> dict:
+    explain = conn.execute(
+        text(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}"), params
+    ).scalar_one()
+    plan = explain[0]["Plan"]
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        conn.execute(text(query), params).all()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    nodes = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        nodes.append(node["Node Type"])
+        stack.extend(node.get("Plans", []))
+
+    return {"plan": " > ".join(nodes), "median_ms": statistics.median(timings)}
+
+
+def run(members: int, bills: int, runs: int) -> list[dict]:
+    params = {
+        "chapter_id": 1,
+        "org_name": "org 1",
+        "school_name": "school 1",
+        "bill_id": "c4ca4238-a0b9-2382-0dcc-509a6f75849b",  # md5('1')
+        "email": "member1@example.com",
+    }
+
+    eng = engine.get_engine()
+    try:
+        with eng.begin() as conn:
+            data.create_schema(conn, SCHEMA, indexes=False)
+            data.generate_data(conn, members, bills)
+
+        results = {}
+        with eng.connect() as conn:
+            conn.exec_driver_sql(f"SET search_path TO {SCHEMA}")
+            for name, query in QUERIES:
+                results[name] = {"before": _measure(conn, query, params, runs)}
+
+        # apply the shipped migration itself to the scratch schema
+        with eng.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql(f"SET search_path TO {SCHEMA}")
+            for stmt in migrate.statements(INDEX_MIGRATION_PATH):
+                conn.exec_driver_sql(stmt)
+            conn.exec_driver_sql("ANALYZE")
+
+        with eng.connect() as conn:
+            conn.exec_driver_sql(f"SET search_path TO {SCHEMA}")
+            for name, query in QUERIES:
+                results[name]["after"] = _measure(conn, query, params, runs)
+    finally:
+        with eng.begin() as conn:
+            data.drop_schema(conn, SCHEMA)
+
+    return [{"query": name, **result} for name, result in results.items()]
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m bench.indexes")
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--bills", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args(argv)
+
+    results = run(args.members, args.bills, args.runs)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for result in results:
+        before, after = result["before"], result["after"]
+        print(f"{result['query']}:")
+        print(f"  before: {before['median_ms']:9.3f} ms  {before['plan']}")
+        print(f"  after:  {after['median_ms']:9.3f} ms  {after['plan']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Measures login throughput with hashed passwords (see `api/passwords.py`).
+
+Compares, with concurrent clients:
+
+- the previous login, comparing plaintext passwords in SQL;
+- `db.authenticate` on users whose passwords are still in plaintext, which rehashes
+  them (hashing once to migrate them);
+- `db.authenticate` on hashed passwords, verified in the process pool;
+- the same verification run inline on the event loop and in a thread, for reference;
+- `db.authenticate` retrying the same wrong passwords, which `FAILED_LOGINS` rejects
+  without hashing after the first attempt.
+
+Alongside throughput and latency, each scenario reports the worst event loop lag
+observed while it ran, i.e. how long other requests could have been stalled.
+
+The data is generated in a scratch Postgres schema which is dropped afterwards, so
+this is safe to run against a development database.
+
+Usage (from the project root):
+
+    python -m bench.login [--members 1000] [--logins 200] [--concurrency 16]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import statistics
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Sequence
+
+from sqlalchemy import event, select
+
+from api import db, passwords
+
+from . import data
+
+SCHEMA = "bench_login"
+PASSWORD = "password"
+
+# how often (in seconds) the event loop lag is sampled
+_LAG_INTERVAL = 0.005
+
+
+async def _plaintext_login(email: str, password: str):
+    # the login path before passwords were hashed
+    async with db.get_async_connection() as conn:
+        query = select(db.tb.user.c.email).where(
+            db.tb.user.c.email == email, db.tb.user.c.password == password
+        )
+        assert (await conn.execute(query)).first() is not None
+
+
+async def _login(email: str, password: str):
+    assert await db.authenticate(email, password) is not None
+
+
+async def _failed_login(email: str, password: str):
+    assert await db.authenticate(email, password) is None
+
+
+async def _stored_password(email: str) -> str:
+    async with db.get_async_connection() as conn:
+        query = select(db.tb.user.c.password).where(db.tb.user.c.email == email)
+        return (await conn.execute(query)).scalar_one()
+
+
+async def _inline_login(email: str, password: str):
+    stored = await _stored_password(email)
+    assert passwords._verify(password, stored)
+
+
+async def _threaded_login(email: str, password: str):
+    stored = await _stored_password(email)
+    assert await asyncio.to_thread(passwords._verify, password, stored)
+
+
+@contextlib.asynccontextmanager
+async def _loop_lag() -> AsyncIterator[list[float]]:
+    lags = [0.0]
+
+    async def sample():
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(_LAG_INTERVAL)
+            lags.append((time.perf_counter() - start - _LAG_INTERVAL) * 1000)
+
+    task = asyncio.create_task(sample())
+    try:
+        yield lags
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+
+async def _throughput(
+    work: Sequence[Callable[[], Awaitable[Any]]], concurrency: int
+) -> dict[str, float]:
+    queue = list(reversed(work))
+    latencies = []
+
+    async def worker():
+        while queue:
+            job = queue.pop()
+            start = time.perf_counter()
+            await job()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    async with _loop_lag() as lags:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "ops_per_sec": len(work) / elapsed,
+        "median_ms": statistics.median(latencies),
+        "p95_ms": statistics.quantiles(latencies, n=20)[-1],
+        "max_loop_lag_ms": max(lags),
+    }
+
+
+async def _run(members: int, logins: int, concurrency: int) -> list[dict]:
+    # point the application's engine at the scratch schema
+    def set_search_path(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET search_path TO {SCHEMA}")
+        cursor.close()
+        # otherwise rolled back when the connection is first returned to the pool
+        dbapi_connection.commit()
+
+    event.listen(db.get_async_engine().sync_engine, "connect", set_search_path)
+
+    try:
+        await passwords.warm_up()
+
+        emails = [f"member{i % members + 1}@example.com" for i in range(logins)]
+        # a few users retrying the same wrong password
+        retries = [f"member{i % 10 + 1}@example.com" for i in range(logins)]
+
+        scenarios = {
+            "plaintext compare (SQL)": [
+                lambda e=email: _plaintext_login(e, PASSWORD) for email in emails
+            ],
+            "first login (rehash from plaintext)": [
+                lambda e=email: _login(e, PASSWORD) for email in emails
+            ],
+            "hashed login (process pool)": [
+                lambda e=email: _login(e, PASSWORD) for email in emails
+            ],
+            "hashed login (inline)": [
+                lambda e=email: _inline_login(e, PASSWORD) for email in emails
+            ],
+            "hashed login (thread)": [
+                lambda e=email: _threaded_login(e, PASSWORD) for email in emails
+            ],
+            "repeated wrong password (cached)": [
+                lambda e=email: _failed_login(e, "wrong") for email in retries
+            ],
+        }
+
+        return [
+            {"scenario": name, "operations": len(work)}
+            | await _throughput(work, concurrency)
+            for name, work in scenarios.items()
+        ]
+    finally:
+        passwords.shutdown()
+        await db.get_async_engine().dispose()
+
+
+def run(members: int, logins: int, concurrency: int) -> list[dict]:
+    # the plaintext scenario and the first logins each need unmigrated users
+    assert logins <= members, "--logins must not exceed --members"
+
+    eng = db.get_engine()
+    try:
+        with eng.begin() as conn:
+            data.create_schema(conn, SCHEMA)
+            data.generate_data(conn, members, 0)
+
+        return asyncio.run(_run(members, logins, concurrency))
+    finally:
+        with eng.begin() as conn:
+            data.drop_schema(conn, SCHEMA)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m bench.login")
+    parser.add_argument("--members", type=int, default=1_000)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args(argv)
+
+    results = run(args.members, args.logins, args.concurrency)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for result in results:
+        print(
+            f"{result['scenario']:36} {result['ops_per_sec']:9.1f} ops/s  "
+            f"median {result['median_ms']:8.3f} ms  p95 {result['p95_ms']:8.3f} ms  "
+            f"max loop lag {result['max_loop_lag_ms']:8.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
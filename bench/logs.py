@@ -0,0 +1,177 @@
+"""Measures how long a request spends logging, before and after `api.logs`.
+
+Replays the log records a request for a chapter with its members produces (its SQL
+statements as logged by SQLAlchemy, the route's debug record, and uvicorn's access
+log line) under several configurations:
+
+- `before`: the previous setup, a `RichHandler` on the root logger at `NOTSET`, so
+  every record is rendered and written on the request's thread;
+- `rich`/`json` through the `api.logs` queue, at `NOTSET` (everything logged) and
+  with the recommended production levels.
+
+Output goes to `os.devnull`, so terminal speed is not measured. `caller` is the
+time spent on the logging thread, which is what requests wait for; `total` also
+includes writing out the queued records.
+
+Usage (from the project root):
+
+    python -m bench.logs [--requests 500] [--repeat 3]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Any, Callable
+
+from sqlalchemy import select
+
+from api import db, logs
+
+# the root level and per-logger levels recommended for production
+PRODUCTION_LEVELS = ("INFO", {"sqlalchemy": "WARNING"})
+
+
+def _queries() -> list[str]:
+    chapter, member = db.tb.chapter, db.tb.member
+    return [
+        str(select(chapter).where(chapter.c.id == 1).compile()),
+        str(select(member).where(member.c.chapter_id == 1).compile()),
+    ]
+
+
+def _request(queries: list[str]) -> Callable[[], None]:
+    engine = logging.getLogger("sqlalchemy.engine.Engine")
+    route = logging.getLogger("api.routes.chapter")
+    access = logging.getLogger("uvicorn.access")
+
+    result = {
+        "id": 1,
+        "name": "Alpha Beta",
+        "billing_address": "1 Main St",
+        "org_name": "Chi Omega",
+        "school": {"name": "MST", "billing_address": "300 W 13th St"},
+        "organization": {"name": "Chi Omega", "greek_letters": "XΩ", "type": "social"},
+    }
+
+    # as logged by SQLAlchemy (at INFO) for each statement of the request
+    def request():
+        engine.info("BEGIN (implicit)")
+        for query in queries:
+            engine.info(query)
+            engine.info("[%s] %r", "generated in 0.00012s", (1,))
+        engine.info("ROLLBACK")
+        route.debug("Chapter %s: %s", 1, result)
+        access.info(
+            '%s - "%s %s HTTP/%s" %d',
+            "127.0.0.1:50000",
+            "GET",
+            "/chapter/1?include_members=true",
+            "1.1",
+            200,
+        )
+
+    return request
+
+
+def _configure_before(stream):
+    # the configuration `api.__main__` used before `api.logs`
+    from rich.console import Console
+    from rich.logging import RichHandler
+
+    logs.shutdown()
+    handler = RichHandler(console=Console(file=stream))
+    handler.setFormatter(logging.Formatter("%(message)s", datefmt="[%X]"))
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(logging.NOTSET)
+
+
+def _reset_levels():
+    for name in ("sqlalchemy", "api", "uvicorn"):
+        logging.getLogger(name).setLevel(logging.NOTSET)
+
+
+def _scenarios(stream) -> dict[str, Callable[[], None]]:
+    def queued(log_format, level="NOTSET", levels=None):
+        return lambda: logs.configure(log_format, level, levels or {}, stream)
+
+    return {
+        "before (rich, NOTSET, inline)": lambda: _configure_before(stream),
+        "rich, NOTSET, queued": queued("rich"),
+        "json, NOTSET, queued": queued("json"),
+        "rich, production levels, queued": queued("rich", *PRODUCTION_LEVELS),
+        "json, production levels, queued": queued("json", *PRODUCTION_LEVELS),
+    }
+
+
+def _measure(
+    configure: Callable[[], None], request: Callable[[], None], n: int, repeat: int
+) -> dict[str, Any]:
+    best_caller = best_total = float("inf")
+
+    for _ in range(repeat):
+        _reset_levels()
+        configure()
+        for _ in range(min(n, 100)):  # warm up
+            request()
+        logs.shutdown()
+        configure()
+
+        start = time.perf_counter()
+        for _ in range(n):
+            request()
+        caller = time.perf_counter() - start
+        logs.shutdown()  # waits for the queued records to be written
+        total = time.perf_counter() - start
+
+        best_caller = min(best_caller, caller)
+        best_total = min(best_total, total)
+
+    return {
+        "caller_us_per_request": best_caller / n * 1e6,
+        "total_us_per_request": best_total / n * 1e6,
+    }
+
+
+def run(requests: int, repeat: int) -> list[dict]:
+    request = _request(_queries())
+
+    with open(os.devnull, "w") as stream:
+        try:
+            return [
+                {"scenario": name} | _measure(configure, request, requests, repeat)
+                for name, configure in _scenarios(stream).items()
+            ]
+        finally:
+            logs.shutdown()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m bench.logs")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args(argv)
+
+    results = run(args.requests, args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for result in results:
+        print(
+            f"{result['scenario']:34} caller {result['caller_us_per_request']:8.1f} "
+            f"us/request  total {result['total_us_per_request']:8.1f} us/request"
+        )
+
+
+if __name__ == "__main__":
+    main()
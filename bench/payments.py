@@ -0,0 +1,201 @@
+"""Measures the throughput of the bill payment paths in `api/db/queries.py`.
+
+Compares, with concurrent clients:
+
+- paying one bill with the previous `SELECT` on `internal_bill` followed by an
+  `UPDATE` on `bill` against the single-statement `db.pay_bill`;
+- settling all of a member's bills with one `db.pay_bill` per bill against a single
+  `db.pay_bills`.
+
+The data is generated in a scratch Postgres schema which is dropped afterwards, so
+this is safe to run against a development database.
+
+Usage (from the project root):
+
+    python -m bench.payments [--members 2000] [--bills 20000] [--payments 5000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import Any, Awaitable, Callable, Sequence
+
+from sqlalchemy import case, make_url, select
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from api import db
+from api.config import CONFIG
+
+from . import data
+
+SCHEMA = "bench_payments"
+
+
+async def _two_statement_payment(engine: AsyncEngine, bill_id: str, email: str):
+    # the payment path before it was collapsed into `db.pay_bill`
+    async with engine.begin() as conn:
+        email_query = select(db.tb.internal_bill.c.member_email).where(
+            db.tb.internal_bill.c.bill_id == bill_id
+        )
+        owner = (await conn.execute(email_query)).scalar_one()
+        assert owner == email
+
+        bill = db.tb.bill.c
+        update_query = (
+            db.tb.bill.update()
+            .returning(*db.tb.bill.c)
+            .values(
+                amount_paid=case(
+                    ((bill.amount_paid + 0.01) > bill.amount, bill.amount),
+                    else_=bill.amount_paid + 0.01,
+                )
+            )
+            .where(bill.bill_id == bill_id)
+        )
+        (await conn.execute(update_query)).one()
+
+
+async def _single_statement_payment(engine: AsyncEngine, bill_id: str, email: str):
+    async with engine.begin() as conn:
+        result = await db.pay_bill(conn, bill_id, 0.01, email)
+        assert result is not None and result.bill_id is not None
+
+
+async def _settle_one_by_one(
+    engine: AsyncEngine, email: str, bills: Sequence[tuple[str, float]]
+):
+    for bill_id, owed in bills:
+        async with engine.begin() as conn:
+            await db.pay_bill(conn, bill_id, owed, email)
+
+
+async def _settle_batched(
+    engine: AsyncEngine, email: str, bills: Sequence[tuple[str, float]]
+):
+    async with engine.begin() as conn:
+        await db.pay_bills(conn, email, sum(owed for _, owed in bills))
+
+
+async def _throughput(
+    work: Sequence[Callable[[], Awaitable[Any]]], concurrency: int
+) -> dict[str, float]:
+    queue = list(reversed(work))
+    latencies = []
+
+    async def worker():
+        while queue:
+            job = queue.pop()
+            start = time.perf_counter()
+            await job()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "ops_per_sec": len(work) / elapsed,
+        "median_ms": statistics.median(latencies),
+        "p95_ms": statistics.quantiles(latencies, n=20)[-1],
+    }
+
+
+async def _run(payments: int, concurrency: int) -> list[dict]:
+    engine = create_async_engine(
+        make_url(CONFIG.database_url).set(drivername="postgresql+asyncpg"),
+        pool_size=concurrency,
+        connect_args={"server_settings": {"search_path": SCHEMA}},
+    )
+
+    try:
+        async with engine.connect() as conn:
+            query = (
+                select(
+                    db.tb.internal_bill.c.member_email,
+                    db.tb.bill.c.bill_id,
+                    db.tb.bill.c.amount - db.tb.bill.c.amount_paid,
+                )
+                .join(db.tb.internal_bill)
+                .order_by(db.tb.bill.c.due_date, db.tb.bill.c.bill_id)
+            )
+            rows = (await conn.execute(query)).all()
+
+        bills_by_member: dict[str, list[tuple[str, float]]] = {}
+        for email, bill_id, owed in rows:
+            bills_by_member.setdefault(email, []).append((str(bill_id), owed))
+
+        rng = random.Random(0)
+        samples = [rng.choice(rows) for _ in range(payments)]
+        members = list(bills_by_member.items())
+        half = len(members) // 2
+
+        scenarios = {
+            "pay bill (select + update)": [
+                lambda e=email, b=str(bill_id): _two_statement_payment(engine, b, e)
+                for email, bill_id, _ in samples
+            ],
+            "pay bill (single statement)": [
+                lambda e=email, b=str(bill_id): _single_statement_payment(engine, b, e)
+                for email, bill_id, _ in samples
+            ],
+            "settle member (one payment per bill)": [
+                lambda e=email, b=bills: _settle_one_by_one(engine, e, b)
+                for email, bills in members[:half]
+            ],
+            "settle member (batched payment)": [
+                lambda e=email, b=bills: _settle_batched(engine, e, b)
+                for email, bills in members[half:]
+            ],
+        }
+
+        return [
+            {"scenario": name, "operations": len(work)}
+            | await _throughput(work, concurrency)
+            for name, work in scenarios.items()
+        ]
+    finally:
+        await engine.dispose()
+
+
+def run(members: int, bills: int, payments: int, concurrency: int) -> list[dict]:
+    eng = db.get_engine()
+    try:
+        with eng.begin() as conn:
+            data.create_schema(conn, SCHEMA)
+            data.generate_data(conn, members, bills)
+
+        return asyncio.run(_run(payments, concurrency))
+    finally:
+        with eng.begin() as conn:
+            data.drop_schema(conn, SCHEMA)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m bench.payments")
+    parser.add_argument("--members", type=int, default=2_000)
+    parser.add_argument("--bills", type=int, default=20_000)
+    parser.add_argument("--payments", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args(argv)
+
+    results = run(args.members, args.bills, args.payments, args.concurrency)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for result in results:
+        print(
+            f"{result['scenario']:38} {result['ops_per_sec']:9.1f} ops/s  "
+            f"median {result['median_ms']:7.3f} ms  p95 {result['p95_ms']:7.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
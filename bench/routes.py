@@ -0,0 +1,762 @@
+"""Measures the latency and throughput of every route in `api/routes`.
+
+Seeds a scratch database (`bench_routes`, on the server of `DATABASE_URL`) with the
+tables of `create_tables.sql` and generated data (see `bench.data`), starts the API
+against it with uvicorn, and sends each route `--requests` requests from
+`--concurrency` concurrent clients, logged in as a global admin unless the route
+needs otherwise. Routes that create rows run before the routes that update and
+delete them, and listings of every member or chapter are paginated (`limit=100`).
+
+The results (latency percentiles and throughput per route, along with the commit
+and scale) are saved as JSON so that runs on different commits can be compared.
+
+Usage (from the project root):
+
+    python -m bench.routes [--members 100000] [--bills 2000000] [--requests 200]
+    python -m bench.routes --compare BEFORE.json AFTER.json
+
+Seeding millions of bills takes a few minutes; pass `--keep-database` to keep the
+seeded database for the next run instead of dropping it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import dataclasses
+import datetime
+import json
+import os
+import platform
+import random
+import secrets
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import httpx
+from sqlalchemy import URL, Connection, create_engine, make_url, text
+
+from api.config import CONFIG
+from api.routes import ROUTERS
+
+from . import data
+
+DATABASE = "bench_routes"
+SCHEMA = "bench"
+
+RESULTS_PATH = Path(__file__).parent / "results"
+
+# every generated user has this password (see `bench.data.generate_data`)
+PASSWORD = "password"
+ADMIN_EMAIL = "admin@example.com"
+
+# the number of existing rows of each kind that requests are spread over
+SAMPLE_SIZE = 1000
+
+
+@dataclasses.dataclass
+class _Context:
+    """Rows of the seeded database to send requests about, and rows created by the
+    routes measured so far.
+    """
+
+    admin: dict[str, str]
+    tag: str
+    chapters: list[int]
+    organizations: list[str]
+    schools: list[str]
+    members: list[str]
+    bills: list[str]
+    created: dict[str, list[Any]] = dataclasses.field(
+        default_factory=lambda: collections.defaultdict(list)
+    )
+
+    @staticmethod
+    def pick(items: list[Any], i: int) -> Any:
+        return items[i % len(items)]
+
+    def new(self, kind: str, i: int) -> str:
+        """Returns a name for the `i`th row of `kind` created by this run."""
+        return f"bench-{self.tag}-{kind}{i}"
+
+
+@dataclasses.dataclass
+class _Route:
+    method: str
+    path: str
+    # returns the keyword arguments of `httpx.AsyncClient.request` for request `i`
+    request: Callable[[int], dict[str, Any]]
+    # records what a successful response created, for later routes
+    collect: Callable[[httpx.Response], None] | None = None
+
+
+def _routes(ctx: _Context) -> list[_Route]:
+    admin = ctx.admin
+    pick, new, created = ctx.pick, ctx.new, ctx.created
+    due = "2030-01-01T00:00:00"
+
+    def get(path: str, url: Callable[[int], str]) -> _Route:
+        return _Route("GET", path, lambda i: {"url": url(i), "headers": admin})
+
+    def roster(i: int) -> str:
+        rows = [
+            f"{new('import', i)}-{j}@example.com,{PASSWORD},first,last,2000-01-01,555"
+            for j in range(10)
+        ]
+        return "\n".join(["email,password,fname,lname,dob,phone_num", *rows])
+
+    return [
+        # users and sessions
+        _Route(
+            "POST",
+            "/user/login",
+            lambda i: {
+                "url": "/user/login",
+                "json": {"email": pick(ctx.members, i), "password": PASSWORD},
+            },
+            lambda r: created["tokens"].append(r.json()["auth_token"]),
+        ),
+        _Route(
+            "POST",
+            "/user/logout",
+            lambda i: {
+                "url": "/user/logout",
+                "headers": {"authorization": pick(created["tokens"], i)},
+            },
+        ),
+        _Route(
+            "POST",
+            "/user",
+            lambda i: {
+                "url": "/user",
+                "json": {"email": f"{new('user', i)}@example.com", "password": "p"},
+            },
+        ),
+        get("/user/{user_email}", lambda i: f"/user/{pick(ctx.members, i)}"),
+        _Route(
+            "PATCH",
+            "/user/{user_email}",
+            lambda i: {
+                "url": f"/user/{new('user', i)}@example.com",
+                "headers": admin,
+                "json": {"is_admin": False},
+            },
+        ),
+        # catalog
+        get("/organization", lambda i: "/organization"),
+        get(
+            "/organization/{org_name}",
+            lambda i: f"/organization/{pick(ctx.organizations, i)}"
+            "?include_chapters=true",
+        ),
+        get(
+            "/organization/{org_name}/chapters",
+            lambda i: f"/organization/{pick(ctx.organizations, i)}/chapters",
+        ),
+        _Route(
+            "POST",
+            "/organization",
+            lambda i: {
+                "url": "/organization",
+                "headers": admin,
+                "json": {"name": new("org", i), "greek_letters": "B", "type": "Social"},
+            },
+        ),
+        _Route(
+            "PATCH",
+            "/organization/{org_name}",
+            lambda i: {
+                "url": f"/organization/{new('org', i)}",
+                "headers": admin,
+                "json": {"greek_letters": "BB"},
+            },
+        ),
+        get("/school", lambda i: "/school"),
+        get(
+            "/school/{school_name}",
+            lambda i: f"/school/{pick(ctx.schools, i)}?include_chapters=true",
+        ),
+        get(
+            "/school/{school_name}/chapters",
+            lambda i: f"/school/{pick(ctx.schools, i)}/chapters",
+        ),
+        _Route(
+            "POST",
+            "/school",
+            lambda i: {
+                "url": "/school",
+                "headers": admin,
+                "json": {"name": new("school", i), "billing_address": "address"},
+            },
+        ),
+        _Route(
+            "PATCH",
+            "/school/{school_name}",
+            lambda i: {
+                "url": f"/school/{new('school', i)}",
+                "headers": admin,
+                "json": {"billing_address": "new address"},
+            },
+        ),
+        # chapters
+        get("/chapter", lambda i: "/chapter?limit=100"),
+        get(
+            "/chapter/{chapter_id}",
+            lambda i: f"/chapter/{pick(ctx.chapters, i)}?include_members=true",
+        ),
+        get(
+            "/chapter/{chapter_id}/members",
+            lambda i: f"/chapter/{pick(ctx.chapters, i)}/members",
+        ),
+        get(
+            "/chapter/{chapter_id}/bills",
+            lambda i: f"/chapter/{pick(ctx.chapters, i)}/bills",
+        ),
+        get(
+            "/chapter/{chapter_id}/ledger",
+            lambda i: f"/chapter/{pick(ctx.chapters, i)}/ledger",
+        ),
+        get(
+            "/chapter/{chapter_id}/members/export",
+            lambda i: f"/chapter/{pick(ctx.chapters, i)}/members/export",
+        ),
+        get(
+            "/chapter/{chapter_id}/bills/export",
+            lambda i: f"/chapter/{pick(ctx.chapters, i)}/bills/export",
+        ),
+        _Route(
+            "POST",
+            "/chapter",
+            lambda i: {
+                "url": "/chapter",
+                "headers": admin,
+                "json": {
+                    "name": new("chapter", i),
+                    "billing_address": "address",
+                    "org_name": pick(ctx.organizations, i),
+                    "school_name": pick(ctx.schools, i),
+                },
+            },
+            lambda r: created["chapters"].append(r.json()["id"]),
+        ),
+        _Route(
+            "PATCH",
+            "/chapter/{chapter_id}",
+            lambda i: {
+                "url": f"/chapter/{pick(created['chapters'], i)}",
+                "headers": admin,
+                "json": {"billing_address": "new address"},
+            },
+        ),
+        _Route(
+            "POST",
+            "/chapter/{chapter_id}/members/import",
+            lambda i: {
+                "url": f"/chapter/{pick(ctx.chapters, i)}/members/import",
+                "headers": admin | {"content-type": "text/csv"},
+                "content": roster(i),
+            },
+        ),
+        # members
+        get("/member", lambda i: "/member?limit=100"),
+        get("/member/{member_email}", lambda i: f"/member/{pick(ctx.members, i)}"),
+        get(
+            "/member/{member_email}/bills",
+            lambda i: f"/member/{pick(ctx.members, i)}/bills",
+        ),
+        get(
+            "/member/{member_email}/payment_info",
+            lambda i: f"/member/{pick(ctx.members, i)}/payment_info",
+        ),
+        _Route(
+            "POST",
+            "/member",
+            lambda i: {
+                "url": "/member",
+                "headers": admin,
+                "json": {
+                    "email": f"{new('user', i)}@example.com",
+                    "chapter_id": pick(ctx.chapters, i),
+                    "fname": "first",
+                    "lname": "last",
+                    "dob": "2000-01-01",
+                    "phone_num": "555",
+                },
+            },
+        ),
+        _Route(
+            "PATCH",
+            "/member/{member_email}",
+            lambda i: {
+                "url": f"/member/{new('user', i)}@example.com",
+                "headers": admin,
+                "json": {"fname": "renamed"},
+            },
+        ),
+        # payment info
+        _Route(
+            "POST",
+            "/payment_info",
+            lambda i: {
+                "url": "/payment_info",
+                "headers": admin,
+                "json": {
+                    "member_email": pick(ctx.members, i),
+                    "nickname": "bench",
+                    # unique to this run; the seeded accounts use routing number 1
+                    "account_num": i,
+                    "routing_num": int(ctx.tag, 16),
+                },
+            },
+            lambda r: created["payment_infos"].append(r.json()["payment_id"]),
+        ),
+        _Route(
+            "DELETE",
+            "/payment_info/{payment_id}",
+            lambda i: {
+                "url": f"/payment_info/{pick(created['payment_infos'], i)}",
+                "headers": admin,
+            },
+        ),
+        # bills
+        _Route(
+            "POST",
+            "/bill/internal",
+            lambda i: {
+                "url": "/bill/internal",
+                "headers": admin,
+                "json": {
+                    "chapter_id": pick(ctx.chapters, i),
+                    "amount": 10,
+                    "due_date": due,
+                    "member_email": pick(ctx.members, i),
+                },
+            },
+            lambda r: created["bills"].append(r.json()["bill_id"]),
+        ),
+        _Route(
+            "POST",
+            "/bill/internal/bulk",
+            lambda i: {
+                "url": "/bill/internal/bulk",
+                "headers": admin,
+                "json": {
+                    "chapter_id": pick(ctx.chapters, i),
+                    "amount": 10,
+                    "due_date": due,
+                },
+            },
+        ),
+        _Route(
+            "POST",
+            "/bill/external",
+            lambda i: {
+                "url": "/bill/external",
+                "headers": admin,
+                "json": {
+                    "chapter_id": pick(ctx.chapters, i),
+                    "amount": 10,
+                    "due_date": due,
+                    "chapter_contact": "contact",
+                    "payor_name": "payor",
+                    "p_billing_address": "address",
+                    "p_email": "payor@example.com",
+                    "p_phone_num": "555",
+                },
+            },
+        ),
+        _Route(
+            "PATCH",
+            "/bill/id/{bill_id}",
+            lambda i: {
+                "url": f"/bill/id/{pick(created['bills'], i)}",
+                "headers": admin,
+                "json": {"desc": f"bench {i}"},
+            },
+        ),
+        _Route(
+            "POST",
+            "/bill/pay/{bill_id}",
+            lambda i: {
+                "url": f"/bill/pay/{pick(ctx.bills, i)}",
+                "headers": admin,
+                "json": {"payment_amount": 0.01},
+            },
+        ),
+        _Route(
+            "POST",
+            "/bill/pay",
+            lambda i: {
+                "url": "/bill/pay",
+                "headers": admin,
+                "json": {"member_email": pick(ctx.members, i), "payment_amount": 1},
+            },
+        ),
+        # deletions of what the routes above created
+        _Route(
+            "DELETE",
+            "/bill/id/{bill_id}",
+            lambda i: {
+                "url": f"/bill/id/{pick(created['bills'], i)}",
+                "headers": admin,
+            },
+        ),
+        _Route(
+            "DELETE",
+            "/member/{member_email}",
+            lambda i: {
+                "url": f"/member/{new('user', i)}@example.com",
+                "headers": admin,
+            },
+        ),
+        _Route(
+            "DELETE",
+            "/user/{user_email}",
+            lambda i: {"url": f"/user/{new('user', i)}@example.com", "headers": admin},
+        ),
+        _Route(
+            "DELETE",
+            "/chapter/{chapter_id}",
+            lambda i: {
+                "url": f"/chapter/{pick(created['chapters'], i)}",
+                "headers": admin,
+            },
+        ),
+        _Route(
+            "DELETE",
+            "/organization/{org_name}",
+            lambda i: {"url": f"/organization/{new('org', i)}", "headers": admin},
+        ),
+        _Route(
+            "DELETE",
+            "/school/{school_name}",
+            lambda i: {"url": f"/school/{new('school', i)}", "headers": admin},
+        ),
+        # diagnostics
+        get("/stats/pool", lambda i: "/stats/pool"),
+        get("/stats/sessions", lambda i: "/stats/sessions"),
+        get("/stats/cache", lambda i: "/stats/cache"),
+    ]
+
+
+def _missing_routes(routes: list[_Route]) -> list[str]:
+    """Returns the routes in `api/routes` that `routes` does not cover."""
+    covered = {(route.method, route.path) for route in routes}
+    return [
+        f"{method} {route.path}"
+        for router in ROUTERS
+        for route in router.routes
+        for method in sorted(route.methods)
+        if (method, route.path) not in covered
+    ]
+
+
+async def _measure(
+    client: httpx.AsyncClient, route: _Route, requests: int, concurrency: int
+) -> dict[str, Any]:
+    indices = iter(range(requests))
+    latencies = []
+    errors: collections.Counter[str] = collections.Counter()
+
+    async def worker():
+        for i in indices:
+            start = time.perf_counter()
+            try:
+                response = await client.request(route.method, **route.request(i))
+            except (httpx.HTTPError, LookupError, ZeroDivisionError) as e:
+                # lookups fail if the route creating what this one needs failed
+                errors[type(e).__name__] += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            if response.is_error:
+                errors[str(response.status_code)] += 1
+            elif route.collect is not None:
+                route.collect(response)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    result: dict[str, Any] = {
+        "route": f"{route.method} {route.path}",
+        "requests": requests,
+        "errors": dict(errors),
+        "requests_per_sec": len(latencies) / elapsed,
+    }
+    if len(latencies) >= 2:
+        percentiles = statistics.quantiles(latencies, n=100)
+        result |= {
+            "mean_ms": statistics.fmean(latencies),
+            "p50_ms": percentiles[49],
+            "p90_ms": percentiles[89],
+            "p99_ms": percentiles[98],
+            "max_ms": max(latencies),
+        }
+
+    return result
+
+
+async def _run_routes(
+    base_url: str, ctx_args: dict[str, Any], requests: int, concurrency: int
+) -> list[dict[str, Any]]:
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        timeout=300,
+        limits=httpx.Limits(max_connections=concurrency),
+    ) as client:
+        login = await client.post(
+            "/user/login", json={"email": ADMIN_EMAIL, "password": PASSWORD}
+        )
+        login.raise_for_status()
+
+        ctx = _Context(
+            admin={"authorization": login.json()["auth_token"]},
+            tag=secrets.token_hex(3),
+            **ctx_args,
+        )
+        routes = _routes(ctx)
+
+        for missing in _missing_routes(routes):
+            print(f"warning: {missing} is not measured", file=sys.stderr)
+
+        results = []
+        for route in routes:
+            print(f"{route.method} {route.path}", file=sys.stderr)
+            results.append(await _measure(client, route, requests, concurrency))
+
+    return results
+
+
+@contextlib.contextmanager
+def _server_connection() -> Iterator[Connection]:
+    """Connects to the database of `DATABASE_URL` outside of a transaction, as
+    creating and dropping databases requires.
+    """
+    engine = create_engine(CONFIG.database_url, isolation_level="AUTOCOMMIT")
+    try:
+        with engine.connect() as conn:
+            yield conn
+    finally:
+        engine.dispose()
+
+
+def _seed(url: URL, members: int, bills: int, keep: bool):
+    """Creates and fills the scratch database unless `keep` and it exists."""
+    with _server_connection() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM pg_database WHERE datname = :name"), {"name": DATABASE}
+        ).first()
+        if exists and keep:
+            return
+
+        conn.exec_driver_sql(f"DROP DATABASE IF EXISTS {DATABASE} WITH (FORCE)")
+        conn.exec_driver_sql(f"CREATE DATABASE {DATABASE}")
+        # so that the API finds the tables without any configuration of its own
+        conn.exec_driver_sql(f"ALTER DATABASE {DATABASE} SET search_path TO {SCHEMA}")
+
+    engine = create_engine(url)
+    try:
+        with engine.begin() as conn:
+            data.create_schema(conn, SCHEMA)
+            data.generate_data(conn, members, bills)
+            conn.execute(
+                text(
+                    'INSERT INTO "user" (email, password, is_admin) '
+                    "VALUES (:email, :password, true)"
+                ),
+                {"email": ADMIN_EMAIL, "password": PASSWORD},
+            )
+    finally:
+        engine.dispose()
+
+
+def _sample(url: URL) -> dict[str, Any]:
+    """Returns existing rows of the scratch database to send requests about."""
+    queries = {
+        "chapters": "SELECT id FROM chapter ORDER BY id",
+        "organizations": "SELECT name FROM organization ORDER BY name",
+        "schools": "SELECT name FROM school ORDER BY name",
+        "members": "SELECT email FROM member ORDER BY member_id",
+        "bills": "SELECT bill_id::text FROM internal_bill ORDER BY bill_id",
+    }
+
+    engine = create_engine(url)
+    try:
+        with engine.connect() as conn:
+            sample = {
+                kind: list(
+                    conn.exec_driver_sql(f"{query} LIMIT {SAMPLE_SIZE}").scalars()
+                )
+                for kind, query in queries.items()
+            }
+    finally:
+        engine.dispose()
+
+    # spread the requests of each route over the rows in a fixed order
+    rng = random.Random(0)
+    for rows in sample.values():
+        rng.shuffle(rows)
+
+    return sample
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_api(url: URL, port: int) -> subprocess.Popen:
+    env = os.environ | {"DATABASE_URL": url.render_as_string(hide_password=False)}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.__main__:app", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("The API exited during startup.")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/school").raise_for_status()
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.25)
+
+    process.terminate()
+    raise RuntimeError("The API did not start within 60 seconds.")
+
+
+def _git_commit() -> dict[str, Any]:
+    def git(*args: str) -> str:
+        return subprocess.run(
+            ["git", *args], capture_output=True, text=True, check=False
+        ).stdout.strip()
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain")),
+    }
+
+
+def run(
+    members: int, bills: int, requests: int, concurrency: int, keep: bool = False
+) -> dict[str, Any]:
+    url = make_url(CONFIG.database_url).set(database=DATABASE)
+
+    started = datetime.datetime.now(datetime.timezone.utc)
+    print("seeding", file=sys.stderr)
+    _seed(url, members, bills, keep)
+    sample = _sample(url)
+
+    port = _free_port()
+    api = _start_api(url, port)
+    try:
+        routes = asyncio.run(
+            _run_routes(f"http://127.0.0.1:{port}", sample, requests, concurrency)
+        )
+    finally:
+        api.terminate()
+        api.wait()
+
+        if not keep:
+            with _server_connection() as conn:
+                conn.exec_driver_sql(f"DROP DATABASE IF EXISTS {DATABASE} WITH (FORCE)")
+
+    return {
+        **_git_commit(),
+        "started": started.isoformat(),
+        "python": platform.python_version(),
+        "members": members,
+        "bills": bills,
+        "requests": requests,
+        "concurrency": concurrency,
+        "routes": routes,
+    }
+
+
+def compare(before: dict[str, Any], after: dict[str, Any]):
+    """Prints the change in median latency and throughput of each route."""
+
+    def change(old: float | None, new: float | None) -> str:
+        if not old or new is None:
+            return "     n/a"
+        return f"{(new - old) / old:+8.1%}"
+
+    old_routes = {result["route"]: result for result in before["routes"]}
+
+    print(
+        f"{'route':45} {'p50 before':>11} {'p50 after':>10} {'change':>8}  "
+        f"{'req/s change':>12}"
+    )
+    for new in after["routes"]:
+        old = old_routes.get(new["route"], {})
+        print(
+            f"{new['route']:45} {old.get('p50_ms', float('nan')):9.2f}ms "
+            f"{new.get('p50_ms', float('nan')):8.2f}ms "
+            f"{change(old.get('p50_ms'), new.get('p50_ms'))}  "
+            f"{change(old.get('requests_per_sec'), new['requests_per_sec']):>12}"
+        )
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m bench.routes")
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--bills", type=int, default=2_000_000)
+    parser.add_argument("--requests", type=int, default=200, help="per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--keep-database",
+        action="store_true",
+        help="reuse the seeded database if it exists (whatever its scale) and keep "
+        "it afterwards",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="where to save the results (default: bench/results/routes-COMMIT.json)",
+    )
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        type=Path,
+        metavar=("BEFORE", "AFTER"),
+        help="compare two saved results instead of running the benchmark",
+    )
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        before, after = (json.loads(path.read_text()) for path in args.compare)
+        compare(before, after)
+        return
+
+    results = run(
+        args.members, args.bills, args.requests, args.concurrency, args.keep_database
+    )
+
+    output = args.output or RESULTS_PATH / f"routes-{results['commit'][:12]}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+
+    for result in results["routes"]:
+        print(
+            f"{result['route']:45} {result['requests_per_sec']:8.1f} req/s  "
+            f"p50 {result.get('p50_ms', float('nan')):8.2f} ms  "
+            f"p99 {result.get('p99_ms', float('nan')):8.2f} ms  "
+            f"errors {sum(result['errors'].values())}"
+        )
+    print(f"saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
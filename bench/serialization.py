@@ -0,0 +1,143 @@
+"""Measures how fast bill listings are serialized to JSON.
+
+Compares, for the rows of `api.bills.bill_query`:
+
+- FastAPI's default path: validating the rows against the `response_model`
+  (`list[InternalBill | ExternalBill]`, or `list[Bill]` for a member's bills) and
+  encoding the result with the standard library;
+- the same validation with the result encoded by `FastJSONResponse`;
+- `api.responses.rows_response`, which skips validation.
+
+Only serialization is timed; the rows are fetched once beforehand. The data is
+generated in a scratch Postgres schema which is dropped afterwards, so this is safe
+to run against a development database.
+
+Usage (from the project root):
+
+    python -m bench.serialization [--rows 10000] [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Sequence
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy import Row
+
+from api import db, models
+from api.bills import bill_model, bill_query
+from api.responses import FastJSONResponse, project, rows_response
+
+from . import data
+
+SCHEMA = "bench_serialization"
+
+
+Serializer = Callable[[], Awaitable[bytes]]
+
+
+def _validated(
+    response_model: Any, content: Callable[[], Any], response_class: type
+) -> Serializer:
+    # as `fastapi.routing` does for a route's `response_model`
+    field = create_model_field("Response", response_model, mode="serialization")
+
+    async def serialize() -> bytes:
+        result = await serialize_response(field=field, response_content=content())
+        return response_class(result).body
+
+    return serialize
+
+
+def _unvalidated(rows: Sequence[Row[Any]], model: Any) -> Serializer:
+    async def serialize() -> bytes:
+        return rows_response(rows, model).body
+
+    return serialize
+
+
+async def _measure(serialize: Serializer, rows: int, repeat: int) -> dict[str, Any]:
+    body = await serialize()  # warm up (e.g., building validators)
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await serialize()
+        best = min(best, time.perf_counter() - start)
+
+    return {"rows": rows, "rows_per_sec": rows / best, "bytes": len(body)}
+
+
+def _scenarios(rows: Sequence[Row[Any]]) -> dict[str, Serializer]:
+    def chapter_bills():
+        # what `get_chapter_bills` returned before `rows_response`
+        return [project(row._mapping, bill_model(row._mapping)) for row in rows]
+
+    union = list[models.InternalBill | models.ExternalBill]
+
+    return {
+        "chapter bills (validate + json)": _validated(
+            union, chapter_bills, JSONResponse
+        ),
+        "chapter bills (validate + orjson)": _validated(
+            union, chapter_bills, FastJSONResponse
+        ),
+        "chapter bills (rows_response)": _unvalidated(rows, bill_model),
+        "member bills (validate + json)": _validated(
+            list[models.Bill], lambda: rows, JSONResponse
+        ),
+        "member bills (validate + orjson)": _validated(
+            list[models.Bill], lambda: rows, FastJSONResponse
+        ),
+        "member bills (rows_response)": _unvalidated(rows, models.Bill),
+    }
+
+
+def run(rows: int, repeat: int) -> list[dict]:
+    eng = db.get_engine()
+    try:
+        with eng.begin() as conn:
+            data.create_schema(conn, SCHEMA)
+            data.generate_data(conn, max(rows // 10, 1), rows)
+            fetched = conn.execute(bill_query()).all()
+
+        async def measure_all():
+            return [
+                {"scenario": name} | await _measure(serialize, len(fetched), repeat)
+                for name, serialize in _scenarios(fetched).items()
+            ]
+
+        return asyncio.run(measure_all())
+    finally:
+        with eng.begin() as conn:
+            data.drop_schema(conn, SCHEMA)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m bench.serialization")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args(argv)
+
+    results = run(args.rows, args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for result in results:
+        print(
+            f"{result['scenario']:36} {result['rows_per_sec']:12,.0f} rows/s  "
+            f"({result['bytes']:,} bytes)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@ import React, { useState, useEffect } from "react";
 import { Form, Button, Container, Row, Col } from "react-bootstrap";
 import { useUser } from "../context/user_context";
 
+const ALL_MEMBERS = "__all__";
+
 const MakeBills = () => {
   const [dueDate, setDueDate] = useState(
     new Date().toISOString().split("T")[0]
@@ -45,21 +47,27 @@ const MakeBills = () => {
       return;
     }
 
+    const allMembers = memberEmail === ALL_MEMBERS;
     const payload = {
       chapter_id: user.user.chapter_id,
       amount: parseFloat(amount),
       desc,
       due_date: dueDate,
-      member_email: memberEmail,
+      ...(allMembers ? {} : { member_email: memberEmail }),
     };
 
     try {
       const response = await user.post_with_headers(
-        "/api/bill/internal",
+        allMembers ? "/api/bill/internal/bulk" : "/api/bill/internal",
         payload
       );
       if (response.ok) {
-        alert("Bill Created Successfully");
+        if (allMembers) {
+          const data = await response.json();
+          alert(`Created ${data.created.length} Bills Successfully`);
+        } else {
+          alert("Bill Created Successfully");
+        }
       } else {
         const errorData = await response.json();
         console.error("Error:", errorData);
@@ -98,6 +106,7 @@ const MakeBills = () => {
                 <option value="" disabled>
                   Select Member
                 </option>
+                <option value={ALL_MEMBERS}>All Members</option>
                 {invoiceOptions.map((option) => (
                   <option key={option.value} value={option.value}>
                     {option.label}
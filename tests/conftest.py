@@ -0,0 +1,45 @@
+"""Fixtures for testing the API against the development database.
+
+The tests expect the database from the README (with the sample rows of
+`create_tables.sql`) and are skipped if it cannot be reached. They only add rows
+they remove afterwards.
+"""
+
+from typing import Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import exc
+
+from api.__main__ import app
+
+# a global admin from the sample rows of `create_tables.sql`
+ADMIN_CREDENTIALS = {"email": "hank@hankmail.com", "password": "Hark"}
+
+
+@pytest.fixture(scope="session")
+def client() -> Iterator[TestClient]:
+    client = TestClient(app)
+    try:
+        client.__enter__()
+    except (OSError, exc.OperationalError) as e:
+        pytest.skip(f"The database is not available: {e}")
+
+    try:
+        yield client
+    finally:
+        client.__exit__(None, None, None)
+
+
+@pytest.fixture(scope="session")
+def admin_headers(client: TestClient) -> dict[str, str]:
+    response = client.post("/user/login", json=ADMIN_CREDENTIALS)
+    assert response.status_code == 200
+    return {"authorization": response.json()["auth_token"]}
+
+
+@pytest.fixture(scope="session")
+def chapter_id(client: TestClient, admin_headers: dict[str, str]) -> int:
+    chapters = client.get("/chapter", headers=admin_headers).json()
+    assert chapters, "the sample rows include chapters"
+    return chapters[0]["id"]
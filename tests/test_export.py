@@ -0,0 +1,22 @@
+import json
+
+from fastapi.testclient import TestClient
+
+
+def test_chapter_members_export_ndjson(
+    client: TestClient, admin_headers: dict[str, str], chapter_id: int
+):
+    response = client.get(
+        f"/chapter/{chapter_id}/members/export",
+        params={"format": "ndjson"},
+        headers=admin_headers,
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    members = client.get(f"/chapter/{chapter_id}/members", headers=admin_headers)
+    assert sorted(row["email"] for row in exported) == sorted(
+        member["email"] for member in members.json()
+    )
@@ -0,0 +1,61 @@
+import uuid
+from typing import Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+
+HEADER = "email,password,fname,lname,dob,phone_num,is_chapter_admin"
+
+
+@pytest.fixture
+def email(client: TestClient, admin_headers: dict[str, str]) -> Iterator[str]:
+    email = f"roster-{uuid.uuid4().hex}@example.com"
+    yield email
+    client.delete(f"/user/{email}", headers=admin_headers)
+
+
+def _import(client: TestClient, headers: dict[str, str], chapter_id: int, *rows: str):
+    return client.post(
+        f"/chapter/{chapter_id}/members/import",
+        headers={**headers, "content-type": "text/csv"},
+        content="\n".join([HEADER, *rows]),
+    )
+
+
+@pytest.mark.parametrize(
+    "row",
+    [
+        "{email},,first,last,2000-01-01,555,false",
+        "{email},password,,last,2000-01-01,555,false",
+        ",password,first,last,2000-01-01,555,false",
+    ],
+    ids=["password", "fname", "email"],
+)
+def test_blank_required_cell_is_rejected(
+    client: TestClient,
+    admin_headers: dict[str, str],
+    chapter_id: int,
+    email: str,
+    row: str,
+):
+    response = _import(client, admin_headers, chapter_id, row.format(email=email))
+
+    assert response.status_code == 400
+    assert client.get(f"/user/{email}", headers=admin_headers).status_code == 404
+
+
+def test_blank_is_chapter_admin_defaults_to_false(
+    client: TestClient, admin_headers: dict[str, str], chapter_id: int, email: str
+):
+    response = _import(
+        client,
+        admin_headers,
+        chapter_id,
+        f"{email},password,first,last,2000-01-01,555,",
+    )
+
+    assert response.status_code == 200
+    assert response.json() == [{"row_num": 1, "email": email, "status": "created"}]
+
+    member = client.get(f"/member/{email}", headers=admin_headers).json()
+    assert member["is_chapter_admin"] is False